@@ -0,0 +1,154 @@
+"""Latency of the Database queries behind /search, downloads and /stats on synthetic catalogs.
+
+Usage: python benchmarks/bench_database.py [--sizes 10000,100000,1000000] [--save-baseline]
+
+Catalogs are seeded once per size and seed into --data-dir and reused by
+later runs, seeding a million rows takes a few minutes.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import CatalogSnapshot
+from database import Database
+from fuzzy import title_trigrams
+from harness import add_result_arguments, ops_per_second, report
+from search_cache import SearchCache
+
+# Words titles are drawn from, a long tail like real catalogs
+VOCABULARY = (
+    "the of and a night day man love war star dark last king house city world life dead blood "
+    "black red blue girl boy story game lost secret time return rise fall shadow fire ice storm "
+    "legend dragon ghost island river road home family heart soul dream mind empire kingdom "
+    "planet space ocean mountain forest desert winter summer spring autumn moon sun sky earth "
+    "hunter killer doctor detective agent soldier queen prince princess witch wolf lion tiger "
+    "hero villain machine robot code signal echo silence thunder lightning crown throne sword"
+).split()
+SEED_CHUNK = 50000
+
+def make_title(rng: random.Random) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 4))).title()
+
+def misspell(rng: random.Random, word: str) -> str:
+    """word with one character dropped, so only the fuzzy fallback finds it"""
+    index = rng.randrange(len(word))
+    return word[:index] + word[index + 1:]
+
+def seed_catalog(path: str, size: int, seed: int, tv_share: float = 0.1):
+    """Create a catalog of size media rows, tv_share of them series with episodes"""
+    rng = random.Random(seed)
+    database = Database(path, pool_size=1)
+    tmdb_ids = rng.sample(range(1, size * 10), size)
+    next_id = 1
+    with database._write_lock, database.pool.connection() as conn:
+        for start in range(0, size, SEED_CHUNK):
+            media_rows, episode_rows, trigram_rows = [], [], []
+            for tmdb_id in tmdb_ids[start:start + SEED_CHUNK]:
+                media_type = "tv" if rng.random() < tv_share else "movie"
+                title = make_title(rng)
+                media_rows.append((
+                    next_id, title, rng.randint(1950, 2024), media_type, tmdb_id, f"file-{next_id}",
+                    f"{title}.mkv", f"*{title}*", f"https://image.tmdb.org/t/p/w500/{tmdb_id}.jpg", title,
+                    " ".join(rng.choice(VOCABULARY) for _ in range(20))
+                ))
+                trigram_rows.extend((trigram, next_id) for trigram in title_trigrams(title))
+                if media_type == "tv":
+                    for season in range(1, rng.randint(1, 4) + 1):
+                        for episode in range(1, rng.randint(5, 12) + 1):
+                            episode_rows.append((next_id, season, episode, f"Episode {episode}",
+                                                 f"file-{next_id}-{season}-{episode}", ""))
+                next_id += 1
+            with conn:
+                conn.executemany('''
+                    INSERT INTO media (id, title, year, media_type, tmdb_id, file_id, file_path, caption,
+                                       poster_url, original_title, overview)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', media_rows)
+                conn.executemany('''
+                    INSERT INTO episodes (media_id, season_number, episode_number, title, file_id, file_path)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', episode_rows)
+                conn.executemany('INSERT INTO media_trigrams (trigram, media_id) VALUES (?, ?)', trigram_rows)
+        conn.execute('ANALYZE')
+    database.close()
+
+def open_catalog(data_dir: str, size: int, seed: int) -> str:
+    """Path of a seeded catalog, creating it on first use"""
+    # v2 catalogs carry the title trigram index
+    path = os.path.join(data_dir, f"catalog-{size}-seed{seed}-v2.db")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        # Seed under a temporary name so an interrupted run is not reused
+        partial = path + ".partial"
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(partial + suffix):
+                os.remove(partial + suffix)
+        start = time.perf_counter()
+        seed_catalog(partial, size, seed)
+        os.replace(partial, path)
+        print(f"seeded {size:,} media rows in {time.perf_counter() - start:.1f}s")
+    return path
+
+def bench_catalog(path: str, size: int, seed: int, queries: int) -> dict:
+    """ops/s of each query against one catalog"""
+    rng = random.Random(seed + 1)
+    database = Database(path, pool_size=1)
+    with database._read() as cursor:
+        cursor.execute('SELECT tmdb_id, media_type FROM media ORDER BY RANDOM() LIMIT ?', (queries,))
+        tmdb_keys = cursor.fetchall()
+        cursor.execute("SELECT id FROM media WHERE media_type = 'tv' ORDER BY RANDOM() LIMIT ?", (queries,))
+        series_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute('SELECT id FROM media ORDER BY RANDOM() LIMIT ?', (queries,))
+        media_ids = [row[0] for row in cursor.fetchall()]
+    terms = [" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 2))) for _ in range(queries)]
+    typos = [misspell(rng, rng.choice(VOCABULARY) + rng.choice(VOCABULARY)) for _ in range(queries)]
+
+    cases = {
+        f"search_media[{size}]": ops_per_second(lambda term: database.search_media(term, 50), terms),
+        f"search_media_fuzzy[{size}]": ops_per_second(lambda term: database.search_media(term, 50), typos),
+        f"get_media_by_id[{size}]": ops_per_second(database.get_media_by_id, media_ids),
+        f"get_media_by_tmdb_id[{size}]": ops_per_second(lambda key: database.get_media_by_tmdb_id(*key), tmdb_keys),
+        f"get_episodes_by_media_id[{size}]": ops_per_second(database.get_episodes_by_media_id, series_ids),
+        f"get_stats[{size}]": ops_per_second(lambda _: database.get_stats(), range(max(1, queries // 20))),
+    }
+    database.close()
+
+    # The same searches through the search cache, as /search paging sees them after the first page
+    cached = Database(path, pool_size=1, search_cache=SearchCache())
+    for term in terms:
+        cached.search_media_page(term)
+    cases[f"search_media_page_warm[{size}]"] = ops_per_second(cached.search_media_page, terms)
+    cached.close()
+
+    # Lookups served by the in-memory catalog snapshot
+    snapshot = Database(path, pool_size=1, catalog=CatalogSnapshot())
+    snapshot.load_catalog()
+    cases[f"get_media_by_id_snapshot[{size}]"] = ops_per_second(snapshot.get_media_by_id, media_ids, rounds=10)
+    print(f"catalog snapshot of {size:,} rows: {snapshot.catalog.stats()['bytes'] / 1024 / 1024:.1f} MiB")
+    snapshot.close()
+    return cases
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000", help="comma separated catalog sizes")
+    parser.add_argument("--queries", type=int, default=200, help="distinct lookups per case")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "media-bot-bench"))
+    add_result_arguments(parser)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    cases = {}
+    for size in sizes:
+        path = open_catalog(args.data_dir, size, args.seed)
+        cases.update(bench_catalog(path, size, args.seed, args.queries))
+
+    report("database", {"sizes": sizes, "queries": args.queries, "seed": args.seed}, cases, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Throughput of the filename parser over a corpus of real release names.
+
+Usage: python benchmarks/bench_filename_parser.py [--rounds N] [--corpus FILE] [--save-baseline]
+"""
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filename_parser import parse_filename
+from harness import add_result_arguments, ops_per_second, report
+from tmdb_api import TMDBApi
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "release_names.txt")
+
+def legacy_clean_filename(filename: str) -> str:
+    """The multi-pass re.sub cleaner parse_filename replaced, kept as the baseline"""
+    filename = re.sub(r'\.[^.]*$', '', filename)
+    filename = re.sub(r'\b(1080p|720p|480p|2160p|HDRip|BRRip|WEBRip|WEB-DL|HDTV|DVD|BluRay|x264|x265|h264|h265|AAC|DDP?5\.1|DD?5\.1|HEVC|AVC)\b', '', filename, flags=re.IGNORECASE)
+    filename = re.sub(r'\b(19|20)\d{2}\b', '', filename)
+    filename = re.sub(r'\b[Ss]\d+[Ee]\d+\b', '', filename)
+    filename = re.sub(r'\bSeason\s*\d+\b', '', filename, flags=re.IGNORECASE)
+    filename = re.sub(r'\bEpisode\s*\d+\b', '', filename, flags=re.IGNORECASE)
+    filename = re.sub(r'^\[.*?\]|\[.*?\]$', '', filename)
+    filename = re.sub(r'^\(.*?\)|\(.*?\)$', '', filename)
+    filename = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', '', filename)
+    filename = re.sub(r'[^a-zA-Z0-9\sÀ-ſ\-_\']', ' ', filename)
+    return re.sub(r'\s+', ' ', filename).strip()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    add_result_arguments(parser)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as corpus:
+        names = [line.strip() for line in corpus if line.strip()]
+
+    tmdb = TMDBApi("")
+    cases = {
+        "legacy_clean_filename": ops_per_second(legacy_clean_filename, names, args.rounds),
+        "parse_filename": ops_per_second(parse_filename, names, args.rounds),
+        "clean_filename": ops_per_second(tmdb.clean_filename, names, args.rounds),
+    }
+    tmdb.close()
+
+    print(f"corpus: {len(names)} names x {args.rounds} rounds, "
+          f"parse_filename is {cases['parse_filename'] / cases['legacy_clean_filename']:.2f}x the legacy cleaner")
+    report("filename_parser", {"rounds": args.rounds, "corpus": os.path.basename(args.corpus)}, cases, args)
+
+if __name__ == "__main__":
+    main()
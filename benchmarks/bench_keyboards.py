@@ -0,0 +1,44 @@
+"""Construction speed of the season and episode pickers shown by download_callback.
+
+Usage: python benchmarks/bench_keyboards.py [--rounds N] [--save-baseline]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Episode
+from harness import add_result_arguments, ops_per_second, report
+from keyboards import EPISODES_PER_PAGE, KeyboardCache, build_episode_keyboard, build_season_keyboard
+
+def make_season(media_id: int, season: int, count: int):
+    return [Episode(season * 1000 + number, media_id, season, number, f"Episode {number}", f"file-{number}", "", "")
+            for number in range(1, count + 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    add_result_arguments(parser)
+    args = parser.parse_args()
+
+    cases = {}
+    for count in (10, 30, 100):
+        episodes = make_season(1, 1, count)
+        last_page = (count - 1) // EPISODES_PER_PAGE
+        cases[f"build_episode_keyboard[{count} episodes]"] = ops_per_second(
+            lambda page: build_episode_keyboard(1, 1, episodes, page, "download_1"), [0, last_page], args.rounds // 2)
+
+    seasons = [(season, 10) for season in range(1, 11)]
+    cases["build_season_keyboard[10 seasons]"] = ops_per_second(
+        lambda _: build_season_keyboard(1, seasons), [None], args.rounds)
+
+    # What download_callback pays once the picker of a popular series is cached
+    cache = KeyboardCache()
+    cache.put(build_season_keyboard(1, seasons), 1)
+    cases["keyboard_cache_hit"] = ops_per_second(lambda _: cache.get(1), [None], args.rounds * 10)
+
+    report("keyboards", {"rounds": args.rounds}, cases, args)
+
+if __name__ == "__main__":
+    main()
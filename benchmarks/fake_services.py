@@ -0,0 +1,256 @@
+"""Local stand-ins for the Telegram Bot API and TMDB, used by the load test.
+
+Both are small asyncio HTTP servers with injectable latency and error
+rates. The Bot API keeps a queue of synthetic updates served by getUpdates
+and answers every send or edit with a plausible Message. TMDB answers
+search, details and season requests with deterministic made-up titles.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+Response = Tuple[int, Dict[str, Any]]
+
+class FakeHTTPServer:
+    """Keep-alive HTTP/1.1 server dispatching each request to handle(method, path, query, body)"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.port = 0
+        self.requests: Counter = Counter()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections would otherwise hold wait_closed forever
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def delay(self):
+        """Simulated network and server time"""
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+
+    async def handle(self, method: str, path: str, query: Dict[str, str], body: bytes) -> Response:
+        raise NotImplementedError
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                url = urlsplit(target)
+                query = dict(parse_qsl(url.query))
+                if headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+                    query.update(parse_qsl(body.decode()))
+                status, payload = await self.handle(method, url.path, query, body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+class FakeBotAPI(FakeHTTPServer):
+    """Bot API for one bot: getUpdates serves queued updates, sends and edits always succeed
+
+    flood_rate is the share of chat-bound requests answered with a 429 and
+    retry_after, which is how Telegram pushes back under load.
+    """
+
+    # Requests that do not target a chat and are never flood-limited here
+    UNLIMITED = {"getme", "getupdates", "deletewebhook", "setwebhook", "answercallbackquery", "answerinlinequery"}
+
+    def __init__(self, token: str, flood_rate: float = 0.0, retry_after: int = 1, **options):
+        super().__init__(**options)
+        self.token = token
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.bot_user = {"id": int(token.split(":")[0]), "is_bot": True, "first_name": "Load Test Bot",
+                         "username": "load_test_bot"}
+        self.floods = 0
+        self._updates: List[Dict] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1000000)
+        self._available = asyncio.Event()
+
+    def push_update(self, update: Dict) -> int:
+        """Queue an update for getUpdates, returning its update_id"""
+        update["update_id"] = next(self._update_ids)
+        self._updates.append(update)
+        self._available.set()
+        return update["update_id"]
+
+    def next_message_id(self) -> int:
+        return next(self._message_ids)
+
+    async def handle(self, method: str, path: str, query: Dict[str, str], body: bytes) -> Response:
+        prefix = f"/bot{self.token}/"
+        if not path.startswith(prefix):
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+        api_method = path[len(prefix):].lower()
+        params = {key: self._decode(value) for key, value in query.items()}
+        if body and not query:
+            try:
+                params.update(json.loads(body))
+            except ValueError:
+                pass
+        self.requests[api_method] += 1
+
+        if api_method == "getupdates":
+            return 200, {"ok": True, "result": await self._get_updates(params)}
+
+        await self.delay()
+        if api_method not in self.UNLIMITED and self.random.random() < self.flood_rate:
+            self.floods += 1
+            return 429, {"ok": False, "error_code": 429,
+                         "description": f"Too Many Requests: retry after {self.retry_after}",
+                         "parameters": {"retry_after": self.retry_after}}
+        return 200, {"ok": True, "result": self._result(api_method, params)}
+
+    @staticmethod
+    def _decode(value: str) -> Any:
+        """PTB sends nested parameters as JSON strings inside the form"""
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+
+    async def _get_updates(self, params: Dict) -> List[Dict]:
+        offset = int(params.get("offset") or 0)
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates:
+            self._available.clear()
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout=float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                return []
+        return self._updates[:int(params.get("limit") or 100)]
+
+    def _message(self, params: Dict, **content: Any) -> Dict:
+        chat_id = params.get("chat_id", 0)
+        return {
+            "message_id": params.get("message_id") or self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if isinstance(chat_id, int) and chat_id > 0 else "supergroup"},
+            "from": self.bot_user,
+            **content,
+        }
+
+    def _result(self, api_method: str, params: Dict) -> Any:
+        if api_method == "getme":
+            return self.bot_user
+        if api_method == "sendphoto":
+            file_id = f"photo-{zlib.crc32(str(params.get('photo')).encode())}"
+            return self._message(params, photo=[{"file_id": file_id, "file_unique_id": file_id,
+                                                 "width": 500, "height": 750}],
+                                 caption=params.get("caption", ""))
+        if api_method in ("senddocument", "sendvideo"):
+            file_id = str(params.get("document") or params.get("video"))
+            return self._message(params, document={"file_id": file_id, "file_unique_id": file_id},
+                                 caption=params.get("caption", ""))
+        if api_method.startswith("send") or api_method.startswith("edit"):
+            return self._message(params, text=params.get("text") or params.get("caption") or "")
+        return True
+
+class FakeTMDB(FakeHTTPServer):
+    """TMDB v3 answering every title with deterministic fake data
+
+    error_rate is the share of requests answered with a 503, which the
+    client retries with backoff.
+    """
+
+    def __init__(self, error_rate: float = 0.0, **options):
+        super().__init__(**options)
+        self.error_rate = error_rate
+        self.errors = 0
+
+    async def handle(self, method: str, path: str, query: Dict[str, str], body: bytes) -> Response:
+        self.requests[path.split("/")[2] if path.count("/") > 1 else path] += 1
+        await self.delay()
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return 503, {"status_code": 503, "status_message": "Service unavailable"}
+
+        parts = path.strip("/").split("/")
+        if parts[:1] == ["3"]:
+            parts = parts[1:]
+        if parts[:1] == ["search"] and len(parts) == 2:
+            return 200, self._search(parts[1], query.get("query", ""))
+        if len(parts) == 2 and parts[0] in ("movie", "tv") and parts[1].isdigit():
+            return 200, self._details(parts[0], int(parts[1]))
+        if len(parts) == 4 and parts[0] == "tv" and parts[2] == "season":
+            season = int(parts[3])
+            return 200, {"id": int(parts[1]) * 100 + season, "season_number": season, "episodes": [
+                {"episode_number": number, "name": f"Episode {number}"} for number in range(1, 11)
+            ]}
+        return 404, {"status_code": 34, "status_message": "The resource you requested could not be found."}
+
+    @staticmethod
+    def _tmdb_id(media_type: str, title: str) -> int:
+        # Movies and series live in separate id ranges, like on TMDB
+        return zlib.crc32(f"{media_type}:{title.lower()}".encode()) % 900000 + (1 if media_type == "movie" else 1000000)
+
+    def _search(self, kind: str, title: str) -> Dict:
+        media_type = "movie" if kind == "movie" else "tv"
+        results = [self._summary(media_type, self._tmdb_id(media_type, f"{title} {index}" if index else title),
+                                 f"{title} {index + 1}" if index else title)
+                   for index in range(3)] if title else []
+        return {"page": 1, "results": results, "total_results": len(results), "total_pages": 1}
+
+    @staticmethod
+    def _summary(media_type: str, tmdb_id: int, title: str) -> Dict:
+        year = 1980 + tmdb_id % 45
+        if media_type == "movie":
+            return {"id": tmdb_id, "title": title, "original_title": title, "release_date": f"{year}-01-01",
+                    "overview": f"Synthetic overview of {title}.", "poster_path": f"/{tmdb_id}.jpg",
+                    "vote_average": 7.0}
+        return {"id": tmdb_id, "name": title, "original_name": title, "first_air_date": f"{year}-01-01",
+                "overview": f"Synthetic overview of {title}.", "poster_path": f"/{tmdb_id}.jpg",
+                "vote_average": 7.0}
+
+    def _details(self, media_type: str, tmdb_id: int) -> Dict:
+        details = self._summary(media_type, tmdb_id, f"Title {tmdb_id}")
+        details["genres"] = [{"id": 18, "name": "Drama"}]
+        if media_type == "movie":
+            details["runtime"] = 100 + tmdb_id % 60
+        else:
+            details["number_of_seasons"] = 1 + tmdb_id % 5
+            details["number_of_episodes"] = details["number_of_seasons"] * 10
+        return details
@@ -0,0 +1,85 @@
+"""Timing, result files and baseline comparison shared by the benchmark scripts.
+
+Each script produces {case: operations per second}. Results can be written
+with --output, saved as the baseline of this machine with --save-baseline,
+and are compared against that baseline on every run.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+def ops_per_second(func: Callable, inputs: Sequence, rounds: int = 1, repeat: int = 3) -> float:
+    """Calls of func per second over every input, best of repeat runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for value in inputs:
+                func(value)
+        best = min(best, time.perf_counter() - start)
+    return rounds * len(inputs) / best
+
+def environment() -> Dict[str, str]:
+    """What the numbers depend on besides the code"""
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "platform": platform.platform(terse=True),
+    }
+
+def add_result_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file instead of the saved baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="slowdown reported as a regression, 0.15 is 15%% (default)")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 when a case regressed")
+
+def load_results(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as results_file:
+        return json.load(results_file)
+
+def write_results(path: str, results: Dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+        results_file.write("\n")
+
+def report(benchmark: str, params: Dict, cases: Dict[str, float], args: argparse.Namespace):
+    """Print the cases next to the baseline, store them as asked and exit on regressions with --check"""
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{benchmark}.json")
+    baseline = load_results(baseline_path)
+    previous = baseline["cases"] if baseline else {}
+
+    regressions = []
+    width = max(len(case) for case in cases)
+    for case, rate in cases.items():
+        line = f"{case:<{width}}  {rate:>14,.1f} ops/s"
+        if previous.get(case):
+            ratio = rate / previous[case]
+            line += f"  {ratio:6.2f}x baseline"
+            if ratio < 1 - args.tolerance:
+                line += "  REGRESSION"
+                regressions.append(case)
+        print(line)
+
+    results = {"benchmark": benchmark, "params": params, "environment": environment(), "cases": cases}
+    if baseline and baseline.get("environment") != results["environment"]:
+        print(f"note: baseline {baseline_path} was recorded on a different environment")
+    if args.output:
+        write_results(args.output, results)
+    if args.save_baseline:
+        write_results(baseline_path, results)
+        print(f"baseline saved to {baseline_path}")
+    if regressions and args.check:
+        sys.exit(1)
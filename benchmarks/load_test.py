@@ -0,0 +1,358 @@
+"""End-to-end load test of the bot against local fake Bot API and TMDB servers.
+
+Usage: python benchmarks/load_test.py [--search-rate 25] [--download-rate 15] [--upload-rate 0.2] [--duration 30]
+
+The Application built by bot.build_application polls the fake Bot API like
+it polls Telegram, so updates go through the real handlers, the database,
+the TMDB client and the outbound scheduler. Searches, download presses and
+inline queries arrive as independent Poisson streams from --users distinct
+users; uploads are documents posted to DATABASE_GROUP_ID, whose replies are
+bound by Telegram's 20 messages per minute in a group. The report, taken
+when the drain window ends, gives the latency from queueing an update to
+the end of its processing per update kind, the bot's own handler, query and
+TMDB metrics, and the requests the fake servers saw.
+
+Other bot settings (OUTBOUND_*, DATABASE_POOL_SIZE, ...) are read from the
+environment as usual, so limits can be tried without code changes.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_database import VOCABULARY, make_title
+from database import Database, Episode, Media
+from fake_services import FakeBotAPI, FakeTMDB
+
+TOKEN = "123456:LOAD-TEST-TOKEN"
+ADMIN_ID = 1
+DATABASE_GROUP_ID = -1001
+OFFICIAL_CHANNEL_ID = -1002
+FIRST_USER_ID = 1000000
+UPLOADERS = 5
+RELEASE_NAMES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "release_names.txt")
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of values, 0 when there are none"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+def configure_environment(workdir: str, bot_api: FakeBotAPI, tmdb: FakeTMDB):
+    """Point the bot at the fake servers and a throwaway database before config is imported"""
+    os.environ.update({
+        "BOT_TOKEN": TOKEN,
+        "ADMIN_ID": str(ADMIN_ID),
+        "DATABASE_GROUP_ID": str(DATABASE_GROUP_ID),
+        "OFFICIAL_CHANNEL_ID": str(OFFICIAL_CHANNEL_ID),
+        "TMDB_API_KEY": "load-test",
+        "TELEGRAM_BASE_URL": f"{bot_api.url}/bot",
+        "TELEGRAM_BASE_FILE_URL": f"{bot_api.url}/file/bot",
+        "TMDB_BASE_URL": f"{tmdb.url}/3",
+        "DATABASE_PATH": os.path.join(workdir, "media.db"),
+        "TMDB_CACHE_PATH": os.path.join(workdir, "tmdb_cache.db"),
+        "BOT_MODE": "polling",
+        "METRICS_PORT": "0",
+        "POSTER_BACKFILL_INTERVAL": "0",
+    })
+
+def seed_catalog(database: Database, size: int, rng: random.Random) -> List[int]:
+    """Insert size synthetic titles, a fifth of them series with episodes, returning their ids"""
+    media = [
+        Media(id=0, title=make_title(rng), year=rng.randint(1950, 2024), media_type="tv" if index % 5 == 0 else "movie",
+              tmdb_id=index + 1, file_id=f"file-{index}", file_path="", caption="Synthetic title",
+              poster_url=f"https://image.tmdb.org/t/p/w500/{index}.jpg", created_at="")
+        for index in range(size)
+    ]
+    database.add_media_bulk(media)
+    titles = database.get_media_titles()
+    media_ids = [media_id for media_id, _, _ in titles]
+    for media_id in media_ids[::5]:
+        for season in range(1, rng.randint(1, 3) + 1):
+            for number in range(1, 11):
+                database.add_episode(Episode(0, media_id, season, number, f"Episode {number}",
+                                             f"file-{media_id}-{season}-{number}", "", ""))
+    return media_ids
+
+class UpdateFactory:
+    """Synthetic Bot API updates in the shape Telegram sends them"""
+
+    KINDS = ("search", "download", "inline", "upload")
+
+    def __init__(self, bot_api: FakeBotAPI, media_ids: List[int], users: int, rng: random.Random):
+        self.bot_api = bot_api
+        self.media_ids = media_ids
+        self.users = users
+        self.rng = rng
+        with open(RELEASE_NAMES, encoding="utf-8") as names:
+            self.release_names = [line.strip() for line in names if line.strip()]
+        self._uploads = 0
+
+    def _user(self, user_id: Optional[int] = None) -> Dict:
+        user_id = user_id or FIRST_USER_ID + self.rng.randrange(self.users)
+        return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+
+    def _term(self) -> str:
+        return " ".join(self.rng.choice(VOCABULARY) for _ in range(self.rng.randint(1, 2)))
+
+    def make(self, kind: str) -> Dict:
+        return getattr(self, f"_{kind}")()
+
+    def _search(self) -> Dict:
+        user = self._user()
+        text = f"/search {self._term()}"
+        return {"message": {
+            "message_id": self.bot_api.next_message_id(), "date": int(time.time()), "from": user,
+            "chat": {"id": user["id"], "type": "private"}, "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len("/search")}],
+        }}
+
+    def _download(self) -> Dict:
+        user = self._user()
+        return {"callback_query": {
+            "id": str(self.rng.getrandbits(48)), "from": user, "chat_instance": str(user["id"]),
+            "data": f"download_{self.rng.choice(self.media_ids)}",
+            "message": {"message_id": self.bot_api.next_message_id(), "date": int(time.time()),
+                        "chat": {"id": user["id"], "type": "private"}, "from": self.bot_api.bot_user,
+                        "text": "🔍 Resultados"},
+        }}
+
+    def _inline(self) -> Dict:
+        return {"inline_query": {"id": str(self.rng.getrandbits(48)), "from": self._user(),
+                                 "query": self._term(), "offset": ""}}
+
+    def _upload(self) -> Dict:
+        self._uploads += 1
+        # Half of the uploads are new episodes of a handful of series, like a season drop
+        if self._uploads % 2:
+            show = self.rng.choice(("Synthetic Show", "Load Test Series", "Benchmark Drama"))
+            file_name = f"{show.replace(' ', '.')}.S01E{self._uploads % 99 + 1:02d}.1080p.WEB-DL.mkv"
+        else:
+            file_name = self.rng.choice(self.release_names)
+        file_id = f"upload-{self._uploads}"
+        return {"message": {
+            "message_id": self.bot_api.next_message_id(), "date": int(time.time()),
+            "from": self._user(ADMIN_ID + self._uploads % UPLOADERS),
+            "chat": {"id": DATABASE_GROUP_ID, "type": "supergroup", "title": "Database"},
+            "document": {"file_id": file_id, "file_unique_id": file_id, "file_name": file_name},
+        }}
+
+class LoadTest:
+    """Runs one load test and collects its measurements"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.injected: Dict[int, tuple] = {}
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.completed = 0
+        self.first_injection = 0.0
+        self.last_completion = 0.0
+        self._drained: Optional[asyncio.Event] = None
+
+    def on_processed(self, update: object):
+        """Record the end-to-end latency of a processed update"""
+        entry = self.injected.pop(getattr(update, "update_id", None), None)
+        if entry is None:
+            return
+        kind, started = entry
+        now = time.perf_counter()
+        self.latencies[kind].append(now - started)
+        self.completed += 1
+        self.last_completion = now
+        if not self.injected and self._drained is not None:
+            self._drained.set()
+
+    async def run(self) -> Dict:
+        args = self.args
+        workdir = tempfile.mkdtemp(prefix="media-bot-load-")
+        bot_api = FakeBotAPI(TOKEN, flood_rate=args.bot_flood_rate, latency=args.bot_latency,
+                             jitter=args.bot_latency / 2, seed=args.seed)
+        tmdb = FakeTMDB(error_rate=args.tmdb_error_rate, latency=args.tmdb_latency,
+                        jitter=args.tmdb_latency / 2, seed=args.seed)
+        await bot_api.start()
+        await tmdb.start()
+        configure_environment(workdir, bot_api, tmdb)
+        # The bot creates its downloads directory in the working directory
+        previous_cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            bot = importlib.import_module("bot")
+            # One INFO line per HTTP request would drown the report
+            logging.getLogger("httpx").setLevel(logging.WARNING)
+            return await self._drive(bot, bot_api, tmdb)
+        finally:
+            os.chdir(previous_cwd)
+            await bot_api.stop()
+            await tmdb.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    async def _drive(self, bot, bot_api: FakeBotAPI, tmdb: FakeTMDB) -> Dict:
+        args = self.args
+        test = self
+
+        class TimedUpdateProcessor(bot.PerUserUpdateProcessor):
+            async def do_process_update(self, update, coroutine):
+                try:
+                    await super().do_process_update(update, coroutine)
+                finally:
+                    test.on_processed(update)
+
+        application = bot.build_application(TimedUpdateProcessor(args.workers))
+        # Seeded through the blocking Database so it stays out of the query metrics
+        media_ids = seed_catalog(bot.db.database, args.catalog, self.rng)
+        factory = UpdateFactory(bot_api, media_ids, args.users, self.rng)
+
+        rates = {kind: getattr(args, f"{kind}_rate") for kind in UpdateFactory.KINDS}
+
+        await application.initialize()
+        await application.post_init(application)
+        await application.updater.start_polling(allowed_updates=bot.ALLOWED_UPDATES)
+        await application.start()
+        self._drained = asyncio.Event()
+        try:
+            self.first_injection = time.perf_counter()
+            deadline = self.first_injection + args.duration
+            counts = await asyncio.gather(*(
+                self._stream(kind, rate, deadline, bot_api, factory) for kind, rate in rates.items() if rate > 0
+            ))
+            if self.injected:
+                try:
+                    await asyncio.wait_for(self._drained.wait(), timeout=args.drain)
+                except asyncio.TimeoutError:
+                    pass
+            report = self._report(bot, bot_api, tmdb, sum(counts))
+        finally:
+            try:
+                # Application.stop waits for every queued update, which can take
+                # minutes when the test overloaded the bot
+                await asyncio.wait_for(self._stop(application), timeout=args.shutdown_timeout)
+            except asyncio.TimeoutError:
+                print(f"gave up stopping the bot after {args.shutdown_timeout:.0f}s, unfinished updates dropped")
+        return report
+
+    @staticmethod
+    async def _stop(application):
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+    async def _stream(self, kind: str, rate: float, deadline: float, bot_api: FakeBotAPI,
+                      factory: "UpdateFactory") -> int:
+        """Push updates of one kind until the deadline, returning how many were sent"""
+        sent = 0
+        while True:
+            # Open loop: arrivals do not wait for the bot, like real users
+            await asyncio.sleep(self.rng.expovariate(rate))
+            if time.perf_counter() >= deadline:
+                return sent
+            update_id = bot_api.push_update(factory.make(kind))
+            self.injected[update_id] = (kind, time.perf_counter())
+            sent += 1
+
+    def _report(self, bot, bot_api: FakeBotAPI, tmdb: FakeTMDB, sent: int) -> Dict:
+        span = max((self.last_completion or time.perf_counter()) - self.first_injection, 1e-9)
+        kinds = {
+            kind: {
+                "count": len(values),
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": max(values) * 1000,
+            }
+            for kind, values in sorted(self.latencies.items())
+        }
+        handlers = {
+            dict(labels)["handler"]: {
+                "count": histogram.count,
+                "p50_ms": histogram.quantile(0.50) * 1000,
+                "p95_ms": histogram.quantile(0.95) * 1000,
+                "p99_ms": histogram.quantile(0.99) * 1000,
+            }
+            for labels, histogram in sorted(bot.metrics.histograms("bot_handler_seconds").items())
+        }
+        queries = {
+            dict(labels)["query"]: {"count": histogram.count, "mean_ms": histogram.sum / histogram.count * 1000}
+            for labels, histogram in sorted(bot.metrics.histograms("db_query_seconds").items())
+        }
+        return {
+            "params": {key: value for key, value in vars(self.args).items() if key != "output"},
+            "sent": sent,
+            "completed": self.completed,
+            "unfinished": len(self.injected),
+            "throughput_per_s": self.completed / span,
+            "updates": kinds,
+            "handlers": handlers,
+            "db_queries": queries,
+            "bot_api_requests": dict(bot_api.requests),
+            "bot_api_floods": bot_api.floods,
+            "tmdb_requests": dict(tmdb.requests),
+            "tmdb_errors": tmdb.errors,
+            "outbound": bot.outbound.stats(),
+        }
+
+def print_report(report: Dict):
+    print(f"sent {report['sent']} updates, completed {report['completed']}, unfinished {report['unfinished']}, "
+          f"throughput {report['throughput_per_s']:.1f} updates/s")
+    print("\nend-to-end latency, queued to processed (ms):")
+    print(f"{'kind':<12} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for kind, row in report["updates"].items():
+        print(f"{kind:<12} {row['count']:>7} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+              f"{row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}")
+    print("\nhandler latency from the bot's metrics, bucket estimates (ms):")
+    print(f"{'handler':<32} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for handler, row in report["handlers"].items():
+        print(f"{handler:<32} {row['count']:>7} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+    slowest = sorted(report["db_queries"].items(), key=lambda item: item[1]["count"] * item[1]["mean_ms"],
+                     reverse=True)[:5]
+    print("\nbusiest database queries: " + ", ".join(
+        f"{query} {row['count']}x {row['mean_ms']:.2f}ms" for query, row in slowest))
+    print(f"Bot API requests: {report['bot_api_requests']}, 429s injected: {report['bot_api_floods']}")
+    print(f"TMDB requests: {report['tmdb_requests']}, errors injected: {report['tmdb_errors']}")
+    outbound = report["outbound"]
+    print(f"outbound queue: max depth {outbound['max_depth']}, flood retries {outbound['retries']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--search-rate", type=float, default=25, help="/search commands per second")
+    parser.add_argument("--download-rate", type=float, default=15, help="download button presses per second")
+    parser.add_argument("--inline-rate", type=float, default=10, help="inline queries per second")
+    parser.add_argument("--upload-rate", type=float, default=0.2, help="files posted to the database group per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic")
+    parser.add_argument("--drain", type=float, default=30, help="seconds to wait for queued updates afterwards")
+    parser.add_argument("--shutdown-timeout", type=float, default=30, help="seconds allowed for stopping the bot")
+    parser.add_argument("--users", type=int, default=1000, help="distinct users sending updates")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("UPDATE_WORKERS", "16")),
+                        help="updates processed concurrently, UPDATE_WORKERS by default")
+    parser.add_argument("--catalog", type=int, default=2000, help="titles seeded before the test")
+    parser.add_argument("--bot-latency", type=float, default=0.03, help="seconds per Bot API request")
+    parser.add_argument("--bot-flood-rate", type=float, default=0.0, help="share of sends answered with a 429")
+    parser.add_argument("--tmdb-latency", type=float, default=0.08, help="seconds per TMDB request")
+    parser.add_argument("--tmdb-error-rate", type=float, default=0.0, help="share of TMDB requests failing with 503")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadTest(args).run())
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+            output.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,43 @@
 import asyncio
 import logging
 import os
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
-from config import BOT_TOKEN, ADMIN_ID, DATABASE_GROUP_ID, OFFICIAL_CHANNEL_ID, TMDB_API_KEY, START_MESSAGE, HELP_MESSAGE
-from database import Database, Media, Episode
-from tmdb_api import TMDBApi
+import secrets
+import time
+from typing import List
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InlineQueryResultCachedPhoto,
+    InlineQueryResultPhoto, InputTextMessageContent
+)
+from telegram.constants import ChatType
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, InlineQueryHandler, filters, ContextTypes
+)
+from config import (
+    BOT_TOKEN, ADMIN_ID, DATABASE_GROUP_ID, OFFICIAL_CHANNEL_ID, TMDB_API_KEY, TMDB_BASE_URL, START_MESSAGE,
+    HELP_MESSAGE, DATABASE_PATH, DATABASE_POOL_SIZE, DATABASE_CACHE_SIZE_KB, DATABASE_MMAP_SIZE,
+    SEARCH_CACHE_MAX_QUERIES, SEARCH_CACHE_MAX_ROWS, SEARCH_CACHE_SIZE_KB,
+    TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT, TMDB_MAX_CONNECTIONS, TMDB_CACHE_PATH, TMDB_CACHE_MAX_ENTRIES,
+    TMDB_RATE_LIMIT, TMDB_MAX_RETRIES, BULK_BATCH_SIZE, BULK_CONCURRENCY, POSTER_BACKFILL_INTERVAL,
+    SEARCH_PAGE_SIZE, INLINE_CACHE_TIME, INLINE_PAGE_SIZE, OUTBOUND_GLOBAL_RATE, OUTBOUND_PRIVATE_RATE,
+    OUTBOUND_GROUP_RATE_PER_MINUTE, OUTBOUND_MAX_RETRIES, TELEGRAM_BASE_URL, TELEGRAM_BASE_FILE_URL, BOT_MODE,
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS, UPDATE_WORKERS,
+    INDEXING_SESSION_TTL, INDEXING_SESSION_MAX, INDEXING_SESSION_FLUSH_INTERVAL,
+    PUBLISH_MAX_ATTEMPTS, PUBLISH_RETRY_DELAY, PUBLISH_POLL_INTERVAL, METRICS_LISTEN, METRICS_PORT,
+    CATALOG_SNAPSHOT
+)
+from database import AsyncDatabase, Database, Media, Episode
+from tmdb_api import AsyncTMDBApi, TMDBCache, TMDBError
+from filename_parser import ParsedFilename, parse_filename
+from search_cache import SearchCache
+from catalog import CatalogSnapshot
+from title_index import TitleIndex
+from outbound import OutboundScheduler, PRIORITY_BACKGROUND, PRIORITY_CHANNEL
+from concurrency import KeyedLock, PerUserUpdateProcessor, wait_until_running
+from sessions import IndexingSessionStore
+from keyboards import KeyboardCache, build_episode_keyboard, build_season_keyboard
+from bulk_ingest import BulkIngester, IngestReport, build_media, load_manifest
+from publisher import ChannelPublisher
+from metrics import Metrics, MetricsServer
 
 # Configure logging
 logging.basicConfig(
@@ -14,12 +46,62 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Handler, query and TMDB timings, scraped from /metrics and summarised by /perf
+metrics = Metrics()
+
 # Initialize components
-db = Database("media_database.db")
-tmdb = TMDBApi(TMDB_API_KEY)
+db = AsyncDatabase(Database(
+    DATABASE_PATH,
+    pool_size=DATABASE_POOL_SIZE,
+    cache_size_kb=DATABASE_CACHE_SIZE_KB,
+    mmap_size=DATABASE_MMAP_SIZE,
+    search_cache=SearchCache(
+        max_queries=SEARCH_CACHE_MAX_QUERIES,
+        max_rows=SEARCH_CACHE_MAX_ROWS,
+        max_bytes=SEARCH_CACHE_SIZE_KB * 1024
+    ),
+    catalog=CatalogSnapshot() if CATALOG_SNAPSHOT else None
+), metrics=metrics)
+tmdb = AsyncTMDBApi(
+    TMDB_API_KEY,
+    base_url=TMDB_BASE_URL,
+    connect_timeout=TMDB_CONNECT_TIMEOUT,
+    read_timeout=TMDB_READ_TIMEOUT,
+    max_connections=TMDB_MAX_CONNECTIONS,
+    cache=TMDBCache(TMDB_CACHE_PATH, max_entries=TMDB_CACHE_MAX_ENTRIES),
+    rate_limit=TMDB_RATE_LIMIT,
+    max_retries=TMDB_MAX_RETRIES,
+    metrics=metrics
+)
+
+# As-you-type title lookups for inline queries, kept current as media changes
+title_index = TitleIndex()
+db.database.add_listener(title_index)
+
+# Prebuilt season and episode pickers, dropped when a series' episodes change
+keyboard_cache = KeyboardCache()
+db.database.add_listener(keyboard_cache)
+
+# Every Bot API call aimed at a chat goes through this queue
+outbound = OutboundScheduler(
+    global_rate=OUTBOUND_GLOBAL_RATE,
+    private_rate=OUTBOUND_PRIVATE_RATE,
+    group_rate=OUTBOUND_GROUP_RATE_PER_MINUTE / 60,
+    max_retries=OUTBOUND_MAX_RETRIES
+)
 
-# Store temporary data for media indexing
-temp_indexing_data = {}
+# The only update types with handlers, Telegram does not send the rest
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY, Update.INLINE_QUERY]
+
+# Pending TMDB selections of uploaded files, one per upload message
+indexing_sessions = IndexingSessionStore(db, INDEXING_SESSION_TTL, INDEXING_SESSION_MAX)
+
+# Updates of different users run concurrently, check-then-insert sequences
+# on the catalog are locked per title so two uploads never create it twice
+catalog_locks = KeyedLock()
+
+# Results messages per chat whose query is kept for paging
+MAX_SEARCHES_PER_CHAT = 20
 
 # Ensure downloads directory exists
 if not os.path.exists("downloads"):
@@ -40,32 +122,234 @@ async def search_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     query = " ".join(context.args)
-    results = db.search_media(query)
+    results, has_previous, has_next = await db.search_media_page(query, limit=SEARCH_PAGE_SIZE)
     
     if not results:
         await update.message.reply_text("No se encontraron resultados para tu búsqueda.")
         return
     
-    # Display first 5 results
-    for media in results[:5]:
+    message = await update.message.reply_text(
+        f"🔍 Resultados para «{query}»:",
+        reply_markup=search_results_keyboard(results, has_previous, has_next)
+    )
+    
+    # Callback data is limited to 64 bytes, so the query is kept per results message
+    searches = context.chat_data.setdefault("searches", {})
+    searches[message.message_id] = query
+    while len(searches) > MAX_SEARCHES_PER_CHAT:
+        del searches[next(iter(searches))]
+
+def search_results_keyboard(results: List[Media], has_previous: bool, has_next: bool) -> InlineKeyboardMarkup:
+    """One button per result plus ◀/▶ buttons carrying the keyset cursor"""
+    keyboard = []
+    for media in results:
+        icon = "📺" if media.media_type == "tv" else "🎬"
+        label = f"{icon} {media.title} ({media.year})" if media.year else f"{icon} {media.title}"
+        keyboard.append([InlineKeyboardButton(label, callback_data=f"media_{media.id}")])
+    
+    navigation = []
+    if has_previous:
+        navigation.append(InlineKeyboardButton("◀", callback_data=f"sprev_{results[0].id}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton("▶", callback_data=f"snext_{results[-1].id}"))
+    if navigation:
+        keyboard.append(navigation)
+    return InlineKeyboardMarkup(keyboard)
+
+async def search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Move a search results message to the previous or next page"""
+    query = update.callback_query
+    search = context.chat_data.get("searches", {}).get(query.message.message_id)
+    if search is None:
+        await query.answer("Esta búsqueda ha caducado, vuelve a buscar.", show_alert=True)
+        return
+    await query.answer()
+    
+    try:
+        direction, cursor = query.data.split("_")
+        if direction == "snext":
+            results, has_previous, has_next = await db.search_media_page(
+                search, after_id=int(cursor), limit=SEARCH_PAGE_SIZE
+            )
+        else:
+            results, has_previous, has_next = await db.search_media_page(
+                search, before_id=int(cursor), limit=SEARCH_PAGE_SIZE
+            )
+        
+        if not results:
+            await query.edit_message_text("No se encontraron resultados para tu búsqueda.")
+            return
+        
+        await query.edit_message_reply_markup(reply_markup=search_results_keyboard(results, has_previous, has_next))
+    except Exception as e:
+        logger.error(f"Error paging search results: {e}")
+
+async def media_detail_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Open the detail card of a search result"""
+    query = update.callback_query
+    
+    try:
+        media_id = int(query.data.split("_")[1])
+        media = await db.get_media_by_id(media_id)
+        
+        if not media:
+            await query.answer("Contenido no encontrado.", show_alert=True)
+            return
+        await query.answer()
+        
         keyboard = [[InlineKeyboardButton("📥 Descargar", callback_data=f"download_{media.id}")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         try:
-            await update.message.reply_photo(
-                photo=media.poster_url,
-                caption=media.caption,
-                parse_mode="Markdown",
+            await send_poster(
+                context.bot.send_photo,
+                media,
+                chat_id=query.message.chat_id,
                 reply_markup=reply_markup
             )
         except Exception as e:
             logger.error(f"Error sending media {media.id}: {e}")
             # Fallback without image
-            await update.message.reply_text(
+            await context.bot.send_message(
+                chat_id=query.message.chat_id,
                 text=media.caption,
                 parse_mode="Markdown",
                 reply_markup=reply_markup
             )
+    except Exception as e:
+        logger.error(f"Error opening media detail: {e}")
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Answer @bot <text> queries from the in-memory title index"""
+    inline = update.inline_query
+    offset = int(inline.offset) if inline.offset.isdigit() else 0
+    
+    ids = title_index.search(inline.query)
+    page = ids[offset:offset + INLINE_PAGE_SIZE]
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(ids) else ""
+    
+    results = [inline_result(media) for media in await db.get_media_by_ids(page)]
+    # Results are the same for every user, so Telegram may share its cache between them
+    await inline.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False, next_offset=next_offset)
+
+def inline_result(media: Media):
+    """Inline result for a media entry, a cached photo when its poster is already on Telegram"""
+    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("📥 Descargar", callback_data=f"download_{media.id}")]])
+    title = f"{media.title} ({media.year})" if media.year else media.title
+    if media.poster_file_id:
+        return InlineQueryResultCachedPhoto(
+            id=str(media.id),
+            photo_file_id=media.poster_file_id,
+            title=title,
+            caption=media.caption,
+            parse_mode="Markdown",
+            reply_markup=reply_markup
+        )
+    if media.poster_url:
+        return InlineQueryResultPhoto(
+            id=str(media.id),
+            photo_url=media.poster_url,
+            thumbnail_url=media.poster_url,
+            title=title,
+            caption=media.caption,
+            parse_mode="Markdown",
+            reply_markup=reply_markup
+        )
+    return InlineQueryResultArticle(
+        id=str(media.id),
+        title=title,
+        input_message_content=InputTextMessageContent(media.caption, parse_mode="Markdown"),
+        reply_markup=reply_markup
+    )
+
+async def send_poster(send_photo, media: Media, **kwargs):
+    """Send the poster of media with its caption, uploading it from the URL only the first time"""
+    message = await send_photo(
+        photo=media.poster_file_id or media.poster_url,
+        caption=media.caption,
+        parse_mode="Markdown",
+        **kwargs
+    )
+    if not media.poster_file_id and message.photo:
+        # Later sends reference the photo Telegram already stores. The photo
+        # is already sent, so failing here must not make callers send it again
+        try:
+            await db.set_poster_file_id(media.id, message.photo[-1].file_id)
+        except Exception as e:
+            logger.error(f"Error storing the poster file id of media {media.id}: {e}")
+    return message
+
+async def publish_to_channel(bot, media: Media):
+    """Post media to the official channel with its download button"""
+    keyboard = [[InlineKeyboardButton("📥 Descargar", callback_data=f"download_{media.id}")]]
+    return await send_poster(
+        bot.send_photo,
+        media,
+        chat_id=OFFICIAL_CHANNEL_ID,
+        rate_limit_args={"priority": PRIORITY_CHANNEL},
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+# Channel posts are queued with the media row and sent by a background worker
+publisher = ChannelPublisher(
+    db,
+    publish_to_channel,
+    max_attempts=PUBLISH_MAX_ATTEMPTS,
+    base_delay=PUBLISH_RETRY_DELAY,
+    poll_interval=PUBLISH_POLL_INTERVAL
+)
+
+def collect_component_metrics():
+    """Counters kept by the caches and queues themselves, read on every scrape"""
+    tmdb_cache = tmdb.cache.stats()
+    search_cache = db.database.search_cache.stats()
+    outbound_stats = outbound.stats()
+    session_stats = indexing_sessions.stats()
+    return [
+        ("tmdb_cache_hits_total", "counter", "TMDB responses served from the cache",
+         [({}, tmdb_cache["hits"])]),
+        ("tmdb_cache_misses_total", "counter", "TMDB lookups that missed the cache",
+         [({}, tmdb_cache["misses"])]),
+        ("tmdb_cache_entries", "gauge", "TMDB responses held in memory",
+         [({}, tmdb_cache["entries"])]),
+        ("search_cache_hits_total", "counter", "Searches answered from the search cache",
+         [({}, search_cache["hits"])]),
+        ("search_cache_misses_total", "counter", "Searches that had to query SQLite",
+         [({}, search_cache["misses"])]),
+        ("search_cache_bytes", "gauge", "Approximate memory used by the search cache",
+         [({}, search_cache["bytes"])]),
+        ("outbound_queued", "gauge", "Bot API requests waiting for the rate limiter",
+         [({"priority": name}, depth) for name, depth in outbound_stats["queued_by_priority"].items()]),
+        ("outbound_sent_total", "counter", "Bot API requests sent through the rate limiter",
+         [({"priority": name}, sent) for name, sent in outbound_stats["sent"].items()]),
+        ("outbound_flood_retries_total", "counter", "Requests retried after a Telegram RetryAfter",
+         [({}, outbound_stats["retries"])]),
+        ("channel_posts_total", "counter", "Channel posts since startup by outcome",
+         [({"outcome": "published"}, publisher.published), ({"outcome": "failed"}, publisher.failures)]),
+        ("indexing_sessions", "gauge", "Uploaded files waiting for a TMDB selection",
+         [({}, session_stats["sessions"])]),
+    ] + catalog_metrics()
+
+def catalog_metrics():
+    """Size of the catalog snapshot, nothing when it is disabled"""
+    if db.database.catalog is None:
+        return []
+    catalog_stats = db.database.catalog.stats()
+    return [
+        ("catalog_snapshot_rows", "gauge", "Media rows held by the in-memory catalog snapshot",
+         [({}, catalog_stats["rows"])]),
+        ("catalog_snapshot_bytes", "gauge", "Approximate memory used by the catalog snapshot",
+         [({}, catalog_stats["bytes"])]),
+    ]
+
+metrics.add_collector(collect_component_metrics)
+metrics_server = MetricsServer(metrics, METRICS_LISTEN, METRICS_PORT)
+
+async def add_for_publication(media: Media) -> int:
+    """Store new media and queue its channel post, returning its ID"""
+    media_id = await db.add_media_for_publication(media, time.time())
+    publisher.notify()
+    return media_id
 
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show database statistics"""
@@ -73,13 +357,78 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Solo los administradores pueden usar este comando.")
         return
     
-    media_count, episodes_count = db.get_stats()
+    media_count, episodes_count = await db.get_stats()
     stats_message = f"📊 Estadísticas de la Base de Datos:\n\n"
     stats_message += f"Películas/Series: {media_count}\n"
-    stats_message += f"Episodios: {episodes_count}"
+    stats_message += f"Episodios: {episodes_count}\n"
+    
+    cache_stats = tmdb.cache.stats()
+    stats_message += f"\nCaché TMDB: {cache_stats['hits']} aciertos, {cache_stats['misses']} fallos "
+    stats_message += f"({cache_stats['hit_rate']:.0%})"
+    
+    search_stats = db.database.search_cache.stats()
+    stats_message += f"\nCaché de búsquedas: {search_stats['hits']} aciertos, {search_stats['misses']} fallos "
+    stats_message += f"({search_stats['hit_rate']:.0%}), {search_stats['queries']} consultas"
+    
+    outbound_stats = outbound.stats()
+    stats_message += f"\nCola de envíos: {outbound_stats['queued']} pendientes (máximo {outbound_stats['max_depth']}), "
+    stats_message += f"{outbound_stats['retries']} reintentos por límite de Telegram"
+    
+    publish_stats = await publisher.stats()
+    stats_message += f"\nPublicaciones en el canal: {publish_stats['pending']} pendientes, "
+    stats_message += f"{publish_stats['failed']} fallidas definitivamente"
+    
+    session_stats = indexing_sessions.stats()
+    stats_message += f"\nSesiones de indexado: {session_stats['sessions']} pendientes, "
+    stats_message += f"{session_stats['expired']} caducadas, {session_stats['evicted']} descartadas por límite"
+    
+    if db.database.catalog is not None:
+        catalog_stats = db.database.catalog.stats()
+        state = "cargada" if db.database.catalog.loaded else "cargando"
+        stats_message += f"\nCopia del catálogo en memoria ({state}): {catalog_stats['rows']} títulos, "
+        stats_message += f"{catalog_stats['texts']} textos distintos, {catalog_stats['bytes'] / 1024 / 1024:.1f} MiB"
     
     await update.message.reply_text(stats_message)
 
+def format_latencies(title: str, histograms, label: str, limit: int = 10) -> str:
+    """One line per series, slowest by total time first: calls, p50, p95 and max in ms"""
+    rows = sorted(histograms.items(), key=lambda item: item[1].sum, reverse=True)[:limit]
+    if not rows:
+        return f"\n{title}: sin datos\n"
+    text = f"\n{title} (llamadas, p50/p95/máx ms):\n"
+    for labels, histogram in rows:
+        name = dict(labels).get(label, "?")
+        text += (f"{name}: {histogram.count}, {histogram.quantile(0.5) * 1000:.0f}/"
+                 f"{histogram.quantile(0.95) * 1000:.0f}/{histogram.max * 1000:.0f}\n")
+    return text
+
+async def perf(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Summarise handler, database and TMDB timings since startup"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("Solo los administradores pueden usar este comando.")
+        return
+    
+    perf_message = "⏱ Rendimiento desde el arranque:\n"
+    perf_message += format_latencies("Manejadores", metrics.histograms("bot_handler_seconds"), "handler")
+    perf_message += format_latencies("Consultas SQLite", metrics.histograms("db_query_seconds"), "query")
+    perf_message += format_latencies("Peticiones TMDB", metrics.histograms("tmdb_request_seconds"), "endpoint")
+    
+    handler_errors = sum(value for labels, value in metrics.counters("bot_handler_calls_total").items()
+                         if dict(labels).get("outcome") == "error")
+    statuses = {}
+    for labels, value in metrics.counters("tmdb_requests_total").items():
+        status = dict(labels)["status"]
+        statuses[status] = statuses.get(status, 0) + value
+    perf_message += f"\nErrores en manejadores: {handler_errors:.0f}\n"
+    status_counts = ", ".join(f"{status}: {count:.0f}" for status, count in sorted(statuses.items()))
+    perf_message += f"Respuestas TMDB: {status_counts or 'ninguna'}"
+    
+    tmdb_cache = tmdb.cache.stats()
+    search_cache = db.database.search_cache.stats()
+    perf_message += f"\nAciertos de caché: TMDB {tmdb_cache['hit_rate']:.0%}, búsquedas {search_cache['hit_rate']:.0%}"
+    
+    await update.message.reply_text(perf_message)
+
 async def delete_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Delete a media entry by ID"""
     if update.effective_user.id != ADMIN_ID:
@@ -92,14 +441,14 @@ async def delete_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         media_id = int(context.args[0])
-        media = db.get_media_by_id(media_id)
+        media = await db.get_media_by_id(media_id)
         
         if not media:
             await update.message.reply_text(f"No se encontró contenido con ID {media_id}.")
             return
         
         # Delete media from database
-        if db.delete_media(media_id):
+        if await db.delete_media(media_id):
             # Also delete associated file if it exists locally
             if media.file_path and os.path.exists(media.file_path):
                 try:
@@ -132,10 +481,10 @@ async def delete_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # Get count before deletion
-        media_count, episodes_count = db.get_stats()
+        media_count, episodes_count = await db.get_stats()
         
         # Delete all entries
-        deleted_count = db.delete_all_media()
+        deleted_count = await db.delete_all_media()
         
         # Clean up downloads directory
         if os.path.exists("downloads"):
@@ -168,60 +517,28 @@ async def add_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         tmdb_id = int(context.args[0])
-        movie_data = tmdb.get_movie_details(tmdb_id)
+        movie_data = await tmdb.get_movie_details(tmdb_id)
         
         if not movie_data:
             await update.message.reply_text("No se pudo obtener información de la película. Verifica el ID de TMDB.")
             return
         
-        # Check if movie already exists
-        existing_media = db.get_media_by_tmdb_id(tmdb_id)
-        if existing_media:
-            await update.message.reply_text(f"Esta película ya está en la base de datos con ID {existing_media.id}.")
-            return
-        
-        # Format caption and get poster
-        caption = tmdb.format_movie_caption(movie_data)
-        poster_url = tmdb.get_poster_url(movie_data.get("poster_path", ""))
-        
-        # Create media object
-        media = Media(
-            id=0,
-            title=movie_data.get("title", ""),
-            year=int(movie_data.get("release_date", "")[:4]) if movie_data.get("release_date") else 0,
-            media_type="movie",
-            tmdb_id=tmdb_id,
-            file_id="",
-            file_path="",
-            caption=caption,
-            poster_url=poster_url,
-            created_at=""
-        )
-        
-        # Save to database
-        media_id = db.add_media(media)
-        
-        # Send to official channel
-        keyboard = [[InlineKeyboardButton("📥 Descargar", callback_data=f"download_{media_id}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        try:
-            message = await context.bot.send_photo(
-                chat_id=OFFICIAL_CHANNEL_ID,
-                photo=poster_url,
-                caption=caption,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-            
-            # Update with message ID for future reference
-            await update.message.reply_text(f"Película añadida exitosamente con ID {media_id} y publicada en el canal.")
-        except Exception as e:
-            logger.error(f"Error publishing to channel: {e}")
-            await update.message.reply_text(f"Película añadida con ID {media_id} pero hubo un error al publicar en el canal.")
+        # Check if movie already exists, locked like a selection of the same movie
+        async with catalog_locks.lock(("movie", tmdb_id)):
+            existing_media = await db.get_media_by_tmdb_id(tmdb_id, "movie")
+            if existing_media:
+                await update.message.reply_text(f"Esta película ya está en la base de datos con ID {existing_media.id}.")
+                return
+
+            # Save to database, the channel post is sent in the background
+            media_id = await add_for_publication(build_media(tmdb, movie_data, "movie"))
+        await update.message.reply_text(f"Película añadida exitosamente con ID {media_id}, se publicará en el canal en breve.")
             
     except ValueError:
         await update.message.reply_text("Por favor proporciona un ID de TMDB válido.")
+    except TMDBError as e:
+        logger.error(f"TMDB unavailable: {e}")
+        await update.message.reply_text("No se pudo contactar con TMDB. Inténtalo de nuevo en unos minutos.")
     except Exception as e:
         logger.error(f"Error adding movie: {e}")
         await update.message.reply_text("Ocurrió un error al añadir la película.")
@@ -238,64 +555,161 @@ async def add_series(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         tmdb_id = int(context.args[0])
-        tv_data = tmdb.get_tv_show_details(tmdb_id)
+        tv_data = await tmdb.get_tv_show_details(tmdb_id)
         
         if not tv_data:
             await update.message.reply_text("No se pudo obtener información de la serie. Verifica el ID de TMDB.")
             return
         
-        # Check if series already exists
-        existing_media = db.get_media_by_tmdb_id(tmdb_id)
-        if existing_media:
-            await update.message.reply_text(f"Esta serie ya está en la base de datos con ID {existing_media.id}.")
-            return
-        
-        # Format caption and get poster
-        caption = tmdb.format_tv_show_caption(tv_data)
-        poster_url = tmdb.get_poster_url(tv_data.get("poster_path", ""))
-        
-        # Create media object
-        media = Media(
-            id=0,
-            title=tv_data.get("name", ""),
-            year=int(tv_data.get("first_air_date", "")[:4]) if tv_data.get("first_air_date") else 0,
-            media_type="tv",
-            tmdb_id=tmdb_id,
-            file_id="",
-            file_path="",
-            caption=caption,
-            poster_url=poster_url,
-            created_at=""
-        )
-        
-        # Save to database
-        media_id = db.add_media(media)
-        
-        # Send to official channel
-        keyboard = [[InlineKeyboardButton("📥 Descargar", callback_data=f"download_{media_id}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        try:
-            message = await context.bot.send_photo(
-                chat_id=OFFICIAL_CHANNEL_ID,
-                photo=poster_url,
-                caption=caption,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-            
-            # Update with message ID for future reference
-            await update.message.reply_text(f"Serie añadida exitosamente con ID {media_id} y publicada en el canal.")
-        except Exception as e:
-            logger.error(f"Error publishing to channel: {e}")
-            await update.message.reply_text(f"Serie añadida con ID {media_id} pero hubo un error al publicar en el canal.")
+        # Check if series already exists, locked like a selection or episode upload of the same series
+        async with catalog_locks.lock(("tv", tmdb_id)):
+            existing_media = await db.get_media_by_tmdb_id(tmdb_id, "tv")
+            if existing_media:
+                await update.message.reply_text(f"Esta serie ya está en la base de datos con ID {existing_media.id}.")
+                return
+
+            # Save to database, the channel post is sent in the background
+            media_id = await add_for_publication(build_media(tmdb, tv_data, "tv"))
+        await update.message.reply_text(f"Serie añadida exitosamente con ID {media_id}, se publicará en el canal en breve.")
             
     except ValueError:
         await update.message.reply_text("Por favor proporciona un ID de TMDB válido.")
+    except TMDBError as e:
+        logger.error(f"TMDB unavailable: {e}")
+        await update.message.reply_text("No se pudo contactar con TMDB. Inténtalo de nuevo en unos minutos.")
     except Exception as e:
         logger.error(f"Error adding series: {e}")
         await update.message.reply_text("Ocurrió un error al añadir la serie.")
 
+async def bulk_ingest(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Add every title of a manifest file, replying to the message that carries it"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("Solo los administradores pueden usar este comando.")
+        return
+    
+    manifest_message = update.message.reply_to_message
+    if not manifest_message or not manifest_message.document:
+        await update.message.reply_text("Responde con /bulk_ingest al archivo del manifiesto (JSON lines).")
+        return
+    
+    try:
+        manifest_file = await context.bot.get_file(manifest_message.document.file_id)
+        content = await manifest_file.download_as_bytearray()
+        entries = load_manifest(content.decode("utf-8").splitlines())
+    except ValueError as e:
+        await update.message.reply_text(f"El manifiesto no es válido: {e}")
+        return
+    except Exception as e:
+        logger.error(f"Error reading manifest: {e}")
+        await update.message.reply_text("No se pudo descargar el manifiesto.")
+        return
+    
+    status = await update.message.reply_text(f"⏳ Cargando {len(entries)} títulos...")
+    # Runs in the background so the bot keeps answering while the catalog loads
+    context.application.create_task(run_bulk_ingest(status, entries))
+
+async def run_bulk_ingest(status, entries):
+    """Ingest manifest entries, editing the status message as batches complete"""
+    last_edit = 0.0
+    
+    async def report_progress(report: IngestReport):
+        nonlocal last_edit
+        # Telegram rate limits message edits, a few seconds apart is plenty
+        if time.monotonic() - last_edit < 3:
+            return
+        last_edit = time.monotonic()
+        try:
+            await status.edit_text(f"⏳ {report.summary()}")
+        except Exception as e:
+            logger.error(f"Error updating bulk ingest progress: {e}")
+    
+    try:
+        ingester = BulkIngester(db, tmdb, batch_size=BULK_BATCH_SIZE, concurrency=BULK_CONCURRENCY)
+        report = await ingester.ingest(entries, report_progress)
+    except Exception as e:
+        logger.error(f"Error in bulk ingest: {e}")
+        await status.edit_text("Ocurrió un error durante la carga masiva.")
+        return
+    
+    message = f"✅ Carga masiva completada\n{report.summary()}"
+    if report.errors:
+        message += "\n\nErrores:\n" + "\n".join(report.errors[:20])
+        if len(report.errors) > 20:
+            message += f"\n... y {len(report.errors) - 20} más"
+    await status.edit_text(message[:4096])
+
+async def find_or_create_series(context: ContextTypes.DEFAULT_TYPE, parsed: ParsedFilename):
+    """Resolve the series of an episode file to a media row, creating it from TMDB if needed
+
+    Returns (media, created) or (None, False) when TMDB has no matching series.
+    """
+    # A series already in the catalog under this exact title needs no TMDB call
+    wanted = parsed.title.casefold()
+    for media in await db.search_media(parsed.title, limit=10):
+        if media.media_type == "tv" and wanted in (media.title.casefold(), (media.original_title or "").casefold()):
+            return media, False
+    
+    shows = await tmdb.search_tv_shows(parsed.title)
+    if not shows:
+        return None, False
+    
+    # Prefer the show whose first air year matches the one in the filename
+    show = shows[0]
+    if parsed.year:
+        show = next((s for s in shows if (s.get("first_air_date") or "")[:4] == str(parsed.year)), show)
+    
+    # The same lock as a select_tv press for this show, so the two never both insert it;
+    # it is always taken inside the title lock, never the other way around
+    async with catalog_locks.lock(("tv", show["id"])):
+        existing_media = await db.get_media_by_tmdb_id(show["id"], "tv")
+        if existing_media:
+            return existing_media, False
+        
+        tv_data = await tmdb.get_tv_show_details(show["id"])
+        if not tv_data:
+            return None, False
+        
+        media = build_media(tmdb, tv_data, "tv")
+        media.id = await add_for_publication(media)
+        return media, True
+
+async def index_episode_file(update: Update, context: ContextTypes.DEFAULT_TYPE, file_id: str,
+                             parsed: ParsedFilename) -> bool:
+    """Store an uploaded SxxEyy file as episode(s) of its series, False if no series matched"""
+    async with catalog_locks.lock(("series", parsed.title.casefold())):
+        media, created = await find_or_create_series(context, parsed)
+    if not media:
+        return False
+    
+    # Season listings are cached by the TMDB client, so a full season upload
+    # fetches each season once
+    season_data = await tmdb.get_season_details(media.tmdb_id, parsed.season) or {}
+    episode_titles = {
+        item.get("episode_number"): item.get("name", "")
+        for item in season_data.get("episodes", [])
+    }
+    
+    indexed = []
+    for episode_number in parsed.episodes:
+        title = episode_titles.get(episode_number) or f"Episodio {episode_number}"
+        await db.add_episode(Episode(
+            id=0,
+            media_id=media.id,
+            season_number=parsed.season,
+            episode_number=episode_number,
+            title=title,
+            file_id=file_id,
+            file_path="",
+            created_at=""
+        ))
+        indexed.append(f"S{parsed.season:02d}E{episode_number:02d} {title}")
+    
+    message = f"✅ {media.title}: " + ", ".join(indexed) + " indexado."
+    if created:
+        message += f"\nSerie nueva añadida con ID {media.id}, se publicará en el canal en breve."
+    await update.message.reply_text(message)
+    return True
+
 async def handle_database_group_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle messages from the database group to index media files"""
     if update.effective_chat.id != DATABASE_GROUP_ID:
@@ -309,14 +723,29 @@ async def handle_database_group_messages(update: Update, context: ContextTypes.D
     file_id = update.message.document.file_id if update.message.document else update.message.video.file_id
     file_name = update.message.document.file_name if update.message.document else "video.mp4"
     
-    # Clean filename and search TMDB automatically
-    clean_name = tmdb.clean_filename(file_name)
+    # Parse the filename and search TMDB automatically
+    parsed = parse_filename(file_name)
+    clean_name = parsed.title
     
-    # Search for movies and TV shows
-    movies = tmdb.search_movies(clean_name)[:3]  # Top 3 matches
-    tv_shows = tmdb.search_tv_shows(clean_name)[:3]  # Top 3 matches
+    try:
+        # Episodes (SxxEyy) are indexed straight away against their series
+        if parsed.is_episode and await index_episode_file(update, context, file_id, parsed):
+            return
+        
+        # Search for movies and TV shows at the same time
+        movies, tv_shows = await tmdb.search_all(clean_name)
+    except TMDBError as e:
+        logger.error(f"TMDB search failed for {file_name}: {e}")
+        await update.message.reply_text(
+            f"⚠️ TMDB no respondió al buscar {file_name}. Vuelve a subir el archivo en unos minutos."
+        )
+        return
+    movies = movies[:3]  # Top 3 matches
+    tv_shows = tv_shows[:3]  # Top 3 matches
     
-    # Prepare keyboard with search results
+    # Prepare keyboard with search results, the buttons carry the upload
+    # message id so each upload keeps its own session
+    session_id = update.message.message_id
     keyboard = []
     
     # Add movie options
@@ -326,7 +755,7 @@ async def handle_database_group_messages(update: Update, context: ContextTypes.D
             title = movie.get("title", "Unknown")
             year = movie.get("release_date", "")[:4] if movie.get("release_date") else "N/A"
             button_text = f"{title} ({year})"
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"select_movie_{movie['id']}")])
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"select_movie_{session_id}_{movie['id']}")])
     
     # Add TV show options
     if tv_shows:
@@ -335,20 +764,20 @@ async def handle_database_group_messages(update: Update, context: ContextTypes.D
             title = show.get("name", "Unknown")
             year = show.get("first_air_date", "")[:4] if show.get("first_air_date") else "N/A"
             button_text = f"{title} ({year})"
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"select_tv_{show['id']}")])
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"select_tv_{session_id}_{show['id']}")])
     
     # Add manual option
-    keyboard.append([InlineKeyboardButton("➕ Ingresar ID manualmente", callback_data="manual_id")])
+    keyboard.append([InlineKeyboardButton("➕ Ingresar ID manualmente", callback_data=f"manual_id_{session_id}")])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Store data for later use
-    temp_indexing_data[update.effective_user.id] = {
+    indexing_sessions.put(update.effective_user.id, session_id, {
         "file_id": file_id,
         "file_name": file_name,
         "clean_name": clean_name,
-        "message_id": update.message.message_id
-    }
+        "message_id": session_id
+    })
     
     await update.message.reply_text(
         f"Nuevo archivo detectado: {file_name}\n\nResultados de búsqueda automatizada:",
@@ -363,45 +792,15 @@ async def download_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Extract media ID from callback data
         media_id = int(query.data.split("_")[1])
-        media = db.get_media_by_id(media_id)
+        media = await db.get_media_by_id(media_id)
         
         if not media:
-            await query.edit_message_text("Contenido no encontrado.")
+            await edit_message(query, "Contenido no encontrado.")
             return
         
-        # For TV series, show episode selection
+        # For TV series, show the season picker
         if media.media_type == "tv":
-            episodes = db.get_episodes_by_media_id(media_id)
-            
-            if not episodes:
-                await query.edit_message_text("Esta serie aún no tiene episodios disponibles.")
-                return
-            
-            # Create episode selection keyboard
-            keyboard = []
-            current_season = None
-            season_row = []
-            
-            for episode in episodes:
-                if episode.season_number != current_season:
-                    if current_season is not None:
-                        keyboard.append(season_row)
-                    current_season = episode.season_number
-                    season_row = []
-                
-                button_text = f"S{episode.season_number}E{episode.episode_number}"
-                season_row.append(InlineKeyboardButton(button_text, callback_data=f"episode_{episode.id}"))
-            
-            if season_row:
-                keyboard.append(season_row)
-            
-            keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data=f"back_{media_id}")])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                f"Selecciona un episodio de {media.title}:",
-                reply_markup=reply_markup
-            )
+            await show_season_picker(query, media)
         else:
             # For movies, send the file directly
             if media.file_id:
@@ -411,13 +810,85 @@ async def download_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     caption=media.caption,
                     parse_mode="Markdown"
                 )
-                await query.edit_message_text("Archivo enviado. ¡Disfruta!")
+                await edit_message(query, "Archivo enviado. ¡Disfruta!")
             else:
-                await query.edit_message_text("El archivo no está disponible actualmente.")
+                await edit_message(query, "El archivo no está disponible actualmente.")
                 
     except Exception as e:
         logger.error(f"Error handling download callback: {e}")
-        await query.edit_message_text("Ocurrió un error al procesar tu solicitud.")
+        await edit_message(query, "Ocurrió un error al procesar tu solicitud.")
+
+async def edit_message(query, text: str, reply_markup: InlineKeyboardMarkup = None, parse_mode: str = None):
+    """Edit the text of a callback message, or its caption when it is a photo
+
+    Only messages in the user's private chat are edited. Channel and group
+    posts are shared with every member, and so can be messages sent through
+    inline mode (which do not come with the callback query), so the reply
+    is sent to the user privately instead.
+    """
+    if query.message is None or query.message.chat.type != ChatType.PRIVATE:
+        await query.get_bot().send_message(
+            chat_id=query.from_user.id,
+            text=text,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+    elif query.message.photo:
+        await query.edit_message_caption(caption=text, parse_mode=parse_mode, reply_markup=reply_markup)
+    else:
+        await query.edit_message_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+
+async def show_season_picker(query, media: Media):
+    """Show the seasons of a series, straight to the episodes when there is only one"""
+    reply_markup = keyboard_cache.get(media.id)
+    if reply_markup is None:
+        seasons = await db.get_seasons(media.id)
+        if len(seasons) == 1:
+            await show_episode_page(query, media, seasons[0][0], 0)
+            return
+        if seasons:
+            reply_markup = build_season_keyboard(media.id, seasons)
+            keyboard_cache.put(reply_markup, media.id)
+    
+    if reply_markup is None:
+        await edit_message(query, "Esta serie aún no tiene episodios disponibles.",
+                           InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Volver", callback_data=f"back_{media.id}")]]))
+        return
+    await edit_message(query, f"Selecciona una temporada de {media.title}:", reply_markup)
+
+async def show_episode_page(query, media: Media, season: int, page: int):
+    """Show one page of the episode grid of a season"""
+    reply_markup = keyboard_cache.get(media.id, season, page)
+    if reply_markup is None:
+        episodes = await db.get_episodes_by_season(media.id, season)
+        # Every page of a season shares one back target, cached under the same key: a
+        # single-season series has no season picker, so it goes back to the card
+        single_season = len(await db.get_seasons(media.id)) == 1
+        back_data = f"back_{media.id}" if single_season else f"download_{media.id}"
+        reply_markup = build_episode_keyboard(media.id, season, episodes, page, back_data)
+        keyboard_cache.put(reply_markup, media.id, season, page)
+    await edit_message(query, f"Selecciona un episodio de {media.title} (temporada {season}):", reply_markup)
+
+async def season_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle season and episode page selection"""
+    query = update.callback_query
+    await query.answer()
+    
+    try:
+        # season_<media_id>_<season> or epage_<media_id>_<season>_<page>
+        parts = query.data.split("_")
+        media_id, season = int(parts[1]), int(parts[2])
+        page = int(parts[3]) if len(parts) > 3 else 0
+        media = await db.get_media_by_id(media_id)
+        
+        if not media:
+            await edit_message(query, "Contenido no encontrado.")
+            return
+        
+        await show_episode_page(query, media, season, page)
+    except Exception as e:
+        logger.error(f"Error handling season callback: {e}")
+        await edit_message(query, "Ocurrió un error al procesar tu solicitud.")
 
 async def episode_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle episode selection"""
@@ -429,14 +900,14 @@ async def episode_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         episode_id = int(query.data.split("_")[1])
         
         # Get episode and associated media
-        episode = db.get_episode_by_id(episode_id)
+        episode = await db.get_episode_by_id(episode_id)
         if not episode:
-            await query.edit_message_text("Episodio no encontrado.")
+            await edit_message(query, "Episodio no encontrado.")
             return
         
-        media = db.get_media_by_id(episode.media_id)
+        media = await db.get_media_by_id(episode.media_id)
         if not media:
-            await query.edit_message_text("Contenido no encontrado.")
+            await edit_message(query, "Contenido no encontrado.")
             return
         
         # Send the episode file
@@ -447,13 +918,13 @@ async def episode_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 caption=f"{media.title} - S{episode.season_number:02d}E{episode.episode_number:02d}: {episode.title}",
                 parse_mode="Markdown"
             )
-            await query.edit_message_text("Episodio enviado. ¡Disfruta!")
+            await edit_message(query, "Episodio enviado. ¡Disfruta!")
         else:
-            await query.edit_message_text("El episodio no está disponible actualmente.")
+            await edit_message(query, "El episodio no está disponible actualmente.")
             
     except Exception as e:
         logger.error(f"Error handling episode callback: {e}")
-        await query.edit_message_text("Ocurrió un error al procesar tu solicitud.")
+        await edit_message(query, "Ocurrió un error al procesar tu solicitud.")
 
 async def back_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle back button presses"""
@@ -463,42 +934,52 @@ async def back_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Extract media ID from callback data
         media_id = int(query.data.split("_")[1])
-        media = db.get_media_by_id(media_id)
+        media = await db.get_media_by_id(media_id)
         
         if not media:
-            await query.edit_message_text("Contenido no encontrado.")
+            await edit_message(query, "Contenido no encontrado.")
             return
         
         # Show original media view
         keyboard = [[InlineKeyboardButton("📥 Descargar", callback_data=f"download_{media_id}")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.edit_message_text(
-            text=media.caption,
-            parse_mode="Markdown",
-            reply_markup=reply_markup
-        )
+        await edit_message(query, media.caption, reply_markup, parse_mode="Markdown")
         
     except Exception as e:
         logger.error(f"Error handling back callback: {e}")
-        await query.edit_message_text("Ocurrió un error al procesar tu solicitud.")
+        await edit_message(query, "Ocurrió un error al procesar tu solicitud.")
 
 async def handle_selection_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle TMDB selection callbacks"""
     query = update.callback_query
     await query.answer()
     
+    # Header and page counter buttons do nothing, whatever the session state
+    if query.data == "noop":
+        return
+    
     user_id = query.from_user.id
     
+    # select_movie_<session>_<tmdb_id>, select_tv_<session>_<tmdb_id> or manual_id_<session>,
+    # keyboards sent before sessions were per upload carry no session
+    parts = query.data.split("_")
+    session = None
+    if query.data.startswith("manual_id_") and len(parts) == 3:
+        session = parts[-1]
+    elif query.data.startswith("select_") and len(parts) == 4:
+        session = parts[-2]
+    data = None
+    if session is not None and session.isdigit():
+        data = indexing_sessions.get(user_id, int(session))
+    
     # Check if user has pending indexing data
-    if user_id not in temp_indexing_data:
+    if data is None:
         await query.edit_message_text("Sesión expirada. Por favor, sube el archivo nuevamente.")
         return
     
-    data = temp_indexing_data[user_id]
-    
     try:
-        if query.data == "manual_id":
+        if query.data.startswith("manual_id_"):
             # Prompt for manual TMDB ID entry
             await query.edit_message_text(
                 "Por favor, ingresa el ID de TMDB:\n\n"
@@ -506,17 +987,16 @@ async def handle_selection_callback(update: Update, context: ContextTypes.DEFAUL
                 "Para series: /add_series <id>"
             )
             return
-        elif query.data == "noop":
-            # Do nothing for header buttons
-            return
         elif query.data.startswith("select_movie_"):
             # Extract movie ID
             tmdb_id = int(query.data.split("_")[-1])
-            await process_movie_addition(update, context, tmdb_id, data)
+            async with catalog_locks.lock(("movie", tmdb_id)):
+                await process_movie_addition(update, context, tmdb_id, data)
         elif query.data.startswith("select_tv_"):
             # Extract TV show ID
             tmdb_id = int(query.data.split("_")[-1])
-            await process_series_addition(update, context, tmdb_id, data)
+            async with catalog_locks.lock(("tv", tmdb_id)):
+                await process_series_addition(update, context, tmdb_id, data)
     except Exception as e:
         logger.error(f"Error handling selection callback: {e}")
         await query.edit_message_text("Ocurrió un error al procesar tu solicitud.")
@@ -524,61 +1004,29 @@ async def handle_selection_callback(update: Update, context: ContextTypes.DEFAUL
 async def process_movie_addition(update: Update, context: ContextTypes.DEFAULT_TYPE, tmdb_id: int, file_data: dict):
     """Process movie addition with automatic TMDB data fetching"""
     try:
-        movie_data = tmdb.get_movie_details(tmdb_id)
+        movie_data = await tmdb.get_movie_details(tmdb_id)
         
         if not movie_data:
             await update.callback_query.edit_message_text("No se pudo obtener información de la película. Verifica el ID de TMDB.")
             return
         
         # Check if movie already exists
-        existing_media = db.get_media_by_tmdb_id(tmdb_id)
+        existing_media = await db.get_media_by_tmdb_id(tmdb_id, "movie")
         if existing_media:
             await update.callback_query.edit_message_text(f"Esta película ya está en la base de datos con ID {existing_media.id}.")
             return
         
-        # Format caption and get poster
-        caption = tmdb.format_movie_caption(movie_data)
-        poster_url = tmdb.get_poster_url(movie_data.get("poster_path", ""))
+        # Save to database, the channel post is sent in the background
+        media_id = await add_for_publication(build_media(tmdb, movie_data, "movie", file_data["file_id"]))
         
-        # Create media object
-        media = Media(
-            id=0,
-            title=movie_data.get("title", ""),
-            year=int(movie_data.get("release_date", "")[:4]) if movie_data.get("release_date") else 0,
-            media_type="movie",
-            tmdb_id=tmdb_id,
-            file_id=file_data["file_id"],
-            file_path="",
-            caption=caption,
-            poster_url=poster_url,
-            created_at=""
-        )
+        # The upload is indexed, its session is done
+        indexing_sessions.pop(update.callback_query.from_user.id, file_data["message_id"])
         
-        # Save to database
-        media_id = db.add_media(media)
-        
-        # Send to official channel
-        keyboard = [[InlineKeyboardButton("📥 Descargar", callback_data=f"download_{media_id}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        try:
-            message = await context.bot.send_photo(
-                chat_id=OFFICIAL_CHANNEL_ID,
-                photo=poster_url,
-                caption=caption,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-            
-            # Clear temporary data
-            if update.callback_query.from_user.id in temp_indexing_data:
-                del temp_indexing_data[update.callback_query.from_user.id]
-            
-            await update.callback_query.edit_message_text(f"✅ Película añadida exitosamente con ID {media_id} y publicada en el canal.")
-        except Exception as e:
-            logger.error(f"Error publishing to channel: {e}")
-            await update.callback_query.edit_message_text(f"Película añadida con ID {media_id} pero hubo un error al publicar en el canal.")
+        await update.callback_query.edit_message_text(f"✅ Película añadida exitosamente con ID {media_id}, se publicará en el canal en breve.")
             
+    except TMDBError as e:
+        logger.error(f"TMDB unavailable: {e}")
+        await update.callback_query.edit_message_text("No se pudo contactar con TMDB. Inténtalo de nuevo en unos minutos.")
     except Exception as e:
         logger.error(f"Error adding movie: {e}")
         await update.callback_query.edit_message_text("Ocurrió un error al añadir la película.")
@@ -586,92 +1034,179 @@ async def process_movie_addition(update: Update, context: ContextTypes.DEFAULT_T
 async def process_series_addition(update: Update, context: ContextTypes.DEFAULT_TYPE, tmdb_id: int, file_data: dict):
     """Process TV series addition with automatic TMDB data fetching"""
     try:
-        tv_data = tmdb.get_tv_show_details(tmdb_id)
+        tv_data = await tmdb.get_tv_show_details(tmdb_id)
         
         if not tv_data:
             await update.callback_query.edit_message_text("No se pudo obtener información de la serie. Verifica el ID de TMDB.")
             return
         
         # Check if series already exists
-        existing_media = db.get_media_by_tmdb_id(tmdb_id)
+        existing_media = await db.get_media_by_tmdb_id(tmdb_id, "tv")
         if existing_media:
             await update.callback_query.edit_message_text(f"Esta serie ya está en la base de datos con ID {existing_media.id}.")
             return
         
-        # Format caption and get poster
-        caption = tmdb.format_tv_show_caption(tv_data)
-        poster_url = tmdb.get_poster_url(tv_data.get("poster_path", ""))
-        
-        # Create media object
-        media = Media(
-            id=0,
-            title=tv_data.get("name", ""),
-            year=int(tv_data.get("first_air_date", "")[:4]) if tv_data.get("first_air_date") else 0,
-            media_type="tv",
-            tmdb_id=tmdb_id,
-            file_id=file_data["file_id"],
-            file_path="",
-            caption=caption,
-            poster_url=poster_url,
-            created_at=""
-        )
+        # Save to database, the channel post is sent in the background
+        media_id = await add_for_publication(build_media(tmdb, tv_data, "tv", file_data["file_id"]))
         
-        # Save to database
-        media_id = db.add_media(media)
+        # The upload is indexed, its session is done
+        indexing_sessions.pop(update.callback_query.from_user.id, file_data["message_id"])
         
-        # Send to official channel
-        keyboard = [[InlineKeyboardButton("📥 Descargar", callback_data=f"download_{media_id}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        try:
-            message = await context.bot.send_photo(
-                chat_id=OFFICIAL_CHANNEL_ID,
-                photo=poster_url,
-                caption=caption,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-            
-            # Clear temporary data
-            if update.callback_query.from_user.id in temp_indexing_data:
-                del temp_indexing_data[update.callback_query.from_user.id]
-            
-            await update.callback_query.edit_message_text(f"✅ Serie añadida exitosamente con ID {media_id} y publicada en el canal.")
-        except Exception as e:
-            logger.error(f"Error publishing to channel: {e}")
-            await update.callback_query.edit_message_text(f"Serie añadida con ID {media_id} pero hubo un error al publicar en el canal.")
+        await update.callback_query.edit_message_text(f"✅ Serie añadida exitosamente con ID {media_id}, se publicará en el canal en breve.")
             
+    except TMDBError as e:
+        logger.error(f"TMDB unavailable: {e}")
+        await update.callback_query.edit_message_text("No se pudo contactar con TMDB. Inténtalo de nuevo en unos minutos.")
     except Exception as e:
         logger.error(f"Error adding series: {e}")
         await update.callback_query.edit_message_text("Ocurrió un error al añadir la serie.")
 
-def main():
-    """Start the bot"""
+async def backfill_poster_file_ids(application: Application):
+    """Upload the posters of media stored before file_ids were kept, one every few seconds"""
+    await wait_until_running(application)
+    after_id = 0
+    while application.running:
+        batch = await db.get_media_without_poster_file_id(after_id)
+        if not batch:
+            logger.info("Poster backfill finished")
+            return
+        for media in batch:
+            if not application.running:
+                return
+            # Failed rows are skipped for this run and retried on the next start
+            after_id = media.id
+            try:
+                message = await application.bot.send_photo(
+                    chat_id=DATABASE_GROUP_ID,
+                    photo=media.poster_url,
+                    disable_notification=True,
+                    rate_limit_args={"priority": PRIORITY_BACKGROUND}
+                )
+                await db.set_poster_file_id(media.id, message.photo[-1].file_id)
+                await application.bot.delete_message(
+                    chat_id=DATABASE_GROUP_ID,
+                    message_id=message.message_id,
+                    rate_limit_args={"priority": PRIORITY_BACKGROUND}
+                )
+            except Exception as e:
+                logger.error(f"Error backfilling poster of media {media.id}: {e}")
+            await asyncio.sleep(POSTER_BACKFILL_INTERVAL)
+
+async def load_catalog():
+    """Fill the catalog snapshot in the background"""
+    start = time.perf_counter()
+    try:
+        rows = await db.load_catalog()
+    except Exception as e:
+        logger.error(f"Error loading the catalog snapshot: {e}")
+        return
+    catalog_stats = db.database.catalog.stats()
+    logger.info(f"Catalog snapshot loaded with {rows} titles in {time.perf_counter() - start:.1f}s, "
+                f"{catalog_stats['bytes'] / 1024 / 1024:.1f} MiB")
+
+# Loops started by post_init
+background_tasks: List[asyncio.Task] = []
+
+async def post_init(application: Application):
+    """Start background work once the bot is initialized"""
+    title_index.load(await db.get_media_titles())
+    logger.info(f"Title index loaded with {len(title_index)} titles")
+    await indexing_sessions.load()
+    logger.info(f"Restored {len(indexing_sessions)} pending indexing sessions")
+    # Plain tasks, the loops wait for the application to start and are
+    # cancelled in post_shutdown
+    background_tasks.append(asyncio.create_task(
+        indexing_sessions.run(application, INDEXING_SESSION_FLUSH_INTERVAL)
+    ))
+    background_tasks.append(asyncio.create_task(publisher.run(application)))
+    if db.database.catalog is not None:
+        # Reads go to SQLite until the snapshot is in place
+        background_tasks.append(asyncio.create_task(load_catalog()))
+    if METRICS_PORT:
+        await metrics_server.start()
+    if POSTER_BACKFILL_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(backfill_poster_file_ids(application)))
+
+async def post_shutdown(application: Application):
+    """Release database and HTTP resources once the bot stops"""
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await metrics_server.stop()
+    await indexing_sessions.flush()
+    await tmdb.aclose()
+    tmdb.cache.close()
+    db.close()
+
+def build_application(update_processor: PerUserUpdateProcessor = None) -> Application:
+    """Create the Application with every handler registered, ready to be run"""
     # Create the Application and pass it your bot's token
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(TELEGRAM_BASE_URL)
+        .base_file_url(TELEGRAM_BASE_FILE_URL)
+        .concurrent_updates(update_processor or PerUserUpdateProcessor(UPDATE_WORKERS))
+        .rate_limiter(outbound)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    # Every handler records its latency under its own name
+    timed = metrics.instrument_handler
 
     # Register command handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("search", search_media))
-    application.add_handler(CommandHandler("stats", stats))
-    application.add_handler(CommandHandler("delete_media", delete_media))
-    application.add_handler(CommandHandler("delete_all", delete_all))
-    application.add_handler(CommandHandler("add_movie", add_movie))
-    application.add_handler(CommandHandler("add_series", add_series))
+    application.add_handler(CommandHandler("start", timed(start)))
+    application.add_handler(CommandHandler("help", timed(help_command)))
+    application.add_handler(CommandHandler("search", timed(search_media)))
+    application.add_handler(CommandHandler("stats", timed(stats)))
+    application.add_handler(CommandHandler("perf", timed(perf)))
+    application.add_handler(CommandHandler("delete_media", timed(delete_media)))
+    application.add_handler(CommandHandler("delete_all", timed(delete_all)))
+    application.add_handler(CommandHandler("add_movie", timed(add_movie)))
+    application.add_handler(CommandHandler("add_series", timed(add_series)))
+    application.add_handler(CommandHandler("bulk_ingest", timed(bulk_ingest)))
 
     # Register message handler for database group
     application.add_handler(MessageHandler(filters.Chat(DATABASE_GROUP_ID) & (filters.Document.ALL | filters.VIDEO), 
-                                          handle_database_group_messages))
+                                          timed(handle_database_group_messages)))
 
     # Register callback query handler for inline buttons
-    application.add_handler(CallbackQueryHandler(download_callback, pattern="^download_"))
-    application.add_handler(CallbackQueryHandler(episode_callback, pattern="^episode_"))
-    application.add_handler(CallbackQueryHandler(back_callback, pattern="^back_"))
-    application.add_handler(CallbackQueryHandler(handle_selection_callback, pattern="^(select_|manual_id|noop)"))
+    # Inline mode must be enabled with /setinline in @BotFather
+    application.add_handler(InlineQueryHandler(timed(inline_query)))
+
+    application.add_handler(CallbackQueryHandler(timed(search_page_callback), pattern="^s(prev|next)_"))
+    application.add_handler(CallbackQueryHandler(timed(media_detail_callback), pattern="^media_"))
+    application.add_handler(CallbackQueryHandler(timed(download_callback), pattern="^download_"))
+    application.add_handler(CallbackQueryHandler(timed(season_callback), pattern="^(season|epage)_"))
+    application.add_handler(CallbackQueryHandler(timed(episode_callback), pattern="^episode_"))
+    application.add_handler(CallbackQueryHandler(timed(back_callback), pattern="^back_"))
+    application.add_handler(CallbackQueryHandler(timed(handle_selection_callback), pattern="^(select_|manual_id|noop)"))
+    return application
+
+def main():
+    """Start the bot"""
+    application = build_application()
 
     # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL:
+            logger.error("BOT_MODE=webhook requires WEBHOOK_URL")
+            return
+        # A fresh secret per start still works, set_webhook registers it each time
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or secrets.token_urlsafe(32),
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=ALLOWED_UPDATES
+        )
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""Load many titles into the catalog at once from a manifest.
+
+The manifest is JSON lines, one title per line, identified either by TMDB ID
+or by release name:
+
+    {"tmdb_id": 19995, "type": "movie", "file_id": "BQACAgQAAx..."}
+    {"file_name": "Dune.Part.Two.2024.1080p.WEB-DL.mkv", "file_id": "BQACAgQAAx..."}
+
+Usage: python bulk_ingest.py MANIFEST [--batch-size N] [--concurrency N]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from database import AsyncDatabase, Media
+from filename_parser import parse_filename
+from tmdb_api import AsyncTMDBApi, TMDBError
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = ("movie", "tv")
+
+@dataclass
+class ManifestEntry:
+    file_id: str = ""
+    tmdb_id: Optional[int] = None
+    # Empty for file names, guessed from the parsed release name
+    media_type: str = ""
+    file_name: str = ""
+
+@dataclass
+class IngestReport:
+    total: int = 0
+    processed: int = 0
+    added: int = 0
+    skipped: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        """One line progress summary"""
+        return (f"{self.processed}/{self.total} procesados: {self.added} añadidos, "
+                f"{self.skipped} ya existentes, {self.failed} fallidos ({self.elapsed:.1f}s)")
+
+def load_manifest(lines: Iterable[str]) -> List[ManifestEntry]:
+    """Parse manifest lines, skipping blank lines and # comments"""
+    entries = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            item = json.loads(line)
+            entry = ManifestEntry(
+                file_id=str(item.get("file_id") or ""),
+                tmdb_id=int(item["tmdb_id"]) if item.get("tmdb_id") is not None else None,
+                media_type=item.get("type") or item.get("media_type") or "",
+                file_name=item.get("file_name") or ""
+            )
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ValueError(f"Line {number}: {e}") from e
+        if entry.tmdb_id is None and not entry.file_name:
+            raise ValueError(f"Line {number}: needs tmdb_id or file_name")
+        if entry.tmdb_id is not None and not entry.media_type:
+            entry.media_type = "movie"
+        if entry.media_type and entry.media_type not in MEDIA_TYPES:
+            raise ValueError(f"Line {number}: unknown type {entry.media_type!r}")
+        entries.append(entry)
+    return entries
+
+def build_media(tmdb: AsyncTMDBApi, data: Dict, media_type: str, file_id: str = "") -> Media:
+    """Media row for a TMDB movie or tv details payload"""
+    if media_type == "movie":
+        title, original_title, date = data.get("title", ""), data.get("original_title", ""), data.get("release_date")
+        caption = tmdb.format_movie_caption(data)
+    else:
+        title, original_title, date = data.get("name", ""), data.get("original_name", ""), data.get("first_air_date")
+        caption = tmdb.format_tv_show_caption(data)
+    return Media(
+        id=0,
+        title=title,
+        year=int(date[:4]) if date else 0,
+        media_type=media_type,
+        tmdb_id=data["id"],
+        file_id=file_id,
+        file_path="",
+        caption=caption,
+        poster_url=tmdb.get_poster_url(data.get("poster_path", "")),
+        created_at="",
+        original_title=original_title,
+        overview=data.get("overview", "")
+    )
+
+class BulkIngester:
+    """Resolves manifest entries against TMDB with bounded concurrency and writes them in batches"""
+
+    def __init__(self, db: AsyncDatabase, tmdb: AsyncTMDBApi, batch_size: int = 500, concurrency: int = 8):
+        self.db = db
+        self.tmdb = tmdb
+        self.batch_size = max(1, batch_size)
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def ingest(self, entries: List[ManifestEntry],
+                     progress: Optional[Callable[[IngestReport], Awaitable[None]]] = None) -> IngestReport:
+        """Add every entry not yet in the catalog, calling progress after each batch"""
+        report = IngestReport(total=len(entries))
+        started = time.monotonic()
+        # (media_type, tmdb_id) already written or queued by this run
+        seen = set()
+
+        for start in range(0, len(entries), self.batch_size):
+            batch = entries[start:start + self.batch_size]
+            identities = await asyncio.gather(*(self._identify(entry, report) for entry in batch))
+
+            wanted: Dict[Tuple[str, int], ManifestEntry] = {}
+            for entry, identity in zip(batch, identities):
+                if identity is None:
+                    report.failed += 1
+                elif identity in seen or identity in wanted:
+                    report.skipped += 1
+                else:
+                    wanted[identity] = entry
+
+            # Titles already in the catalog are skipped before fetching their details
+            for media_type in MEDIA_TYPES:
+                ids = [tmdb_id for kind, tmdb_id in wanted if kind == media_type]
+                if ids:
+                    for tmdb_id in await self.db.get_existing_tmdb_ids(media_type, ids):
+                        del wanted[(media_type, tmdb_id)]
+                        report.skipped += 1
+            seen.update(wanted)
+
+            resolved = await asyncio.gather(*(
+                self._fetch_media(identity, entry, report) for identity, entry in wanted.items()
+            ))
+            media_list = [media for media in resolved if media is not None]
+            report.failed += len(resolved) - len(media_list)
+
+            if media_list:
+                added = await self.db.add_media_bulk(media_list)
+                # Rows added concurrently by the bot since the existence check
+                report.skipped += len(media_list) - added
+                report.added += added
+
+            report.processed += len(batch)
+            report.elapsed = time.monotonic() - started
+            if progress:
+                await progress(report)
+
+        report.elapsed = time.monotonic() - started
+        return report
+
+    async def _identify(self, entry: ManifestEntry, report: IngestReport) -> Optional[Tuple[str, int]]:
+        """(media_type, tmdb_id) of an entry, searching TMDB when only the file name is known"""
+        if entry.tmdb_id is not None:
+            return entry.media_type, entry.tmdb_id
+
+        parsed = parse_filename(entry.file_name)
+        if parsed.is_episode:
+            # Episodes need their series row and a season lookup, the group upload handles them
+            report.errors.append(f"{entry.file_name}: los episodios se indexan subiéndolos al grupo")
+            return None
+        if not parsed.title:
+            report.errors.append(f"{entry.file_name}: no se reconoce el título")
+            return None
+
+        media_type = entry.media_type or ("tv" if parsed.season is not None else "movie")
+        date_field = "first_air_date" if media_type == "tv" else "release_date"
+        try:
+            async with self._semaphore:
+                if media_type == "tv":
+                    results = await self.tmdb.search_tv_shows(parsed.title)
+                else:
+                    results = await self.tmdb.search_movies(parsed.title)
+        except TMDBError as e:
+            report.errors.append(f"{entry.file_name}: {e}")
+            return None
+        if not results:
+            report.errors.append(f"{entry.file_name}: sin resultados en TMDB")
+            return None
+
+        # Prefer the result whose year matches the one in the filename
+        match = results[0]
+        if parsed.year:
+            match = next((r for r in results if (r.get(date_field) or "")[:4] == str(parsed.year)), match)
+        return media_type, match["id"]
+
+    async def _fetch_media(self, identity: Tuple[str, int], entry: ManifestEntry,
+                           report: IngestReport) -> Optional[Media]:
+        """Media row built from the TMDB details of an identified entry"""
+        media_type, tmdb_id = identity
+        label = entry.file_name or f"{media_type} {tmdb_id}"
+        try:
+            async with self._semaphore:
+                if media_type == "tv":
+                    data = await self.tmdb.get_tv_show_details(tmdb_id)
+                else:
+                    data = await self.tmdb.get_movie_details(tmdb_id)
+        except TMDBError as e:
+            report.errors.append(f"{label}: {e}")
+            return None
+        if not data:
+            report.errors.append(f"{label}: no existe en TMDB")
+            return None
+        return build_media(self.tmdb, data, media_type, entry.file_id)
+
+async def _run_cli(args):
+    from config import (
+        DATABASE_PATH, DATABASE_POOL_SIZE, DATABASE_CACHE_SIZE_KB, DATABASE_MMAP_SIZE, TMDB_API_KEY,
+        TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT, TMDB_MAX_CONNECTIONS, TMDB_CACHE_PATH, TMDB_CACHE_MAX_ENTRIES,
+        TMDB_RATE_LIMIT, TMDB_MAX_RETRIES
+    )
+    from database import Database
+    from tmdb_api import TMDBCache
+
+    with open(args.manifest, encoding="utf-8") as manifest:
+        entries = load_manifest(manifest)
+
+    database = Database(DATABASE_PATH, pool_size=DATABASE_POOL_SIZE, cache_size_kb=DATABASE_CACHE_SIZE_KB,
+                        mmap_size=DATABASE_MMAP_SIZE)
+    db = AsyncDatabase(database)
+    tmdb = AsyncTMDBApi(
+        TMDB_API_KEY,
+        connect_timeout=TMDB_CONNECT_TIMEOUT,
+        read_timeout=TMDB_READ_TIMEOUT,
+        max_connections=max(TMDB_MAX_CONNECTIONS, args.concurrency),
+        cache=TMDBCache(TMDB_CACHE_PATH, max_entries=TMDB_CACHE_MAX_ENTRIES),
+        rate_limit=TMDB_RATE_LIMIT,
+        max_retries=TMDB_MAX_RETRIES
+    )
+
+    async def print_progress(report: IngestReport):
+        print(report.summary(), flush=True)
+
+    try:
+        report = await BulkIngester(db, tmdb, args.batch_size, args.concurrency).ingest(entries, print_progress)
+    finally:
+        await tmdb.aclose()
+        tmdb.cache.close()
+        db.close()
+
+    for error in report.errors:
+        print(f"  {error}")
+    print(f"Completado: {report.summary()}")
+
+def main():
+    from config import BULK_BATCH_SIZE, BULK_CONCURRENCY
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("manifest")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.WARNING)
+    asyncio.run(_run_cli(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from database import MEDIA_COLUMNS, DatabaseListener, Media
+
+# Stored in the integer columns for NULL values
+_MISSING = -1
+
+# Attributes holding the rows, swapped in as a whole by CatalogSnapshot.load
+_STATE = (
+    "_ids", "_tmdb_ids", "_years", "_types", "_channel_message_ids", "_titles", "_original_titles",
+    "_file_ids", "_file_paths", "_poster_urls", "_poster_file_ids", "_captions", "_overviews",
+    "_created_at", "_texts", "_type_names", "_string_bytes"
+)
+
+class TextStore:
+    """Deduplicated strings addressed by slot number
+
+    Captions, overviews and timestamps repeat across rows (episodes of a
+    bulk import share them), each distinct text is kept once and freed
+    when the last row using it goes away.
+    """
+
+    def __init__(self):
+        self._texts: List[Optional[str]] = []
+        self._counts = array("I")
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, text: Optional[str]) -> int:
+        """Slot of text, storing it on first use, None has no slot"""
+        if text is None:
+            return _MISSING
+        slot = self._slots.get(text)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                self._texts[slot] = text
+            else:
+                slot = len(self._texts)
+                self._texts.append(text)
+                self._counts.append(0)
+            self._slots[text] = slot
+            self._bytes += sys.getsizeof(text)
+        self._counts[slot] += 1
+        return slot
+
+    def get(self, slot: int) -> Optional[str]:
+        return None if slot == _MISSING else self._texts[slot]
+
+    def release(self, slot: int):
+        """Drop one use of a slot, freeing the text with the last one"""
+        if slot == _MISSING:
+            return
+        self._counts[slot] -= 1
+        if not self._counts[slot]:
+            text = self._texts[slot]
+            del self._slots[text]
+            self._texts[slot] = None
+            self._free.append(slot)
+            self._bytes -= sys.getsizeof(text)
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held, texts included"""
+        return (self._bytes + sys.getsizeof(self._texts) + sys.getsizeof(self._slots)
+                + self._counts.itemsize * len(self._counts))
+
+class CatalogSnapshot(DatabaseListener):
+    """Column-wise copy of the media table kept in memory for lookups by id
+
+    Integers live in typed arrays, the per-row strings in plain lists and
+    the repetitive texts in a TextStore, which takes a fraction of the
+    memory of one Media object per row. Rows are ordered by id, so a
+    lookup is a binary search. The snapshot is filled once by
+    Database.load_catalog() and then follows Database writes as a
+    listener; changes committed while it loads are replayed afterwards.
+    Until it is loaded every read goes to SQLite, and afterwards a miss
+    still does, so rows added by another process (the bulk_ingest.py CLI)
+    are found and kept. Updates and deletes made by another process are
+    only seen after a restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fetch: Optional[Callable[[int], Optional[Media]]] = None
+        self._loaded = False
+        # Events seen while a load is in progress, None when not loading
+        self._pending: Optional[List[Tuple]] = None
+        # Bumped by every update and delete, rows read from SQLite before
+        # one of them landed are not stored afterwards
+        self.generation = 0
+        self._reset()
+
+    def _reset(self):
+        self._ids = array("q")
+        self._tmdb_ids = array("q")
+        self._years = array("i")
+        self._types = array("B")
+        self._channel_message_ids = array("q")
+        self._titles: List[str] = []
+        # Same object as the title when both are equal, which is common
+        self._original_titles: List[str] = []
+        self._file_ids: List[Optional[str]] = []
+        self._file_paths: List[Optional[str]] = []
+        self._poster_urls: List[Optional[str]] = []
+        self._poster_file_ids: List[Optional[str]] = []
+        self._captions = array("i")
+        self._overviews = array("i")
+        self._created_at = array("i")
+        self._texts = TextStore()
+        self._type_names: List[str] = []
+        self._string_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def attach(self, fetch: Callable[[int], Optional[Media]]):
+        """Source of single rows read back from SQLite when a row is updated"""
+        self._fetch = fetch
+
+    def begin_load(self):
+        """Start recording changes, call before reading the rows to load"""
+        with self._lock:
+            self._pending = []
+
+    def load(self, rows: Iterable[Sequence]):
+        """Replace the snapshot with rows in MEDIA_COLUMNS order and ascending id"""
+        # Built aside so writers are not held up while a large catalog loads
+        staged = CatalogSnapshot()
+        for row in rows:
+            staged._append(row)
+        with self._lock:
+            for name in _STATE:
+                setattr(self, name, getattr(staged, name))
+            pending, self._pending = self._pending or [], None
+            for event in pending:
+                self._apply(*event)
+            self._loaded = True
+
+    def get(self, media_id: int) -> Optional[Media]:
+        with self._lock:
+            position = self._position(media_id)
+            return None if position is None else self._media(position)
+
+    def get_many(self, media_ids: Iterable[int]) -> List[Media]:
+        """Media for the given ids in the same order, missing ids are left out"""
+        found = []
+        with self._lock:
+            for media_id in media_ids:
+                position = self._position(media_id)
+                if position is not None:
+                    found.append(self._media(position))
+        return found
+
+    def put(self, media: Media, generation: int):
+        """Store a row the snapshot did not have, read from SQLite while generation was current"""
+        with self._lock:
+            if generation == self.generation:
+                self._record("added", media)
+
+    def on_media_added(self, media: Media):
+        self._event("added", media)
+
+    def on_media_updated(self, media_id: int, columns: Tuple[str, ...]):
+        if not self._loaded and self._pending is None:
+            return
+        # Listeners only learn which columns changed, the row is read back
+        generation = self.generation
+        media = self._fetch(media_id) if self._fetch is not None else None
+        with self._lock:
+            if generation != self.generation:
+                # Another write may have changed the row after it was read,
+                # dropping it sends the next lookup to SQLite
+                media = None
+            self.generation += 1
+            self._record("updated", media_id, media)
+
+    def on_media_deleted(self, media_id: int):
+        self._event("deleted", media_id)
+
+    def on_all_media_deleted(self):
+        self._event("cleared")
+
+    def stats(self) -> Dict[str, int]:
+        """Rows, distinct texts and approximate memory footprint in bytes"""
+        with self._lock:
+            arrays = (self._ids, self._tmdb_ids, self._years, self._types, self._channel_message_ids,
+                      self._captions, self._overviews, self._created_at)
+            lists = (self._titles, self._original_titles, self._file_ids, self._file_paths,
+                     self._poster_urls, self._poster_file_ids)
+            return {
+                "rows": len(self._ids),
+                "texts": len(self._texts),
+                "bytes": (sum(column.itemsize * len(column) for column in arrays)
+                          + sum(sys.getsizeof(column) for column in lists)
+                          + self._string_bytes + self._texts.memory_usage()),
+            }
+
+    def _event(self, kind: str, *args):
+        with self._lock:
+            if kind != "added":
+                self.generation += 1
+            self._record(kind, *args)
+
+    def _record(self, kind: str, *args):
+        """Apply an event, or keep it for after the load in progress"""
+        if self._pending is not None:
+            self._pending.append((kind, *args))
+        elif self._loaded:
+            self._apply(kind, *args)
+
+    def _apply(self, kind: str, *args):
+        if kind == "added":
+            self._store(args[0])
+        elif kind == "updated":
+            media_id, media = args
+            if media is None:
+                self._remove(media_id)
+            else:
+                self._store(media)
+        elif kind == "deleted":
+            self._remove(args[0])
+        elif kind == "cleared":
+            self._reset()
+
+    def _position(self, media_id: int) -> Optional[int]:
+        position = bisect_left(self._ids, media_id)
+        if position < len(self._ids) and self._ids[position] == media_id:
+            return position
+        return None
+
+    def _media(self, position: int) -> Media:
+        year = self._years[position]
+        channel_message_id = self._channel_message_ids[position]
+        return Media(
+            id=self._ids[position],
+            title=self._titles[position],
+            year=None if year == _MISSING else year,
+            media_type=self._type_names[self._types[position]],
+            tmdb_id=self._tmdb_ids[position],
+            file_id=self._file_ids[position],
+            file_path=self._file_paths[position],
+            caption=self._texts.get(self._captions[position]),
+            poster_url=self._poster_urls[position],
+            created_at=self._texts.get(self._created_at[position]),
+            original_title=self._original_titles[position],
+            overview=self._texts.get(self._overviews[position]),
+            poster_file_id=self._poster_file_ids[position],
+            channel_message_id=None if channel_message_id == _MISSING else channel_message_id,
+        )
+
+    def _store(self, media: Media):
+        """Insert or replace one row, keeping ids ordered"""
+        self._remove(media.id)
+        position = bisect_left(self._ids, media.id)
+        self._append(tuple(getattr(media, column) for column in MEDIA_COLUMNS))
+        if position < len(self._ids) - 1:
+            # Rows only land before the end when replaying changes after a load
+            self._move_last(position)
+
+    def _append(self, row: Sequence):
+        (media_id, title, year, media_type, tmdb_id, file_id, file_path, caption, poster_url,
+         created_at, original_title, overview, poster_file_id, channel_message_id) = row
+        if original_title == title:
+            original_title = title
+        if media_type not in self._type_names:
+            self._type_names.append(media_type)
+        self._ids.append(media_id)
+        self._tmdb_ids.append(tmdb_id)
+        self._years.append(_MISSING if year is None else year)
+        self._types.append(self._type_names.index(media_type))
+        self._channel_message_ids.append(_MISSING if channel_message_id is None else channel_message_id)
+        self._titles.append(title)
+        self._original_titles.append(original_title)
+        self._file_ids.append(file_id)
+        self._file_paths.append(file_path)
+        self._poster_urls.append(poster_url)
+        self._poster_file_ids.append(poster_file_id)
+        self._captions.append(self._texts.add(caption))
+        self._overviews.append(self._texts.add(overview))
+        self._created_at.append(self._texts.add(None if created_at is None else str(created_at)))
+        self._string_bytes += self._row_string_bytes(len(self._ids) - 1)
+
+    def _remove(self, media_id: int):
+        position = self._position(media_id)
+        if position is None:
+            return
+        self._string_bytes -= self._row_string_bytes(position)
+        for slot in (self._captions[position], self._overviews[position], self._created_at[position]):
+            self._texts.release(slot)
+        for column in self._columns():
+            del column[position]
+
+    def _move_last(self, position: int):
+        """Move the last row to position, shifting the rows after it"""
+        for column in self._columns():
+            column.insert(position, column.pop())
+
+    def _columns(self) -> Tuple:
+        return (self._ids, self._tmdb_ids, self._years, self._types, self._channel_message_ids,
+                self._titles, self._original_titles, self._file_ids, self._file_paths, self._poster_urls,
+                self._poster_file_ids, self._captions, self._overviews, self._created_at)
+
+    def _row_string_bytes(self, position: int) -> int:
+        """Memory of the strings only this row holds"""
+        size = sum(sys.getsizeof(column[position]) for column in (
+            self._titles, self._file_ids, self._file_paths, self._poster_urls, self._poster_file_ids
+        ) if column[position])
+        if self._original_titles[position] is not self._titles[position]:
+            size += sys.getsizeof(self._original_titles[position])
+        return size
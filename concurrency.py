@@ -0,0 +1,86 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+async def wait_until_running(application, poll_interval: float = 0.1):
+    """Return once the application has started, post_init runs before it does"""
+    while not application.running:
+        await asyncio.sleep(poll_interval)
+
+class KeyedLock:
+    """One asyncio.Lock per key, created on demand and dropped once nobody holds or waits for it"""
+
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._users: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def lock(self, key: Hashable) -> AsyncIterator[None]:
+        """Hold the lock of key for the duration of the block"""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently while keeping each user's updates in order
+
+    Updates of the same user (or chat, when there is no user) run one at a
+    time, updates of different users run in parallel up to
+    max_concurrent_updates. The user lock is taken before an in-flight slot,
+    so a user flooding the bot waits on their own lock instead of filling
+    every slot. Inline queries are read-only and skip the user lock.
+    """
+
+    # Passed to the base class, whose semaphore is taken before the user lock
+    # and must never be what limits concurrency
+    UNBOUNDED = 2 ** 31 - 1
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(self.UNBOUNDED)
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        self.max_in_flight = max_concurrent_updates
+        self._user_locks = KeyedLock()
+        self._in_flight: Optional[asyncio.BoundedSemaphore] = None
+
+    @staticmethod
+    def update_key(update: object) -> Optional[Hashable]:
+        """Serialization key of an update, None when it can run unordered"""
+        if not isinstance(update, Update) or update.inline_query is not None:
+            return None
+        if update.effective_user is not None:
+            return ("user", update.effective_user.id)
+        if update.effective_chat is not None:
+            return ("chat", update.effective_chat.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        key = self.update_key(update)
+        if key is None:
+            async with self._in_flight:
+                await coroutine
+            return
+        async with self._user_locks.lock(key):
+            async with self._in_flight:
+                await coroutine
+
+    async def initialize(self) -> None:
+        self._in_flight = asyncio.BoundedSemaphore(self.max_in_flight)
+
+    async def shutdown(self) -> None:
+        pass
@@ -8,6 +8,23 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 API_ID = os.getenv("API_ID")
 API_HASH = os.getenv("API_HASH")
+# Point these at a local Bot API server (or a fake one in tests)
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
+TELEGRAM_BASE_FILE_URL = os.getenv("TELEGRAM_BASE_FILE_URL", "https://api.telegram.org/file/bot")
+
+# Update Delivery Configuration
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # 'polling' or 'webhook'
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # public https base URL, e.g. https://bot.example.com
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "16"))
+
+# Metrics Endpoint, served at http://METRICS_LISTEN:METRICS_PORT/metrics, 0 disables it
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
 
 # Admin Configuration
 ADMIN_ID = int(os.getenv("ADMIN_ID"))
@@ -18,9 +35,56 @@ OFFICIAL_CHANNEL_ID = int(os.getenv("OFFICIAL_CHANNEL_ID"))
 
 # TMDB Configuration
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
+TMDB_BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+TMDB_CONNECT_TIMEOUT = float(os.getenv("TMDB_CONNECT_TIMEOUT", "5"))
+TMDB_READ_TIMEOUT = float(os.getenv("TMDB_READ_TIMEOUT", "10"))
+TMDB_MAX_CONNECTIONS = int(os.getenv("TMDB_MAX_CONNECTIONS", "10"))
+TMDB_CACHE_PATH = os.getenv("TMDB_CACHE_PATH", "tmdb_cache.db")
+TMDB_CACHE_MAX_ENTRIES = int(os.getenv("TMDB_CACHE_MAX_ENTRIES", "2048"))
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "40"))
+TMDB_MAX_RETRIES = int(os.getenv("TMDB_MAX_RETRIES", "3"))
 
 # Database Configuration
-DATABASE_PATH = "media_database.db"
+DATABASE_PATH = os.getenv("DATABASE_PATH", "media_database.db")
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "4"))
+DATABASE_CACHE_SIZE_KB = int(os.getenv("DATABASE_CACHE_SIZE_KB", "16384"))
+DATABASE_MMAP_SIZE = int(os.getenv("DATABASE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SEARCH_CACHE_MAX_QUERIES = int(os.getenv("SEARCH_CACHE_MAX_QUERIES", "1024"))
+SEARCH_CACHE_MAX_ROWS = int(os.getenv("SEARCH_CACHE_MAX_ROWS", "4096"))
+SEARCH_CACHE_SIZE_KB = int(os.getenv("SEARCH_CACHE_SIZE_KB", "16384"))
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "8"))
+# Keep a compact copy of the media table in memory for lookups by ID (1 enables it)
+CATALOG_SNAPSHOT = int(os.getenv("CATALOG_SNAPSHOT", "0"))
+
+# Inline Mode Configuration
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+INLINE_PAGE_SIZE = int(os.getenv("INLINE_PAGE_SIZE", "20"))
+
+# Outbound Telegram Rate Limits
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_PRIVATE_RATE = float(os.getenv("OUTBOUND_PRIVATE_RATE", "1"))
+OUTBOUND_GROUP_RATE_PER_MINUTE = float(os.getenv("OUTBOUND_GROUP_RATE_PER_MINUTE", "20"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "5"))
+
+# Seconds between poster uploads when backfilling Telegram file_ids, 0 disables it.
+# Groups accept about 20 messages per minute
+POSTER_BACKFILL_INTERVAL = float(os.getenv("POSTER_BACKFILL_INTERVAL", "3"))
+
+# Channel Publishing Queue. Failed posts are retried after PUBLISH_RETRY_DELAY
+# seconds, doubling on every attempt up to an hour
+PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", "8"))
+PUBLISH_RETRY_DELAY = float(os.getenv("PUBLISH_RETRY_DELAY", "30"))
+PUBLISH_POLL_INTERVAL = float(os.getenv("PUBLISH_POLL_INTERVAL", "30"))
+
+# Pending upload selections, kept for INDEXING_SESSION_TTL seconds and
+# saved to the database every INDEXING_SESSION_FLUSH_INTERVAL seconds
+INDEXING_SESSION_TTL = float(os.getenv("INDEXING_SESSION_TTL", str(24 * 3600)))
+INDEXING_SESSION_MAX = int(os.getenv("INDEXING_SESSION_MAX", "1000"))
+INDEXING_SESSION_FLUSH_INTERVAL = float(os.getenv("INDEXING_SESSION_FLUSH_INTERVAL", "5"))
+
+# Bulk Ingest Configuration
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "8"))
 
 # Bot Messages
 START_MESSAGE = """
@@ -34,12 +98,15 @@ HELP_MESSAGE = """
 Available Commands:
 /start - Start the bot
 /search <query> - Search for movies or series
+@bot <query> - Search from any chat (inline mode)
 /help - Show this help message
 
 Admin Commands:
 /add_movie <movie_id> - Add a movie by TMDB ID
 /add_series <series_id> - Add a series by TMDB ID
+/bulk_ingest - Reply to a manifest file to add many titles at once
 /delete_media <media_id> - Delete media by ID
 /delete_all - Delete all media from database
 /stats - Show database statistics
+/perf - Show handler, database and TMDB timings
 """
\ No newline at end of file
@@ -1,8 +1,28 @@
+import asyncio
+import functools
+import logging
+import queue
+import re
 import sqlite3
-from typing import List, Optional, Tuple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Iterator, List, Optional, Sequence, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 
+from fuzzy import best_similarity, query_tokens, title_trigrams
+from metrics import Metrics
+from migrations import apply_migrations
+
+if TYPE_CHECKING:
+    # search_cache and catalog import this module, only type checkers follow them back
+    from catalog import CatalogSnapshot
+    from search_cache import SearchCache
+
+logger = logging.getLogger(__name__)
+
 @dataclass
 class Media:
     id: int
@@ -15,6 +35,34 @@ class Media:
     caption: str
     poster_url: str
     created_at: str
+    original_title: str = ""
+    overview: str = ""
+    poster_file_id: str = ""
+    channel_message_id: Optional[int] = None
+
+# Explicit column order matching the Media dataclass, so columns added by
+# later schema changes never shift positional construction
+MEDIA_COLUMNS = (
+    "id", "title", "year", "media_type", "tmdb_id", "file_id", "file_path",
+    "caption", "poster_url", "created_at", "original_title", "overview", "poster_file_id",
+    "channel_message_id"
+)
+_MEDIA_SELECT = ", ".join(MEDIA_COLUMNS)
+_MEDIA_SELECT_M = ", ".join(f"m.{column}" for column in MEDIA_COLUMNS)
+
+# Words of a user query, each turned into a quoted FTS5 prefix term
+_FTS_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Longest ranking kept for a query, /search pages past it are not offered
+SEARCH_MAX_RESULTS = 1000
+
+# Fuzzy fallback: candidates come from the postings of the query's
+# FUZZY_RARE_TRIGRAMS rarest trigrams, at most FUZZY_CANDIDATES of them are
+# scored, and a title must reach FUZZY_MIN_SIMILARITY edit-distance
+# similarity to be returned
+FUZZY_RARE_TRIGRAMS = 4
+FUZZY_CANDIDATES = 200
+FUZZY_MIN_SIMILARITY = 0.7
 
 @dataclass
 class Episode:
@@ -27,148 +75,646 @@ class Episode:
     file_path: str
     created_at: str
 
+class DatabaseListener:
+    """Told about catalog changes once they are committed, override what you need"""
+
+    def on_media_added(self, media: Media):
+        pass
+
+    def on_media_updated(self, media_id: int, columns: Tuple[str, ...]):
+        pass
+
+    def on_media_deleted(self, media_id: int):
+        pass
+
+    def on_all_media_deleted(self):
+        pass
+
+    def on_episodes_changed(self, media_id: int):
+        pass
+
+class ConnectionPool:
+    """Small pool of long-lived SQLite connections shared between threads"""
+
+    def __init__(self, db_path: str, size: int = 4, cache_size_kb: int = 16384,
+                 mmap_size: int = 268435456, busy_timeout_ms: int = 5000):
+        self.db_path = db_path
+        self.size = size
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._connections = queue.LifoQueue(maxsize=size)
+        self._all = []
+        self._closed = False
+
+        for _ in range(size):
+            conn = self._connect()
+            self._all.append(conn)
+            self._connections.put(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection and apply the per-connection pragmas"""
+        # cached_statements keeps the prepared statements of every query the
+        # Database issues, so repeated calls skip SQL parsing entirely
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        # Negative cache_size is expressed in KiB instead of pages
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection from the pool and return it afterwards"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._connections.put(conn)
+
+    def close(self):
+        """Close every connection in the pool"""
+        self._closed = True
+        for conn in self._all:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._all = []
+
 class Database:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_size: int = 4, cache_size_kb: int = 16384,
+                 mmap_size: int = 268435456, search_cache: Optional["SearchCache"] = None,
+                 catalog: Optional["CatalogSnapshot"] = None):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, size=pool_size, cache_size_kb=cache_size_kb,
+                                   mmap_size=mmap_size)
+        # SQLite allows a single writer, serializing writes in-process avoids
+        # threads spinning on SQLITE_BUSY while readers keep going under WAL
+        self._write_lock = threading.Lock()
+        self.fts_enabled = False
+        self.listeners: List[DatabaseListener] = []
+        self.search_cache = search_cache
+        if search_cache is not None:
+            self.add_listener(search_cache)
+        # Optional in-memory copy of the media table, filled by load_catalog()
+        self.catalog = catalog
+        if catalog is not None:
+            catalog.attach(self._select_media)
+            self.add_listener(catalog)
         self.init_db()
 
+    def add_listener(self, listener: DatabaseListener):
+        """Register a listener for committed catalog changes"""
+        self.listeners.append(listener)
+
+    def _notify(self, event: str, *args: Any):
+        """Call event on every listener, a failing listener does not fail the write"""
+        for listener in self.listeners:
+            try:
+                getattr(listener, event)(*args)
+            except Exception as e:
+                logger.error(f"Database listener {type(listener).__name__}.{event} failed: {e}")
+
+    @contextmanager
+    def _read(self) -> Iterator[sqlite3.Cursor]:
+        """Cursor on a pooled connection for read-only queries"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Cursor]:
+        """Cursor on a pooled connection wrapped in a single transaction"""
+        with self._write_lock, self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                with conn:
+                    yield cursor
+            finally:
+                cursor.close()
+
+    def close(self):
+        """Release all pooled connections"""
+        self.pool.close()
+
     def init_db(self):
-        """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Initialize the database, upgrading older schemas in place"""
+        with self._write_lock, self.pool.connection() as conn:
+            apply_migrations(conn)
+        
+        with self._write() as cursor:
+            self.fts_enabled = self._init_fts(cursor)
+
+    def _init_fts(self, cursor: sqlite3.Cursor) -> bool:
+        """Create the FTS5 index over media, backfilling it when new"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'media_fts'")
+        existed = cursor.fetchone() is not None
+        
+        try:
+            # External-content table: the text lives in media, the index only
+            # stores tokens. remove_diacritics folds "película" to "pelicula"
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS media_fts USING fts5(
+                    title, original_title, overview, year,
+                    content='media', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5, search_media falls back to LIKE
+            return False
         
-        # Create media table
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS media (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                year INTEGER,
-                media_type TEXT NOT NULL,
-                tmdb_id INTEGER NOT NULL,
-                file_id TEXT,
-                file_path TEXT,
-                caption TEXT,
-                poster_url TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            CREATE TRIGGER IF NOT EXISTS media_fts_ai AFTER INSERT ON media BEGIN
+                INSERT INTO media_fts (rowid, title, original_title, overview, year)
+                VALUES (new.id, new.title, new.original_title, new.overview, new.year);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS media_fts_ad AFTER DELETE ON media BEGIN
+                INSERT INTO media_fts (media_fts, rowid, title, original_title, overview, year)
+                VALUES ('delete', old.id, old.title, old.original_title, old.overview, old.year);
+            END
         ''')
-        
-        # Create episodes table for TV series
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS episodes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                media_id INTEGER NOT NULL,
-                season_number INTEGER NOT NULL,
-                episode_number INTEGER NOT NULL,
-                title TEXT,
-                file_id TEXT,
-                file_path TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (media_id) REFERENCES media (id)
-            )
+            CREATE TRIGGER IF NOT EXISTS media_fts_au
+            AFTER UPDATE OF title, original_title, overview, year ON media BEGIN
+                INSERT INTO media_fts (media_fts, rowid, title, original_title, overview, year)
+                VALUES ('delete', old.id, old.title, old.original_title, old.overview, old.year);
+                INSERT INTO media_fts (rowid, title, original_title, overview, year)
+                VALUES (new.id, new.title, new.original_title, new.overview, new.year);
+            END
         ''')
         
-        conn.commit()
-        conn.close()
+        if not existed:
+            # Index rows that were stored before the FTS table existed
+            cursor.execute("INSERT INTO media_fts (media_fts) VALUES ('rebuild')")
+        return True
 
     def add_media(self, media: Media) -> int:
         """Add a new media entry to the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._write() as cursor:
+            media_id = self._insert_media(cursor, media)
+            stored = self._stored_media(cursor, media_id)
         
+        self._notify("on_media_added", stored)
+        return media_id
+
+    def add_media_for_publication(self, media: Media, now: float) -> int:
+        """Add a media entry and queue its channel post in the same transaction"""
+        with self._write() as cursor:
+            media_id = self._insert_media(cursor, media)
+            cursor.execute('INSERT INTO publish_queue (media_id, next_attempt_at) VALUES (?, ?)',
+                           (media_id, now))
+            stored = self._stored_media(cursor, media_id)
+        
+        self._notify("on_media_added", stored)
+        return media_id
+
+    @staticmethod
+    def _insert_media(cursor: sqlite3.Cursor, media: Media) -> int:
         cursor.execute('''
-            INSERT INTO media (title, year, media_type, tmdb_id, file_id, file_path, caption, poster_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO media (title, year, media_type, tmdb_id, file_id, file_path, caption, poster_url,
+                               original_title, overview)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (media.title, media.year, media.media_type, media.tmdb_id, 
-              media.file_id, media.file_path, media.caption, media.poster_url))
-        
+              media.file_id, media.file_path, media.caption, media.poster_url,
+              media.original_title, media.overview))
         media_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        Database._index_trigrams(cursor, [(media_id, media.title, media.original_title)])
         return media_id
 
+    @staticmethod
+    def _stored_media(cursor: sqlite3.Cursor, media_id: int) -> Media:
+        """Row as inserted, with the defaults SQLite filled in"""
+        cursor.execute(f'SELECT {_MEDIA_SELECT} FROM media WHERE id = ?', (media_id,))
+        return Media(*cursor.fetchone())
+
+    @staticmethod
+    def _index_trigrams(cursor: sqlite3.Cursor, rows: Sequence[Tuple[int, str, str]]):
+        """Store the title trigrams of (id, title, original_title) rows, deletes cascade from media"""
+        cursor.executemany('INSERT OR IGNORE INTO media_trigrams (trigram, media_id) VALUES (?, ?)',
+                           [(trigram, media_id) for media_id, title, original_title in rows
+                            for trigram in title_trigrams(title, original_title)])
+
+    def add_media_bulk(self, media_list: List[Media]) -> int:
+        """Insert many media entries in one transaction, skipping titles already present"""
+        with self._write() as cursor:
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM media')
+            last_id = cursor.fetchone()[0]
+            cursor.executemany('''
+                INSERT OR IGNORE INTO media (title, year, media_type, tmdb_id, file_id, file_path, caption,
+                                             poster_url, original_title, overview)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(media.title, media.year, media.media_type, media.tmdb_id, media.file_id, media.file_path,
+                   media.caption, media.poster_url, media.original_title, media.overview)
+                  for media in media_list])
+            # Ignored duplicates do not count towards rowcount
+            inserted = cursor.rowcount
+            
+            added = []
+            if inserted:
+                # AUTOINCREMENT ids only grow, so the new rows are the ones past last_id
+                cursor.execute(f'SELECT {_MEDIA_SELECT} FROM media WHERE id > ? ORDER BY id', (last_id,))
+                added = [Media(*row) for row in cursor.fetchall()]
+                self._index_trigrams(cursor, [(media.id, media.title, media.original_title) for media in added])
+        
+        for media in added:
+            self._notify("on_media_added", media)
+        return inserted
+
+    def get_existing_tmdb_ids(self, media_type: str, tmdb_ids: List[int]) -> set:
+        """Subset of the given TMDB IDs that are already stored for media_type"""
+        existing = set()
+        ids = list(tmdb_ids)
+        with self._read() as cursor:
+            # Stay well under SQLite's bound parameter limit
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(
+                    f'SELECT tmdb_id FROM media WHERE media_type = ? AND tmdb_id IN ({placeholders})',
+                    (media_type, *chunk)
+                )
+                existing.update(row[0] for row in cursor.fetchall())
+        return existing
+
     def add_episode(self, episode: Episode) -> int:
-        """Add a new episode entry to the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Add an episode entry, replacing the file of an already indexed episode"""
+        with self._write() as cursor:
+            cursor.execute('''
+                INSERT INTO episodes (media_id, season_number, episode_number, title, file_id, file_path)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (media_id, season_number, episode_number) DO UPDATE SET
+                    title = excluded.title,
+                    file_id = excluded.file_id,
+                    file_path = excluded.file_path
+            ''', (episode.media_id, episode.season_number, episode.episode_number,
+                  episode.title, episode.file_id, episode.file_path))
+            
+            # lastrowid is not reliable when the upsert updated an existing row
+            cursor.execute('''
+                SELECT id FROM episodes WHERE media_id = ? AND season_number = ? AND episode_number = ?
+            ''', (episode.media_id, episode.season_number, episode.episode_number))
+            episode_id = cursor.fetchone()[0]
         
-        cursor.execute('''
-            INSERT INTO episodes (media_id, season_number, episode_number, title, file_id, file_path)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (episode.media_id, episode.season_number, episode.episode_number,
-              episode.title, episode.file_id, episode.file_path))
-        
-        episode_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        self._notify("on_episodes_changed", episode.media_id)
         return episode_id
 
     def get_media_by_id(self, media_id: int) -> Optional[Media]:
         """Retrieve a media entry by its ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM media WHERE id = ?', (media_id,))
-        row = cursor.fetchone()
-        conn.close()
+        if self.catalog is not None and self.catalog.loaded:
+            media = self.catalog.get(media_id)
+            if media is not None:
+                return media
+        generation = self.catalog.generation if self.catalog is not None else 0
+        media = self._select_media(media_id)
+        if media is not None and self.catalog is not None:
+            # Written by another process, such as the bulk_ingest.py CLI
+            self.catalog.put(media, generation)
+        return media
+
+    def _select_media(self, media_id: int) -> Optional[Media]:
+        """Media entry by ID read from SQLite"""
+        with self._read() as cursor:
+            cursor.execute(f'SELECT {_MEDIA_SELECT} FROM media WHERE id = ?', (media_id,))
+            row = cursor.fetchone()
         
         if row:
             return Media(*row)
         return None
 
-    def get_media_by_tmdb_id(self, tmdb_id: int) -> Optional[Media]:
-        """Retrieve a media entry by its TMDB ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM media WHERE tmdb_id = ?', (tmdb_id,))
-        row = cursor.fetchone()
-        conn.close()
+    def get_media_by_tmdb_id(self, tmdb_id: int, media_type: Optional[str] = None) -> Optional[Media]:
+        """Retrieve a media entry by its TMDB ID, movies and series have separate ID spaces"""
+        with self._read() as cursor:
+            if media_type:
+                cursor.execute(f'SELECT {_MEDIA_SELECT} FROM media WHERE tmdb_id = ? AND media_type = ?',
+                               (tmdb_id, media_type))
+            else:
+                cursor.execute(f'SELECT {_MEDIA_SELECT} FROM media WHERE tmdb_id = ? ORDER BY id', (tmdb_id,))
+            row = cursor.fetchone()
         
         if row:
             return Media(*row)
         return None
 
-    def search_media(self, query: str) -> List[Media]:
-        """Search for media by title"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def search_media(self, query: str, limit: Optional[int] = None) -> List[Media]:
+        """Search for media by title, best matches first"""
+        if self.search_cache is None and self.catalog is not None and self.catalog.loaded:
+            # Only the ranking comes from SQLite, the rows from the snapshot
+            ids = [row[0] for row in self._search(query, "id", "m.id", limit)] or self._fuzzy_ids(query, limit)
+            return self.get_media_by_ids(ids)
+        if self.search_cache is None:
+            rows = self._search(query, _MEDIA_SELECT, _MEDIA_SELECT_M, limit)
+            if rows:
+                return [Media(*row) for row in rows]
+            return self.get_media_by_ids(self._fuzzy_ids(query, limit))
         
-        cursor.execute('''
-            SELECT * FROM media 
-            WHERE title LIKE ?
-            ORDER BY created_at DESC
-        ''', (f'%{query}%',))
+        ids = self._ranked_ids(query)
+        if limit is not None:
+            ids = ids[:limit]
+        return self.get_media_by_ids(ids)
+
+    def search_media_page(self, query: str, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                          limit: int = 8) -> Tuple[List[Media], bool, bool]:
+        """One page of search results as (media, has_previous, has_next)
+
+        Pages are addressed by a keyset cursor: the media ID the page starts
+        after, or the one it ends before, in ranking order. A cursor that is
+        no longer in the results restarts from the first page.
+        """
+        ids = self._ranked_ids(query)
+        try:
+            if before_id is not None:
+                end = ids.index(before_id)
+                start = max(0, end - limit)
+            else:
+                start = ids.index(after_id) + 1 if after_id is not None else 0
+                end = start + limit
+        except ValueError:
+            start, end = 0, limit
+        return self.get_media_by_ids(list(ids[start:end])), start > 0, end < len(ids)
+
+    def _ranked_ids(self, query: str) -> Sequence[int]:
+        """Media IDs matching query in ranking order, from the search cache when possible"""
+        if self.search_cache is None:
+            return ([row[0] for row in self._search(query, "id", "m.id", SEARCH_MAX_RESULTS)]
+                    or self._fuzzy_ids(query, SEARCH_MAX_RESULTS))
         
-        rows = cursor.fetchall()
-        conn.close()
+        # The cache keeps the first SEARCH_MAX_RESULTS, limits are applied on top of them
+        key = self.search_cache.make_key(query, self.fts_enabled)
+        ids = self.search_cache.get_ids(key)
+        if ids is None:
+            generation = self.search_cache.generation
+            ids = [row[0] for row in self._search(query, "id", "m.id", SEARCH_MAX_RESULTS)]
+            fuzzy = not ids
+            if fuzzy:
+                ids = self._fuzzy_ids(query, SEARCH_MAX_RESULTS)
+            self.search_cache.put_ids(key, ids, generation, fuzzy=fuzzy)
+        return ids
+
+    def _fuzzy_ids(self, query: str, limit: Optional[int] = None) -> List[int]:
+        """Media IDs whose title is within a few typos of query, closest first
+
+        Only used when the exact search finds nothing. Candidates are the
+        titles sharing the most of the query's rarest trigrams, and they are
+        then ranked by edit-distance similarity. Common grams (padded word
+        starts, "the") have postings as long as the catalog and are left out
+        of the candidate step, so its cost follows the rare grams only.
+        """
+        words = query_tokens(query)
+        if len("".join(words)) < 3:
+            return []
+        grams = tuple(title_trigrams(query))
+
+        with self._read() as cursor:
+            cursor.execute(f'''
+                SELECT trigram FROM trigram_stats
+                WHERE trigram IN ({", ".join("?" * len(grams))}) AND documents > 0
+                ORDER BY documents, trigram
+                LIMIT ?
+            ''', (*grams, FUZZY_RARE_TRIGRAMS))
+            rare = [row[0] for row in cursor.fetchall()]
+            if not rare:
+                return []
+
+            cursor.execute(f'''
+                SELECT m.id, m.title, m.original_title FROM (
+                    SELECT media_id, COUNT(*) AS shared FROM media_trigrams
+                    WHERE trigram IN ({", ".join("?" * len(rare))})
+                    GROUP BY media_id
+                    ORDER BY shared DESC
+                    LIMIT ?
+                ) candidates
+                JOIN media m ON m.id = candidates.media_id
+            ''', (*rare, FUZZY_CANDIDATES))
+            candidates = cursor.fetchall()
+
+        scored = []
+        for media_id, title, original_title in candidates:
+            score = best_similarity(words, (title, original_title), FUZZY_MIN_SIMILARITY)
+            if score >= FUZZY_MIN_SIMILARITY:
+                scored.append((-score, -media_id))
+        scored.sort()
+        ids = [-media_id for _, media_id in scored]
+        return ids if limit is None else ids[:limit]
+
+    def get_media_by_ids(self, media_ids: List[int]) -> List[Media]:
+        """Media entries for the given IDs in the same order, missing IDs are left out"""
+        if self.catalog is not None and self.catalog.loaded:
+            found = {media.id: media for media in self.catalog.get_many(media_ids)}
+        elif self.search_cache is not None:
+            found = self.search_cache.get_rows(media_ids)
+        else:
+            found = {}
+        missing = [media_id for media_id in media_ids if media_id not in found]
+        
+        if missing:
+            generation = self.search_cache.generation if self.search_cache is not None else 0
+            catalog_generation = self.catalog.generation if self.catalog is not None else 0
+            rows = []
+            with self._read() as cursor:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    placeholders = ", ".join("?" * len(chunk))
+                    cursor.execute(f'SELECT {_MEDIA_SELECT} FROM media WHERE id IN ({placeholders})', chunk)
+                    rows.extend(Media(*row) for row in cursor.fetchall())
+            found.update((media.id, media) for media in rows)
+            if self.catalog is not None:
+                # Rows the snapshot lacks were written by another process
+                for media in rows:
+                    self.catalog.put(media, catalog_generation)
+            if self.search_cache is not None:
+                self.search_cache.put_rows(rows, generation)
+        
+        return [found[media_id] for media_id in media_ids if media_id in found]
+
+    def _search(self, query: str, columns: str, columns_m: str, limit: Optional[int] = None) -> List[tuple]:
+        """Rows of the given columns for a search, best matches first"""
+        match = self._fts_match_expression(query)
+        
+        with self._read() as cursor:
+            if self.fts_enabled and match:
+                # bm25 weights: title, original title, overview, year
+                cursor.execute(f'''
+                    SELECT {columns_m} FROM media_fts
+                    JOIN media m ON m.id = media_fts.rowid
+                    WHERE media_fts MATCH ?
+                    ORDER BY bm25(media_fts, 10.0, 5.0, 1.0, 2.0), m.created_at DESC
+                    LIMIT ?
+                ''', (match, -1 if limit is None else limit))
+            else:
+                cursor.execute(f'''
+                    SELECT {columns} FROM media 
+                    WHERE title LIKE ?
+                    ORDER BY created_at DESC
+                    LIMIT ?
+                ''', (f'%{query}%', -1 if limit is None else limit))
+            return cursor.fetchall()
+
+    @staticmethod
+    def _fts_match_expression(query: str) -> str:
+        """Turn free text into an FTS5 query where every word is a prefix term"""
+        tokens = _FTS_TOKEN_RE.findall(query)
+        # Quoting neutralizes FTS5 operators (AND, OR, NEAR, -, :) in user input
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def load_catalog(self) -> int:
+        """Fill the catalog snapshot from the media table, returning the rows loaded"""
+        if self.catalog is None:
+            return 0
+        # Changes committed from here on are replayed over the rows read below
+        self.catalog.begin_load()
+        with self._read() as cursor:
+            cursor.execute(f'SELECT {_MEDIA_SELECT} FROM media ORDER BY id')
+            self.catalog.load(cursor)
+        return len(self.catalog)
+
+    def get_media_titles(self) -> List[Tuple[int, str, str]]:
+        """(id, title, original_title) of every media entry"""
+        with self._read() as cursor:
+            cursor.execute('SELECT id, title, original_title FROM media')
+            return cursor.fetchall()
+
+    def set_poster_file_id(self, media_id: int, poster_file_id: str) -> bool:
+        """Remember the Telegram file_id of an uploaded poster"""
+        with self._write() as cursor:
+            cursor.execute('UPDATE media SET poster_file_id = ? WHERE id = ?', (poster_file_id, media_id))
+            updated = cursor.rowcount > 0
+        
+        if updated:
+            self._notify("on_media_updated", media_id, ("poster_file_id",))
+        return updated
+
+    def get_media_without_poster_file_id(self, after_id: int = 0, limit: int = 50) -> List[Media]:
+        """Media with a poster URL that was never uploaded to Telegram, in ID order"""
+        with self._read() as cursor:
+            cursor.execute(f'''
+                SELECT {_MEDIA_SELECT} FROM media
+                WHERE id > ? AND COALESCE(poster_file_id, '') = '' AND COALESCE(poster_url, '') != ''
+                ORDER BY id
+                LIMIT ?
+            ''', (after_id, limit))
+            rows = cursor.fetchall()
         
         return [Media(*row) for row in rows]
 
+    def get_due_publications(self, now: float, max_attempts: int, limit: int = 20) -> List[Tuple[int, int]]:
+        """(media_id, attempts) of queued channel posts due at now, oldest first"""
+        with self._read() as cursor:
+            cursor.execute('''
+                SELECT media_id, attempts FROM publish_queue
+                WHERE next_attempt_at <= ? AND attempts < ?
+                ORDER BY next_attempt_at, media_id
+                LIMIT ?
+            ''', (now, max_attempts, limit))
+            return cursor.fetchall()
+
+    def mark_published(self, media_id: int, channel_message_id: int) -> bool:
+        """Record the channel message of a media entry and take it off the publish queue"""
+        with self._write() as cursor:
+            cursor.execute('UPDATE media SET channel_message_id = ? WHERE id = ?', (channel_message_id, media_id))
+            updated = cursor.rowcount > 0
+            cursor.execute('DELETE FROM publish_queue WHERE media_id = ?', (media_id,))
+        
+        if updated:
+            self._notify("on_media_updated", media_id, ("channel_message_id",))
+        return updated
+
+    def reschedule_publication(self, media_id: int, next_attempt_at: float, error: str):
+        """Count a failed channel post and set when to try it again"""
+        with self._write() as cursor:
+            cursor.execute('''
+                UPDATE publish_queue SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                WHERE media_id = ?
+            ''', (next_attempt_at, error, media_id))
+
+    def get_publish_queue_stats(self, max_attempts: int) -> Tuple[int, int]:
+        """(pending, given up) channel posts"""
+        with self._read() as cursor:
+            cursor.execute('''
+                SELECT COALESCE(SUM(attempts < ?), 0), COALESCE(SUM(attempts >= ?), 0) FROM publish_queue
+            ''', (max_attempts, max_attempts))
+            return cursor.fetchone()
+
+    def get_indexing_sessions(self, now: float) -> List[Tuple[int, int, str, float]]:
+        """(user_id, message_id, data, expires_at) of every session still valid at now, oldest first"""
+        with self._read() as cursor:
+            cursor.execute('''
+                SELECT user_id, message_id, data, expires_at FROM indexing_sessions
+                WHERE expires_at > ?
+                ORDER BY expires_at
+            ''', (now,))
+            return cursor.fetchall()
+
+    def save_indexing_sessions(self, upserts: List[Tuple[int, int, str, float]],
+                               deletes: List[Tuple[int, int]], now: float):
+        """Write pending session changes and drop expired rows in one transaction"""
+        with self._write() as cursor:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO indexing_sessions (user_id, message_id, data, expires_at)
+                VALUES (?, ?, ?, ?)
+            ''', upserts)
+            cursor.executemany('DELETE FROM indexing_sessions WHERE user_id = ? AND message_id = ?', deletes)
+            cursor.execute('DELETE FROM indexing_sessions WHERE expires_at <= ?', (now,))
+
     def get_episodes_by_media_id(self, media_id: int) -> List[Episode]:
         """Retrieve all episodes for a TV series"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._read() as cursor:
+            cursor.execute('''
+                SELECT * FROM episodes 
+                WHERE media_id = ?
+                ORDER BY season_number, episode_number
+            ''', (media_id,))
+            rows = cursor.fetchall()
         
-        cursor.execute('''
-            SELECT * FROM episodes 
-            WHERE media_id = ?
-            ORDER BY season_number, episode_number
-        ''', (media_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
+        return [Episode(*row) for row in rows]
+
+    def get_seasons(self, media_id: int) -> List[Tuple[int, int]]:
+        """(season_number, episode_count) of every season of a series"""
+        with self._read() as cursor:
+            cursor.execute('''
+                SELECT season_number, COUNT(*) FROM episodes
+                WHERE media_id = ?
+                GROUP BY season_number
+                ORDER BY season_number
+            ''', (media_id,))
+            return cursor.fetchall()
+
+    def get_episodes_by_season(self, media_id: int, season_number: int) -> List[Episode]:
+        """Retrieve the episodes of one season of a TV series"""
+        with self._read() as cursor:
+            cursor.execute('''
+                SELECT * FROM episodes
+                WHERE media_id = ? AND season_number = ?
+                ORDER BY episode_number
+            ''', (media_id, season_number))
+            rows = cursor.fetchall()
         
         return [Episode(*row) for row in rows]
 
     def get_episode_by_id(self, episode_id: int) -> Optional[Episode]:
         """Retrieve an episode by its ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM episodes WHERE id = ?', (episode_id,))
-        row = cursor.fetchone()
-        conn.close()
+        with self._read() as cursor:
+            cursor.execute('SELECT * FROM episodes WHERE id = ?', (episode_id,))
+            row = cursor.fetchone()
         
         if row:
             return Episode(*row)
@@ -176,50 +722,173 @@ class Database:
 
     def delete_media(self, media_id: int) -> bool:
         """Delete a media entry and its episodes"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Delete episodes first (foreign key constraint)
-        cursor.execute('DELETE FROM episodes WHERE media_id = ?', (media_id,))
+        with self._write() as cursor:
+            # Episodes go with it through ON DELETE CASCADE
+            cursor.execute('DELETE FROM media WHERE id = ?', (media_id,))
+            deleted = cursor.rowcount > 0
         
-        # Delete media
-        cursor.execute('DELETE FROM media WHERE id = ?', (media_id,))
-        
-        changes = cursor.rowcount
-        conn.commit()
-        conn.close()
-        
-        return changes > 0
+        if deleted:
+            self._notify("on_media_deleted", media_id)
+        return deleted
 
     def delete_all_media(self) -> int:
         """Delete all media and episodes"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Delete episodes first (foreign key constraint)
-        cursor.execute('DELETE FROM episodes')
-        episodes_deleted = cursor.rowcount
-        
-        # Delete media
-        cursor.execute('DELETE FROM media')
-        media_deleted = cursor.rowcount
+        with self._write() as cursor:
+            # Delete episodes first (foreign key constraint)
+            cursor.execute('DELETE FROM episodes')
+            
+            # Delete media
+            cursor.execute('DELETE FROM media')
+            deleted = cursor.rowcount
         
-        conn.commit()
-        conn.close()
-        
-        return media_deleted
+        self._notify("on_all_media_deleted")
+        return deleted
 
     def get_stats(self) -> Tuple[int, int]:
         """Get database statistics (media count, episodes count)"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM media')
-        media_count = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM episodes')
-        episodes_count = cursor.fetchone()[0]
-        
-        conn.close()
+        with self._read() as cursor:
+            cursor.execute('SELECT (SELECT COUNT(*) FROM media), (SELECT COUNT(*) FROM episodes)')
+            media_count, episodes_count = cursor.fetchone()
         
-        return media_count, episodes_count
\ No newline at end of file
+        return media_count, episodes_count
+
+def _row_count(result: Any) -> int:
+    """Rows in a query result: list length, 0 for a miss, 1 for a single row or value"""
+    if isinstance(result, (list, set, dict)):
+        return len(result)
+    return 0 if result is None or result is False else 1
+
+class AsyncDatabase:
+    """Awaitable facade over Database that runs queries on worker threads"""
+
+    def __init__(self, database: Database, max_workers: Optional[int] = None,
+                 metrics: Optional[Metrics] = None):
+        self.database = database
+        self.metrics = metrics
+        # One worker per pooled connection, extra threads would only queue
+        # on the pool anyway
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or database.pool.size,
+            thread_name_prefix="db"
+        )
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        """Run a blocking Database call without stalling the event loop"""
+        loop = asyncio.get_running_loop()
+        if self.metrics is None:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+        return await loop.run_in_executor(self._executor, self._timed, func, args, time.perf_counter())
+
+    def _timed(self, func: Callable, args: Tuple, submitted: float) -> Any:
+        """Run func on the worker thread, recording queue wait, duration and rows returned"""
+        query = func.__name__
+        start = time.perf_counter()
+        self.metrics.observe("db_query_wait_seconds", start - submitted, query=query)
+        try:
+            result = func(*args)
+        except Exception:
+            self.metrics.inc("db_query_errors_total", query=query)
+            raise
+        finally:
+            self.metrics.observe("db_query_seconds", time.perf_counter() - start, query=query)
+        self.metrics.inc("db_query_rows_total", _row_count(result), query=query)
+        return result
+
+    async def add_media(self, media: Media) -> int:
+        return await self._run(self.database.add_media, media)
+
+    async def add_media_for_publication(self, media: Media, now: float) -> int:
+        return await self._run(self.database.add_media_for_publication, media, now)
+
+    async def add_media_bulk(self, media_list: List[Media]) -> int:
+        return await self._run(self.database.add_media_bulk, media_list)
+
+    async def get_existing_tmdb_ids(self, media_type: str, tmdb_ids: List[int]) -> set:
+        return await self._run(self.database.get_existing_tmdb_ids, media_type, tmdb_ids)
+
+    async def add_episode(self, episode: Episode) -> int:
+        return await self._run(self.database.add_episode, episode)
+
+    async def get_media_by_id(self, media_id: int) -> Optional[Media]:
+        catalog = self.database.catalog
+        if catalog is not None and catalog.loaded:
+            # A snapshot lookup is cheaper than the hop to a worker thread
+            media = catalog.get(media_id)
+            if media is not None:
+                return media
+        return await self._run(self.database.get_media_by_id, media_id)
+
+    async def get_media_by_tmdb_id(self, tmdb_id: int, media_type: Optional[str] = None) -> Optional[Media]:
+        return await self._run(self.database.get_media_by_tmdb_id, tmdb_id, media_type)
+
+    async def get_media_by_ids(self, media_ids: List[int]) -> List[Media]:
+        catalog = self.database.catalog
+        if catalog is not None and catalog.loaded:
+            found = catalog.get_many(media_ids)
+            if len(found) == len(set(media_ids)):
+                return found
+        return await self._run(self.database.get_media_by_ids, media_ids)
+
+    async def search_media(self, query: str, limit: Optional[int] = None) -> List[Media]:
+        return await self._run(self.database.search_media, query, limit)
+
+    async def load_catalog(self) -> int:
+        return await self._run(self.database.load_catalog)
+
+    async def get_media_titles(self) -> List[Tuple[int, str, str]]:
+        return await self._run(self.database.get_media_titles)
+
+    async def set_poster_file_id(self, media_id: int, poster_file_id: str) -> bool:
+        return await self._run(self.database.set_poster_file_id, media_id, poster_file_id)
+
+    async def get_media_without_poster_file_id(self, after_id: int = 0, limit: int = 50) -> List[Media]:
+        return await self._run(self.database.get_media_without_poster_file_id, after_id, limit)
+
+    async def search_media_page(self, query: str, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                                limit: int = 8) -> Tuple[List[Media], bool, bool]:
+        return await self._run(self.database.search_media_page, query, after_id, before_id, limit)
+
+    async def get_due_publications(self, now: float, max_attempts: int, limit: int = 20) -> List[Tuple[int, int]]:
+        return await self._run(self.database.get_due_publications, now, max_attempts, limit)
+
+    async def mark_published(self, media_id: int, channel_message_id: int) -> bool:
+        return await self._run(self.database.mark_published, media_id, channel_message_id)
+
+    async def reschedule_publication(self, media_id: int, next_attempt_at: float, error: str):
+        return await self._run(self.database.reschedule_publication, media_id, next_attempt_at, error)
+
+    async def get_publish_queue_stats(self, max_attempts: int) -> Tuple[int, int]:
+        return await self._run(self.database.get_publish_queue_stats, max_attempts)
+
+    async def get_indexing_sessions(self, now: float) -> List[Tuple[int, int, str, float]]:
+        return await self._run(self.database.get_indexing_sessions, now)
+
+    async def save_indexing_sessions(self, upserts: List[Tuple[int, int, str, float]],
+                                     deletes: List[Tuple[int, int]], now: float):
+        return await self._run(self.database.save_indexing_sessions, upserts, deletes, now)
+
+    async def get_episodes_by_media_id(self, media_id: int) -> List[Episode]:
+        return await self._run(self.database.get_episodes_by_media_id, media_id)
+
+    async def get_seasons(self, media_id: int) -> List[Tuple[int, int]]:
+        return await self._run(self.database.get_seasons, media_id)
+
+    async def get_episodes_by_season(self, media_id: int, season_number: int) -> List[Episode]:
+        return await self._run(self.database.get_episodes_by_season, media_id, season_number)
+
+    async def get_episode_by_id(self, episode_id: int) -> Optional[Episode]:
+        return await self._run(self.database.get_episode_by_id, episode_id)
+
+    async def delete_media(self, media_id: int) -> bool:
+        return await self._run(self.database.delete_media, media_id)
+
+    async def delete_all_media(self) -> int:
+        return await self._run(self.database.delete_all_media)
+
+    async def get_stats(self) -> Tuple[int, int]:
+        return await self._run(self.database.get_stats)
+
+    def close(self):
+        """Stop the worker threads and close the underlying pool"""
+        self._executor.shutdown(wait=True)
+        self.database.close()
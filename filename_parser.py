@@ -0,0 +1,163 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+@dataclass
+class ParsedFilename:
+    title: str
+    year: Optional[int] = None
+    season: Optional[int] = None
+    episode: Optional[int] = None
+    episode_end: Optional[int] = None  # last episode of a multi-episode file
+    quality: Optional[str] = None
+    codec: Optional[str] = None
+    source: Optional[str] = None
+    release_group: Optional[str] = None
+
+    @property
+    def is_episode(self) -> bool:
+        """Whether the file carries an SxxEyy (or 1x02) episode marker"""
+        return self.season is not None and self.episode is not None
+
+    @property
+    def episodes(self) -> List[int]:
+        """Every episode number covered by the file"""
+        if self.episode is None:
+            return []
+        last = self.episode_end if self.episode_end and self.episode_end >= self.episode else self.episode
+        return list(range(self.episode, last + 1))
+
+# Tokens of a release name together with the separator run in front of them
+_TOKEN_RE = re.compile(r"((?:[^\w\[\(\{]|_)*)(\[[^\]]*\]|\([^)]*\)|\{[^}]*\}|[^\W_]+(?:['’][^\W_]+)*)")
+
+# Tokens whose digits need decoding, matched against the lowercased token
+_NUMBERED_RE = re.compile(r'''
+    s(?P<season>\d{1,2})(?:e(?P<episode>\d{1,3})(?:e(?P<episode_end>\d{1,3}))?)?
+  | e(?P<next_episode>\d{1,3})
+  | (?P<nxn_season>\d{1,2})x(?P<nxn_episode>\d{2,3})
+  | (?P<year>(?:19|20)\d{2})
+  | (?P<audio>(?:ddp?|aac|e?ac3|dts)\d?)
+''', re.VERBOSE)
+
+_KEYWORDS = {
+    **dict.fromkeys(("2160p", "1080p", "720p", "576p", "480p", "360p", "4k", "uhd"), "quality"),
+    **dict.fromkeys(("webdl", "webrip", "web", "hdrip", "brrip", "bdrip", "bluray", "blu", "dvdrip", "dvd",
+                     "hdtv", "hdcam", "hdts", "cam", "remux"), "source"),
+    **dict.fromkeys(("x264", "x265", "h264", "h265", "hevc", "avc", "xvid", "divx", "av1", "vp9"), "codec"),
+    **dict.fromkeys(("truehd", "atmos", "flac", "mp3", "hdr", "hdr10", "dv", "10bit", "8bit", "repack",
+                     "proper", "extended", "unrated", "remastered", "imax", "dual", "multi", "latino",
+                     "castellano", "vose", "sub", "subs", "complete", "hd"), "tag"),
+}
+
+# Keywords that are also ordinary title words ("Charlotte's Web", "Dual"), they
+# only count as metadata once the title has already ended
+_AMBIGUOUS_KEYWORDS = {"web", "cam", "dv", "dual", "multi", "latino", "castellano", "sub", "subs", "complete"}
+
+_SEASON_WORDS = {"season", "temporada"}
+_EPISODE_WORDS = {"episode", "episodio", "capitulo", "cap"}
+
+_VIDEO_EXTENSIONS = {"mkv", "mp4", "avi", "m4v", "mov", "wmv", "flv", "webm", "m2ts", "ts", "mpg", "mpeg",
+                     "3gp", "rmvb"}
+
+def parse_filename(filename: str) -> ParsedFilename:
+    """Split a release name into title and metadata in a single pass over its tokens"""
+    tokens = _TOKEN_RE.findall(filename)
+    if len(tokens) > 1 and tokens[-1][0] == "." and tokens[-1][1].lower() in _VIDEO_EXTENSIONS:
+        tokens.pop()
+
+    parsed = ParsedFilename(title="")
+    title_words = []
+    # Set by the first metadata token, words after it are not part of the title
+    title_done = False
+    previous_kind = None
+    index = 0
+    count = len(tokens)
+
+    while index < count:
+        separator, token = tokens[index]
+        index += 1
+        lower = token.lower()
+        following = tokens[index][1] if index < count else ""
+        kind = _KEYWORDS.get(lower)
+
+        if token[0] in "[({":
+            inner = token[1:-1].strip()
+            if len(inner) == 4 and inner.isdigit() and inner[:2] in ("19", "20"):
+                parsed.year = parsed.year or int(inner)
+                kind = "year"
+            elif not title_words:
+                # "[Group] Title ..." prefix, the title is still ahead
+                parsed.release_group = parsed.release_group or inner or None
+                continue
+            else:
+                kind = "bracket"
+        elif kind is not None:
+            if lower in _AMBIGUOUS_KEYWORDS and not title_done:
+                kind = None
+            elif kind == "quality":
+                parsed.quality = parsed.quality or token
+            elif kind == "source":
+                if lower == "web" and following.lower() in ("dl", "rip"):
+                    token = f"{token}-{following}"
+                    index += 1
+                parsed.source = parsed.source or token
+            elif kind == "codec":
+                parsed.codec = parsed.codec or token
+        elif lower in ("h", "x") and following in ("264", "265"):
+            # "H.264" is split into two tokens by the dot
+            parsed.codec = parsed.codec or f"{token}.{following}"
+            index += 1
+            kind = "codec"
+        elif lower in _SEASON_WORDS and following.isdigit():
+            parsed.season = int(following)
+            index += 1
+            kind = "season"
+        elif lower in _EPISODE_WORDS and following.isdigit():
+            parsed.episode = int(following)
+            index += 1
+            kind = "episode"
+        elif previous_kind == "episode" and separator == "-" and token.isdigit():
+            # "S01E01-03"
+            parsed.episode_end = int(token)
+            kind = "episode"
+        else:
+            match = _NUMBERED_RE.fullmatch(lower)
+            if match is None:
+                pass
+            elif match.group("season"):
+                parsed.season = int(match.group("season"))
+                kind = "season"
+                if match.group("episode"):
+                    parsed.episode = int(match.group("episode"))
+                    kind = "episode"
+                if match.group("episode_end"):
+                    parsed.episode_end = int(match.group("episode_end"))
+            elif match.group("next_episode"):
+                # "S01E01-E03" and "S01E01.E02"
+                if previous_kind == "episode":
+                    parsed.episode_end = int(match.group("next_episode"))
+                    kind = "episode"
+            elif match.group("nxn_season"):
+                parsed.season = int(match.group("nxn_season"))
+                parsed.episode = int(match.group("nxn_episode"))
+                kind = "episode"
+            elif match.group("year"):
+                # A leading year is the title itself ("1917", "2012")
+                if title_words:
+                    parsed.year = parsed.year or int(lower)
+                    kind = "year"
+            else:
+                kind = "tag"
+
+        if kind is None:
+            if not title_done:
+                title_words.append(token)
+            elif index == count and "-" in separator:
+                # "...x264-GROUP" scene suffix
+                parsed.release_group = parsed.release_group or token
+        elif title_words:
+            title_done = True
+        previous_kind = kind
+
+    parsed.title = " ".join(title_words)
+    return parsed
@@ -0,0 +1,74 @@
+import re
+import unicodedata
+from typing import Iterable, Optional, Sequence, Set, Tuple
+
+_WORD_RE = re.compile(r'\w+')
+
+def fold_text(text: str) -> str:
+    """Lowercase text without accents, the way the FTS5 unicode61 tokenizer sees it"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+def query_tokens(query: str) -> Tuple[str, ...]:
+    """Folded words of a search query"""
+    return tuple(_WORD_RE.findall(fold_text(query)))
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of folded text, padded so short words still produce some"""
+    padded = f"  {text} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+def title_trigrams(*titles: Optional[str]) -> Set[str]:
+    """Trigrams of every given title, the set stored in the trigram index"""
+    found = set()
+    for title in titles:
+        words = query_tokens(title or "")
+        if words:
+            found |= trigrams(" ".join(words))
+    return found
+
+def levenshtein(a: str, b: str, limit: Optional[int] = None) -> int:
+    """Edit distance between two strings, or limit + 1 as soon as it is known to exceed limit"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        # Distances never shrink from one row to the next
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def similarity(query_words: Sequence[str], title_words: Sequence[str], minimum: float = 0.0) -> float:
+    """Best edit-distance similarity, from 0 to 1, between the query and a run of title words
+
+    Runs one word shorter or longer than the query are tried too, and
+    spacing is ignored, so "spiderman" matches "Spider-Man" and "avtar"
+    matches the first word of "Avatar: The Way of Water". Runs scoring
+    below minimum are given up early, so the result is only exact from
+    minimum up.
+    """
+    query = "".join(query_words)
+    if not query or not title_words:
+        return 0.0
+    best = 0.0
+    for size in sorted({max(1, len(query_words) - 1), len(query_words), len(query_words) + 1}):
+        for start in range(max(1, len(title_words) - size + 1)):
+            window = "".join(title_words[start:start + size])
+            longest = max(len(window), len(query))
+            bound = max(best, minimum)
+            # The length difference alone bounds the distance, skip hopeless windows
+            if 1 - abs(len(window) - len(query)) / longest < bound:
+                continue
+            limit = int((1 - bound) * longest + 1e-9)
+            distance = levenshtein(query, window, limit)
+            if distance <= limit:
+                best = max(best, 1 - distance / longest)
+    return best
+
+def best_similarity(query_words: Sequence[str], titles: Iterable[Optional[str]], minimum: float = 0.0) -> float:
+    """similarity() against the closest of several titles"""
+    return max((similarity(query_words, query_tokens(title or ""), minimum) for title in titles), default=0.0)
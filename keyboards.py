@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from database import DatabaseListener, Episode
+
+SEASONS_PER_ROW = 3
+EPISODES_PER_ROW = 5
+# 6 rows of 5 keeps a page well inside Telegram's keyboard size limits
+EPISODES_PER_PAGE = 30
+
+def build_season_keyboard(media_id: int, seasons: List[Tuple[int, int]]) -> InlineKeyboardMarkup:
+    """Season picker from (season_number, episode_count) pairs"""
+    buttons = [
+        InlineKeyboardButton(f"Temporada {season} ({count})", callback_data=f"season_{media_id}_{season}")
+        for season, count in seasons
+    ]
+    keyboard = [buttons[index:index + SEASONS_PER_ROW] for index in range(0, len(buttons), SEASONS_PER_ROW)]
+    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data=f"back_{media_id}")])
+    return InlineKeyboardMarkup(keyboard)
+
+def build_episode_keyboard(media_id: int, season: int, episodes: List[Episode], page: int,
+                           back_data: str) -> InlineKeyboardMarkup:
+    """One page of the episode grid of a season, with ◀/▶ buttons between pages"""
+    page_count = max(1, -(-len(episodes) // EPISODES_PER_PAGE))
+    page = min(max(page, 0), page_count - 1)
+    shown = episodes[page * EPISODES_PER_PAGE:(page + 1) * EPISODES_PER_PAGE]
+
+    buttons = [
+        InlineKeyboardButton(f"E{episode.episode_number}", callback_data=f"episode_{episode.id}")
+        for episode in shown
+    ]
+    keyboard = [buttons[index:index + EPISODES_PER_ROW] for index in range(0, len(buttons), EPISODES_PER_ROW)]
+
+    if page_count > 1:
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("◀", callback_data=f"epage_{media_id}_{season}_{page - 1}"))
+        navigation.append(InlineKeyboardButton(f"{page + 1}/{page_count}", callback_data="noop"))
+        if page < page_count - 1:
+            navigation.append(InlineKeyboardButton("▶", callback_data=f"epage_{media_id}_{season}_{page + 1}"))
+        keyboard.append(navigation)
+
+    keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data=back_data)])
+    return InlineKeyboardMarkup(keyboard)
+
+class KeyboardCache(DatabaseListener):
+    """LRU of prebuilt picker keyboards keyed by (media_id, season, page)
+
+    The season picker of a series is stored under season None. Entries of a
+    series are dropped as soon as its episodes change.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._markups: "OrderedDict[Tuple[int, Optional[int], int], InlineKeyboardMarkup]" = OrderedDict()
+        self._keys_by_media: Dict[int, Set[Tuple[int, Optional[int], int]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, media_id: int, season: Optional[int] = None, page: int = 0) -> Optional[InlineKeyboardMarkup]:
+        """Cached keyboard, None on a miss"""
+        key = (media_id, season, page)
+        with self._lock:
+            markup = self._markups.get(key)
+            if markup is None:
+                self.misses += 1
+                return None
+            self._markups.move_to_end(key)
+            self.hits += 1
+            return markup
+
+    def put(self, markup: InlineKeyboardMarkup, media_id: int, season: Optional[int] = None, page: int = 0):
+        """Store a keyboard, evicting the least recently used one"""
+        key = (media_id, season, page)
+        with self._lock:
+            self._markups[key] = markup
+            self._markups.move_to_end(key)
+            self._keys_by_media.setdefault(media_id, set()).add(key)
+            while len(self._markups) > self.max_entries:
+                old_key, _ = self._markups.popitem(last=False)
+                self._discard_key(old_key)
+
+    def on_episodes_changed(self, media_id: int):
+        self.invalidate(media_id)
+
+    def on_media_deleted(self, media_id: int):
+        self.invalidate(media_id)
+
+    def on_all_media_deleted(self):
+        with self._lock:
+            self._markups.clear()
+            self._keys_by_media.clear()
+
+    def invalidate(self, media_id: int):
+        """Drop every keyboard of a series"""
+        with self._lock:
+            for key in self._keys_by_media.pop(media_id, ()):
+                self._markups.pop(key, None)
+
+    def _discard_key(self, key: Tuple[int, Optional[int], int]):
+        keys = self._keys_by_media.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_media[key[0]]
@@ -0,0 +1,251 @@
+import asyncio
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a cached SQLite lookup to a slow TMDB retry
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# TYPE and HELP of the metrics recorded by the bot itself
+METRIC_HELP = {
+    "bot_handler_seconds": ("histogram", "Time spent in each update handler"),
+    "bot_handler_calls_total": ("counter", "Update handler calls by outcome"),
+    "db_query_seconds": ("histogram", "Time spent running each Database query on a worker thread"),
+    "db_query_wait_seconds": ("histogram", "Time Database queries waited for a free worker thread"),
+    "db_query_rows_total": ("counter", "Rows returned by each Database query"),
+    "db_query_errors_total": ("counter", "Database queries that raised"),
+    "tmdb_request_seconds": ("histogram", "Duration of each HTTP request to TMDB, retries included separately"),
+    "tmdb_requests_total": ("counter", "HTTP requests to TMDB by endpoint and status code"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+# (name, type, help, [(labels, value), ...]) produced by a collector at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+
+class Histogram:
+    """Cumulative-bucket latency histogram, also tracking the largest value seen"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf overflow
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the bucket that holds it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+class Metrics:
+    """Thread-safe registry of counters and histograms, rendered in Prometheus text format
+
+    Metrics are created on first use, so instrumented code only names what
+    it records. Values that already live elsewhere, such as cache hit
+    counters, are read at scrape time from collectors instead of being
+    copied on every change.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = dict(METRIC_HELP)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        """Set the TYPE and HELP lines of a metric"""
+        self._help[name] = (kind, help_text)
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Register a callable returning metric families, called on every scrape"""
+        self._collectors.append(collector)
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: Any):
+        """Add value to a counter"""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any):
+        """Record one value in a histogram"""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels: Any) -> Iterator[None]:
+        """Observe the duration of the block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def instrument_handler(self, callback: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """Wrap a bot handler so its latency and failures are recorded under its name"""
+        handler = callback.__name__
+
+        @functools.wraps(callback)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            outcome = "ok"
+            try:
+                return await callback(*args, **kwargs)
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                self.observe("bot_handler_seconds", time.perf_counter() - start, handler=handler)
+                self.inc("bot_handler_calls_total", handler=handler, outcome=outcome)
+
+        return wrapper
+
+    def histograms(self, name: str) -> Dict[Labels, Histogram]:
+        """Snapshot copy of every series of a histogram"""
+        with self._lock:
+            series = self._histograms.get(name, {})
+            snapshot = {}
+            for key, histogram in series.items():
+                copy = Histogram(histogram.buckets)
+                copy.counts = list(histogram.counts)
+                copy.count, copy.sum, copy.max = histogram.count, histogram.sum, histogram.max
+                snapshot[key] = copy
+            return snapshot
+
+    def counters(self, name: str) -> Dict[Labels, float]:
+        """Snapshot copy of every series of a counter"""
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    @staticmethod
+    def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+        pairs = [
+            '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for key, value in labels
+        ]
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _header(self, lines: List[str], name: str, default_kind: str):
+        kind, help_text = self._help.get(name, (default_kind, ""))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histogram_names = sorted(self._histograms)
+        for name in sorted(counters):
+            self._header(lines, name, "counter")
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{self._format_labels(key)} {value:g}")
+
+        for name in histogram_names:
+            self._header(lines, name, "histogram")
+            for key, histogram in sorted(self.histograms(name).items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    labels = self._format_labels(key + (("le", f"{bound:g}"),))
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                lines.append(f"{name}_bucket{self._format_labels(key + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{self._format_labels(key)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{self._format_labels(key)} {histogram.count}")
+
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{self._format_labels(self._labels(labels))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    """Minimal HTTP server answering GET /metrics, independent of polling or webhook mode"""
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9090):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """Listen for scrapes, a port already in use is logged instead of stopping the bot"""
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        except OSError as e:
+            logger.error(f"Could not serve metrics on {self.host}:{self.port}: {e}")
+            return
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=10)
+            # Headers are not needed, but must be consumed before answering
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=10)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) >= 2 else ""
+            if len(parts) >= 2 and parts[0] == "GET" and path == "/metrics":
+                status, body = "200 OK", self.metrics.render().encode()
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = "404 Not Found", b"Not Found\n", "text/plain"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
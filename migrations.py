@@ -0,0 +1,221 @@
+import logging
+import sqlite3
+from typing import Callable, List, Tuple
+
+from fuzzy import title_trigrams
+
+logger = logging.getLogger(__name__)
+
+def _create_base_tables(cursor: sqlite3.Cursor):
+    """Original media and episodes tables"""
+    # Create media table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS media (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            year INTEGER,
+            media_type TEXT NOT NULL,
+            tmdb_id INTEGER NOT NULL,
+            file_id TEXT,
+            file_path TEXT,
+            caption TEXT,
+            poster_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create episodes table for TV series
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS episodes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            media_id INTEGER NOT NULL,
+            season_number INTEGER NOT NULL,
+            episode_number INTEGER NOT NULL,
+            title TEXT,
+            file_id TEXT,
+            file_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (media_id) REFERENCES media (id)
+        )
+    ''')
+
+def _add_media_text_columns(cursor: sqlite3.Cursor):
+    """Original title and overview, indexed by the full-text search"""
+    _add_columns(cursor, "media", {"original_title": "TEXT", "overview": "TEXT"})
+
+def _add_indexes_and_constraints(cursor: sqlite3.Cursor):
+    """Unique media/episode keys, lookup indexes and cascading deletes"""
+    # Merge duplicated titles into the oldest row before enforcing uniqueness
+    cursor.execute('''
+        UPDATE episodes SET media_id = (
+            SELECT MIN(keeper.id) FROM media keeper
+            JOIN media dup ON dup.tmdb_id = keeper.tmdb_id AND dup.media_type = keeper.media_type
+            WHERE dup.id = episodes.media_id
+        )
+        WHERE media_id IN (SELECT id FROM media)
+    ''')
+    cursor.execute('''
+        DELETE FROM media WHERE id NOT IN (
+            SELECT MIN(id) FROM media GROUP BY tmdb_id, media_type
+        )
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_media_tmdb ON media (tmdb_id, media_type)')
+
+    # SQLite cannot alter constraints, so episodes is rebuilt. Orphans and
+    # duplicated episodes are dropped, the oldest copy wins
+    cursor.execute('''
+        CREATE TABLE episodes_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            media_id INTEGER NOT NULL,
+            season_number INTEGER NOT NULL,
+            episode_number INTEGER NOT NULL,
+            title TEXT,
+            file_id TEXT,
+            file_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (media_id) REFERENCES media (id) ON DELETE CASCADE,
+            UNIQUE (media_id, season_number, episode_number)
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO episodes_new
+        SELECT id, media_id, season_number, episode_number, title, file_id, file_path, created_at
+        FROM episodes
+        WHERE media_id IN (SELECT id FROM media)
+        ORDER BY id
+    ''')
+    cursor.execute('DROP TABLE episodes')
+    cursor.execute('ALTER TABLE episodes_new RENAME TO episodes')
+
+def _add_poster_file_id(cursor: sqlite3.Cursor):
+    """Telegram file_id of the poster once it has been uploaded"""
+    _add_columns(cursor, "media", {"poster_file_id": "TEXT"})
+
+def _create_indexing_sessions(cursor: sqlite3.Cursor):
+    """Pending upload selections, so they survive a restart"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS indexing_sessions (
+            user_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (user_id, message_id)
+        )
+    ''')
+
+def _create_publish_queue(cursor: sqlite3.Cursor):
+    """Channel posts waiting to be published, and the channel message of published media"""
+    _add_columns(cursor, "media", {"channel_message_id": "INTEGER"})
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS publish_queue (
+            media_id INTEGER PRIMARY KEY REFERENCES media (id) ON DELETE CASCADE,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_publish_queue_due ON publish_queue (next_attempt_at)')
+
+def _create_trigram_index(cursor: sqlite3.Cursor):
+    """Title trigram postings for typo-tolerant search, backfilled from existing media"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS media_trigrams (
+            trigram TEXT NOT NULL,
+            media_id INTEGER NOT NULL REFERENCES media (id) ON DELETE CASCADE,
+            PRIMARY KEY (trigram, media_id)
+        ) WITHOUT ROWID
+    ''')
+    # Cascading deletes look postings up by media
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_media_trigrams_media ON media_trigrams (media_id)')
+    cursor.execute('SELECT id, title, original_title FROM media')
+    rows = cursor.fetchall()
+    cursor.executemany('INSERT OR IGNORE INTO media_trigrams (trigram, media_id) VALUES (?, ?)',
+                       ((trigram, media_id) for media_id, title, original_title in rows
+                        for trigram in title_trigrams(title, original_title)))
+
+def _create_trigram_stats(cursor: sqlite3.Cursor):
+    """Number of titles holding each trigram, kept current by triggers on the postings"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS trigram_stats (
+            trigram TEXT PRIMARY KEY,
+            documents INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO trigram_stats (trigram, documents)
+        SELECT trigram, COUNT(*) FROM media_trigrams GROUP BY trigram
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS media_trigrams_ai AFTER INSERT ON media_trigrams BEGIN
+            INSERT INTO trigram_stats (trigram, documents) VALUES (new.trigram, 1)
+            ON CONFLICT (trigram) DO UPDATE SET documents = documents + 1;
+        END
+    ''')
+    # Also fires for the postings removed by cascading media deletes
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS media_trigrams_ad AFTER DELETE ON media_trigrams BEGIN
+            UPDATE trigram_stats SET documents = documents - 1 WHERE trigram = old.trigram;
+        END
+    ''')
+
+def _add_columns(cursor: sqlite3.Cursor, table: str, columns: dict):
+    """ALTER TABLE ADD COLUMN for every column the table is still missing"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    for column, definition in columns.items():
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+# Ordered schema migrations. Append new steps at the end and never edit or
+# renumber a released one, existing databases only run what they miss
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "base media and episodes tables", _create_base_tables),
+    (2, "media original_title and overview", _add_media_text_columns),
+    (3, "indexes, unique keys and cascading episode deletes", _add_indexes_and_constraints),
+    (4, "media poster_file_id", _add_poster_file_id),
+    (5, "indexing sessions table", _create_indexing_sessions),
+    (6, "publish queue and media channel_message_id", _create_publish_queue),
+    (7, "media title trigram index", _create_trigram_index),
+    (8, "title trigram document frequencies", _create_trigram_stats),
+]
+
+def apply_migrations(conn: sqlite3.Connection) -> List[int]:
+    """Bring the schema up to date, returning the versions that were applied"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    current = conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+    pending = [migration for migration in MIGRATIONS if migration[0] > current]
+    if not pending:
+        return []
+
+    # Table rebuilds must not trigger foreign key actions, and the pragma
+    # cannot be changed inside a transaction
+    conn.execute('PRAGMA foreign_keys=OFF')
+    applied = []
+    try:
+        for version, description, step in pending:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Older databases may already hold orphans, only fail on new ones
+                broken_before = len(conn.execute('PRAGMA foreign_key_check').fetchall())
+                step(conn.cursor())
+                broken_after = len(conn.execute('PRAGMA foreign_key_check').fetchall())
+                if broken_after > broken_before:
+                    raise sqlite3.IntegrityError(f"Migration {version} left {broken_after} broken references")
+                conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                             (version, description))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            logger.info(f"Applied schema migration {version}: {description}")
+            applied.append(version)
+    finally:
+        conn.execute('PRAGMA foreign_keys=ON')
+    return applied
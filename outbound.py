@@ -0,0 +1,175 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first. Pass rate_limit_args={"priority": ...} to a bot method to
+# override the default picked from the chat type
+PRIORITY_USER = 0
+PRIORITY_GROUP = 1
+PRIORITY_CHANNEL = 2
+PRIORITY_BACKGROUND = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_USER: "user",
+    PRIORITY_GROUP: "group",
+    PRIORITY_CHANNEL: "channel",
+    PRIORITY_BACKGROUND: "background",
+}
+
+class OutboundScheduler(BaseRateLimiter):
+    """Bot API rate limiter with a global limit, per-chat limits and priorities
+
+    Requests aimed at a chat first wait for that chat's token bucket, then
+    line up for the global bucket in priority order, so user deliveries
+    overtake channel posts during a burst. A RetryAfter pauses the affected
+    chat and the request is queued again. Requests without a chat
+    (getUpdates, answerCallbackQuery, answerInlineQuery) are never delayed.
+    """
+
+    def __init__(self, global_rate: float = 30.0, private_rate: float = 1.0, group_rate: float = 20 / 60,
+                 max_retries: int = 5, max_chats: int = 10000):
+        self.global_rate = global_rate
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate)
+        self._chats: "OrderedDict[Union[int, str], TokenBucket]" = OrderedDict()
+        # Monotonic time until which a chat is flood-waited
+        self._paused_until: Dict[Union[int, str], float] = {}
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.sent = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.retries = 0
+        self.max_depth = 0
+
+    async def initialize(self) -> None:
+        # ExtBot initializes its rate limiter on every bot.initialize(), and
+        # both the Application and the Updater call it
+        if self._dispatcher is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+        for _, _, future in self._waiting:
+            future.cancel()
+        self._waiting = []
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = data.get("chat_id")
+        if chat_id is None or self._dispatcher is None:
+            return await callback(*args, **kwargs)
+
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+        # Negative ids and @usernames are groups or channels
+        is_private = isinstance(chat_id, int) and chat_id > 0
+        priority = (rate_limit_args or {}).get("priority", PRIORITY_USER if is_private else PRIORITY_GROUP)
+
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_chat(chat_id, is_private)
+            await self._wait_for_turn(priority)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"Flood control on {endpoint} for chat {chat_id}, retrying in {e.retry_after}s")
+                self._paused_until[chat_id] = max(self._paused_until.get(chat_id, 0.0),
+                                                  time.monotonic() + float(e.retry_after))
+                continue
+            self.sent[PRIORITY_NAMES.get(priority, "background")] += 1
+            return result
+
+    async def _wait_for_chat(self, chat_id: Union[int, str], is_private: bool):
+        """Sleep until the chat's bucket has a token and it is out of flood wait"""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            rate = self.private_rate if is_private else self.group_rate
+            # A little burst keeps replies to a single user snappy
+            bucket = self._chats[chat_id] = TokenBucket(rate, capacity=3 if is_private else 1)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        delay = bucket.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        # A flood wait may have started while this request was being spaced out
+        while chat_id in self._paused_until:
+            pause = self._paused_until[chat_id] - time.monotonic()
+            if pause <= 0:
+                del self._paused_until[chat_id]
+                break
+            await asyncio.sleep(pause)
+
+    async def _wait_for_turn(self, priority: int):
+        """Queue for the global bucket, the dispatcher releases the best priority first"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), future))
+        self.max_depth = max(self.max_depth, len(self._waiting))
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        """Release queued requests one global token at a time"""
+        while True:
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self._global.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            # The head may have been cancelled while we slept
+            while self._waiting:
+                _, _, future = heapq.heappop(self._waiting)
+                if not future.done():
+                    future.set_result(None)
+                    break
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, sends per priority and flood-control retries"""
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._waiting:
+            if not future.done():
+                depth[PRIORITY_NAMES.get(priority, "background")] += 1
+        return {
+            "queued": sum(depth.values()),
+            "queued_by_priority": depth,
+            "max_depth": self.max_depth,
+            "sent": dict(self.sent),
+            "retries": self.retries,
+        }
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from concurrency import wait_until_running
+from database import AsyncDatabase, Media
+
+logger = logging.getLogger(__name__)
+
+class ChannelPublisher:
+    """Background worker that posts queued media to the official channel
+
+    Media are queued by AsyncDatabase.add_media_for_publication in the same
+    transaction as the row itself, so a post is never lost between the insert
+    and the send. Due posts are read in batches and sent one at a time, the
+    outbound scheduler spaces them to the channel limit. A failed post is
+    retried with exponential backoff until max_attempts, then left in the
+    queue and reported by stats(). A post that was sent but could not be
+    marked published is only marked on the next round, never sent again.
+    """
+
+    def __init__(self, db: AsyncDatabase, publish: Callable[[Any, Media], Awaitable[Any]],
+                 max_attempts: int = 8, base_delay: float = 30.0, max_delay: float = 3600.0,
+                 poll_interval: float = 30.0, batch_size: int = 20):
+        self.db = db
+        # publish(bot, media) sends the post and returns the channel message
+        self.publish = publish
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.published = 0
+        self.failures = 0
+        # Channel message ids of sent posts still waiting for mark_published
+        self._sent: Dict[int, int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def notify(self):
+        """Wake the worker up after queueing a post"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def retry_delay(self, attempts: int) -> float:
+        """Seconds to wait after the given number of failed attempts"""
+        return min(self.max_delay, self.base_delay * 2 ** attempts)
+
+    async def run(self, application):
+        """Publish due posts while the application runs"""
+        self._wakeup = asyncio.Event()
+        await wait_until_running(application)
+        while application.running:
+            self._wakeup.clear()
+            try:
+                published_any = await self.publish_due(application.bot, lambda: application.running)
+            except Exception as e:
+                logger.error(f"Error processing the publish queue: {e}")
+                published_any = False
+            if published_any:
+                continue
+            # Sleep in short slices so stopping the application is not held up
+            deadline = time.monotonic() + self.poll_interval
+            while application.running and not self._wakeup.is_set() and time.monotonic() < deadline:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(1.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    pass
+            if not application.running:
+                return
+
+    async def publish_due(self, bot, keep_going: Callable[[], bool] = lambda: True) -> bool:
+        """Send one batch of due posts, True if there was anything to send"""
+        due = await self.db.get_due_publications(time.time(), self.max_attempts, self.batch_size)
+        if not due:
+            return False
+        media_by_id = {media.id: media for media in await self.db.get_media_by_ids([row[0] for row in due])}
+        for media_id, attempts in due:
+            if not keep_going():
+                break
+            message_id = self._sent.get(media_id)
+            if message_id is None:
+                media = media_by_id.get(media_id)
+                if media is None:
+                    # Deleted media leave the queue through ON DELETE CASCADE
+                    continue
+                try:
+                    message = await self.publish(bot, media)
+                except Exception as e:
+                    self.failures += 1
+                    delay = self.retry_delay(attempts)
+                    if attempts + 1 >= self.max_attempts:
+                        logger.error(f"Giving up publishing media {media_id} after {attempts + 1} attempts: {e}")
+                    else:
+                        logger.warning(f"Error publishing media {media_id}, retrying in {delay:.0f}s: {e}")
+                    await self.db.reschedule_publication(media_id, time.time() + delay, str(e)[:500])
+                    continue
+                # Kept until recorded, a failing write below leaves the post
+                # queued and the next round must not send it again
+                message_id = self._sent[media_id] = message.message_id
+            await self.db.mark_published(media_id, message_id)
+            del self._sent[media_id]
+            self.published += 1
+        return True
+
+    async def stats(self) -> Dict[str, int]:
+        """Queued and abandoned posts, plus sends and failures since startup"""
+        pending, failed = await self.db.get_publish_queue_stats(self.max_attempts)
+        return {
+            "pending": pending,
+            "failed": failed,
+            "published": self.published,
+            "failures": self.failures,
+        }
@@ -0,0 +1,211 @@
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from database import DatabaseListener, Media
+from fuzzy import fold_text, query_tokens
+
+_WORD_RE = re.compile(r'\w+')
+
+# Columns the full-text search ranks on
+_RANKED_COLUMNS = {"title", "original_title", "overview", "year"}
+
+def media_tokens(media: Media) -> Set[str]:
+    """Folded words of every column the full-text search indexes"""
+    text = " ".join((media.title or "", media.original_title or "", media.overview or "", str(media.year or "")))
+    return set(_WORD_RE.findall(fold_text(text)))
+
+class SearchCache(DatabaseListener):
+    """LRU of ranked search results and of the media rows they point to
+
+    Queries are keyed by their folded words, so "Película" and "pelicula"
+    share an entry. The cache listens to Database writes: a new title only
+    evicts the queries it would match, a deleted one only the queries that
+    returned it. Cached Media objects are shared and must be treated as
+    read-only.
+    """
+
+    def __init__(self, max_queries: int = 1024, max_rows: int = 4096, max_bytes: int = 16 * 1024 * 1024):
+        self.max_queries = max_queries
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Bumped by every invalidation, results computed before a write are
+        # not stored once the write has landed
+        self.generation = 0
+        self._queries: "OrderedDict[Tuple, Tuple[int, ...]]" = OrderedDict()
+        self._rows: "OrderedDict[int, Media]" = OrderedDict()
+        # Reverse index media id -> query keys whose results contain it
+        self._keys_by_id: Dict[int, Set[Tuple]] = {}
+        # Queries answered by the fuzzy fallback, any new title may change them
+        self._fuzzy_keys: Set[Tuple] = set()
+        self._sizes: Dict[object, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, fts: bool = True) -> Tuple:
+        """Cache key of a query, LIKE fallback searches match the raw text"""
+        tokens = query_tokens(query) if fts else ()
+        if tokens:
+            return ("fts",) + tokens
+        return ("like", query)
+
+    def get_ids(self, key: Tuple) -> Optional[Tuple[int, ...]]:
+        """Ranked media ids of a cached query, None on a miss"""
+        with self._lock:
+            ids = self._queries.get(key)
+            if ids is None:
+                self.misses += 1
+                return None
+            self._queries.move_to_end(key)
+            self.hits += 1
+            return ids
+
+    def put_ids(self, key: Tuple, ids: List[int], generation: int, fuzzy: bool = False):
+        """Store the ranked ids of a query computed while generation was current
+
+        fuzzy marks results of the typo-tolerant fallback, they are dropped
+        on every new title since prefix matching cannot tell which ones it
+        would join.
+        """
+        ids = tuple(ids)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._drop_query(key)
+            self._queries[key] = ids
+            if fuzzy:
+                self._fuzzy_keys.add(key)
+            for media_id in ids:
+                self._keys_by_id.setdefault(media_id, set()).add(key)
+            self._account(("q", key), sys.getsizeof(ids) + sum(sys.getsizeof(part) for part in key))
+            while len(self._queries) > self.max_queries:
+                self._drop_query(next(iter(self._queries)))
+            self._shrink()
+
+    def get_rows(self, ids: List[int]) -> Dict[int, Media]:
+        """Cached media rows among the given ids"""
+        found = {}
+        with self._lock:
+            for media_id in ids:
+                media = self._rows.get(media_id)
+                if media is not None:
+                    self._rows.move_to_end(media_id)
+                    found[media_id] = media
+        return found
+
+    def put_rows(self, rows: List[Media], generation: int):
+        """Store media rows read while generation was current"""
+        with self._lock:
+            if generation != self.generation:
+                return
+            for media in rows:
+                self._drop_row(media.id)
+                self._rows[media.id] = media
+                self._account(("r", media.id), self._row_size(media))
+            while len(self._rows) > self.max_rows:
+                self._drop_row(next(iter(self._rows)))
+            self._shrink()
+
+    def on_media_added(self, media: Media):
+        words = media_tokens(media)
+        title = (media.title or "").lower()
+        with self._lock:
+            self.generation += 1
+            stale = list(self._fuzzy_keys)
+            for key in self._queries:
+                if key in self._fuzzy_keys:
+                    continue
+                if key[0] == "fts":
+                    # Every query word is a prefix term, all of them must hit
+                    if all(any(word.startswith(token) for word in words) for token in key[1:]):
+                        stale.append(key)
+                elif key[1].lower() in title:
+                    stale.append(key)
+            for key in stale:
+                self._drop_query(key)
+
+    def on_media_updated(self, media_id: int, columns: Tuple[str, ...]):
+        if _RANKED_COLUMNS.intersection(columns):
+            # Rankings that include it are redone
+            self._forget_media(media_id)
+            return
+        with self._lock:
+            self.generation += 1
+            self._drop_row(media_id)
+
+    def on_media_deleted(self, media_id: int):
+        self._forget_media(media_id)
+
+    def on_all_media_deleted(self):
+        self.clear()
+
+    def _forget_media(self, media_id: int):
+        """Drop a media row and every query whose results contain it"""
+        with self._lock:
+            self.generation += 1
+            for key in list(self._keys_by_id.get(media_id, ())):
+                self._drop_query(key)
+            self._drop_row(media_id)
+
+    def clear(self):
+        """Forget every cached query and row"""
+        with self._lock:
+            self.generation += 1
+            self._queries.clear()
+            self._rows.clear()
+            self._keys_by_id.clear()
+            self._fuzzy_keys.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current size"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "queries": len(self._queries),
+            "rows": len(self._rows),
+            "bytes": self._bytes,
+        }
+
+    @staticmethod
+    def _row_size(media: Media) -> int:
+        """Rough memory footprint of a Media object"""
+        return sys.getsizeof(media) + sum(
+            sys.getsizeof(value) for value in vars(media).values()
+        )
+
+    def _account(self, slot: Tuple, size: int):
+        self._sizes[slot] = size
+        self._bytes += size
+
+    def _drop_query(self, key: Tuple):
+        ids = self._queries.pop(key, None)
+        if ids is None:
+            return
+        self._fuzzy_keys.discard(key)
+        for media_id in ids:
+            keys = self._keys_by_id.get(media_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_id[media_id]
+        self._bytes -= self._sizes.pop(("q", key), 0)
+
+    def _drop_row(self, media_id: int):
+        if self._rows.pop(media_id, None) is not None:
+            self._bytes -= self._sizes.pop(("r", media_id), 0)
+
+    def _shrink(self):
+        """Evict least recently used rows, then queries, until under max_bytes"""
+        while self._bytes > self.max_bytes and self._rows:
+            self._drop_row(next(iter(self._rows)))
+        while self._bytes > self.max_bytes and self._queries:
+            self._drop_query(next(iter(self._queries)))
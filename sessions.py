@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from concurrency import wait_until_running
+from database import AsyncDatabase
+
+logger = logging.getLogger(__name__)
+
+SessionKey = Tuple[int, int]
+
+class IndexingSessionStore:
+    """Pending upload selections keyed by (user_id, upload message_id)
+
+    Each upload gets its own session, so an admin can queue many files and
+    answer the keyboards in any order. Sessions expire after ttl seconds and
+    the oldest one is evicted past max_sessions. Changes are kept in memory
+    and written to SQLite in batches by flush(), a restart only loses what
+    changed since the last flush.
+    """
+
+    def __init__(self, db: AsyncDatabase, ttl: float = 86400, max_sessions: int = 1000):
+        self.db = db
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.expired = 0
+        self.evicted = 0
+        # Ordered by expiry, put() always moves a session to the end
+        self._sessions: "OrderedDict[SessionKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Keys changed since the last flush, written if still present and deleted otherwise
+        self._dirty: Set[SessionKey] = set()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, user_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+        """Data of a live session, None when it is unknown or expired"""
+        key = (user_id, message_id)
+        entry = self._sessions.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._sessions[key]
+            self._dirty.add(key)
+            self.expired += 1
+            return None
+        return entry[1]
+
+    def put(self, user_id: int, message_id: int, data: Dict[str, Any]):
+        """Start or replace a session, evicting expired and then the oldest ones"""
+        key = (user_id, message_id)
+        now = time.time()
+        self._sessions.pop(key, None)
+        self._sessions[key] = (now + self.ttl, data)
+        self._dirty.add(key)
+        self._expire(now)
+        while len(self._sessions) > self.max_sessions:
+            old_key, _ = self._sessions.popitem(last=False)
+            self._dirty.add(old_key)
+            self.evicted += 1
+
+    def pop(self, user_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+        """Finish a session, returning its data"""
+        key = (user_id, message_id)
+        entry = self._sessions.pop(key, None)
+        if entry is None:
+            return None
+        self._dirty.add(key)
+        return entry[1]
+
+    async def load(self):
+        """Restore the sessions persisted before the last shutdown"""
+        rows = await self.db.get_indexing_sessions(time.time())
+        for user_id, message_id, data, expires_at in rows:
+            self._sessions[(user_id, message_id)] = (expires_at, json.loads(data))
+        while len(self._sessions) > self.max_sessions:
+            self._dirty.add(self._sessions.popitem(last=False)[0])
+
+    async def flush(self):
+        """Write every session changed since the last flush in one transaction"""
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        upserts = []
+        deletes = []
+        for key in keys:
+            entry = self._sessions.get(key)
+            if entry is None:
+                deletes.append(key)
+            else:
+                upserts.append((key[0], key[1], json.dumps(entry[1]), entry[0]))
+        try:
+            await self.db.save_indexing_sessions(upserts, deletes, time.time())
+        except asyncio.CancelledError:
+            # Cancelled at shutdown, the final flush writes them again
+            self._dirty |= keys
+            raise
+        except Exception as e:
+            # Retried on the next flush
+            self._dirty |= keys
+            logger.error(f"Error saving indexing sessions: {e}")
+
+    async def run(self, application, interval: float):
+        """Flush periodically while the application runs"""
+        await wait_until_running(application)
+        while application.running:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        """Live sessions, sessions dropped by TTL or size, and unsaved changes"""
+        return {
+            "sessions": len(self._sessions),
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "pending_writes": len(self._dirty),
+        }
+
+    def _expire(self, now: float):
+        """Drop expired sessions from the oldest end"""
+        while self._sessions:
+            key, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[key]
+            self._dirty.add(key)
+            self.expired += 1
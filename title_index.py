@@ -0,0 +1,136 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from database import DatabaseListener, Media
+from fuzzy import fold_text, query_tokens, trigrams
+
+# Share of trigrams a title must have in common with a query to be a fuzzy match
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+class TitleIndex(DatabaseListener):
+    """In-memory prefix and trigram index over media titles for as-you-type lookups
+
+    Every word of the title and original title goes into a sorted token list,
+    so a prefix is found with a binary search. Queries with no prefix match,
+    typically typos, fall back to trigram similarity. The index is loaded
+    once and then follows Database writes as a listener.
+    """
+
+    def __init__(self):
+        self._tokens: List[str] = []
+        self._ids_by_token: Dict[str, Set[int]] = {}
+        self._ids_by_trigram: Dict[str, Set[int]] = {}
+        # media id -> (folded title used for ranking, indexed tokens, trigrams)
+        self._entries: Dict[int, Tuple[str, Tuple[str, ...], Tuple[str, ...]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, titles: Iterable[Tuple[int, str, Optional[str]]]):
+        """Replace the index with (id, title, original_title) rows"""
+        with self._lock:
+            self._tokens = []
+            self._ids_by_token = {}
+            self._ids_by_trigram = {}
+            self._entries = {}
+            for media_id, title, original_title in titles:
+                self._add(media_id, title, original_title, sort_tokens=False)
+            self._tokens = sorted(self._ids_by_token)
+
+    def search(self, query: str, limit: int = 200) -> List[int]:
+        """Media ids whose title words start with every query word, best first"""
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        folded = " ".join(tokens)
+
+        with self._lock:
+            # The longest word is usually the most selective one
+            candidates = None
+            for token in sorted(tokens, key=len, reverse=True):
+                matches = self._prefix_matches(token)
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    break
+
+            if candidates:
+                return heapq.nsmallest(limit, candidates, key=lambda media_id: self._rank(media_id, folded))
+            return self._fuzzy_matches(folded, limit)
+
+    def on_media_added(self, media: Media):
+        with self._lock:
+            self._add(media.id, media.title, media.original_title)
+
+    def on_media_deleted(self, media_id: int):
+        with self._lock:
+            self._remove(media_id)
+
+    def on_all_media_deleted(self):
+        self.load(())
+
+    def _rank(self, media_id: int, folded_query: str) -> Tuple[int, int, int]:
+        """Titles starting with the query first, then shorter titles, then newer ones"""
+        title = self._entries[media_id][0]
+        return (0 if title.startswith(folded_query) else 1, len(title), -media_id)
+
+    def _prefix_matches(self, prefix: str) -> Set[int]:
+        """Ids of every title with a word starting with prefix"""
+        matches = set()
+        index = bisect_left(self._tokens, prefix)
+        while index < len(self._tokens) and self._tokens[index].startswith(prefix):
+            matches |= self._ids_by_token[self._tokens[index]]
+            index += 1
+        return matches
+
+    def _fuzzy_matches(self, folded_query: str, limit: int) -> List[int]:
+        """Ids ranked by trigram similarity to the query, above MIN_TRIGRAM_SIMILARITY"""
+        query_trigrams = trigrams(folded_query)
+        shared: Dict[int, int] = {}
+        for trigram in query_trigrams:
+            for media_id in self._ids_by_trigram.get(trigram, ()):
+                shared[media_id] = shared.get(media_id, 0) + 1
+
+        scored = []
+        for media_id, count in shared.items():
+            # Jaccard similarity of the two trigram sets
+            similarity = count / (len(query_trigrams) + len(self._entries[media_id][2]) - count)
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                scored.append((-similarity, media_id))
+        return [media_id for _, media_id in heapq.nsmallest(limit, scored)]
+
+    def _add(self, media_id: int, title: str, original_title: Optional[str], sort_tokens: bool = True):
+        self._remove(media_id)
+        folded_title = fold_text(title or "")
+        tokens = tuple(set(query_tokens(f"{title or ''} {original_title or ''}")))
+        title_trigrams = tuple(trigrams(" ".join(query_tokens(title or ""))))
+        self._entries[media_id] = (folded_title, tokens, title_trigrams)
+
+        for token in tokens:
+            ids = self._ids_by_token.get(token)
+            if ids is None:
+                ids = self._ids_by_token[token] = set()
+                if sort_tokens:
+                    insort(self._tokens, token)
+            ids.add(media_id)
+        for trigram in title_trigrams:
+            self._ids_by_trigram.setdefault(trigram, set()).add(media_id)
+
+    def _remove(self, media_id: int):
+        entry = self._entries.pop(media_id, None)
+        if entry is None:
+            return
+        _, tokens, title_trigrams = entry
+        for token in tokens:
+            ids = self._ids_by_token[token]
+            ids.discard(media_id)
+            if not ids:
+                del self._ids_by_token[token]
+                del self._tokens[bisect_left(self._tokens, token)]
+        for trigram in title_trigrams:
+            ids = self._ids_by_trigram[trigram]
+            ids.discard(media_id)
+            if not ids:
+                del self._ids_by_trigram[trigram]
@@ -1,114 +1,238 @@
-import requests
-from typing import Dict, Optional, List
+import asyncio
+import json
+import logging
+import random
 import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+import httpx
+import requests
+from typing import Any, Dict, Optional, List, Tuple
+
+from filename_parser import parse_filename
+from metrics import Metrics
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limited or a transient server-side failure
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Numeric path segments, replaced so metrics get one series per endpoint
+_PATH_ID_RE = re.compile(r'/\d+')
+
+class TMDBError(Exception):
+    """TMDB could not answer a request, even after retrying"""
+
+class TMDBCache:
+    """Bounded in-memory LRU of TMDB responses backed by an on-disk SQLite store"""
+
+    # Seconds each kind of endpoint stays fresh
+    DEFAULT_TTLS = {
+        "search": 6 * 3600,
+        "movie": 7 * 86400,
+        "tv": 7 * 86400,
+        "season": 86400,
+    }
+
+    def __init__(self, path: Optional[str] = "tmdb_cache.db", max_entries: int = 2048,
+                 ttls: Optional[Dict[str, int]] = None, negative_ttl: int = 3600):
+        self.max_entries = max_entries
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Separate from _lock so a disk read on a worker thread never holds
+        # up an in-memory lookup on the event loop
+        self._disk_lock = threading.Lock()
+        self._disk = None
+
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute('PRAGMA journal_mode=WAL')
+            self._disk.execute('PRAGMA synchronous=NORMAL')
+            self._disk.execute(
+                'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)'
+            )
+            self._disk.execute('DELETE FROM responses WHERE expires_at < ?', (time.time(),))
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(path: str, params: Dict) -> str:
+        """Cache key of a request, the API key is left out"""
+        items = sorted((name, value) for name, value in params.items() if name != "api_key")
+        return f"{path}?{urlencode(items)}"
+
+    def ttl_for(self, path: str) -> int:
+        """Freshness of a successful response for the given endpoint path"""
+        if path.startswith("/search/"):
+            return self.ttls["search"]
+        if "/season/" in path:
+            return self.ttls["season"]
+        if path.startswith("/tv/"):
+            return self.ttls["tv"]
+        return self.ttls["movie"]
 
-class TMDBApi:
-    def __init__(self, api_key: str):
+    def get(self, key: str) -> Tuple[bool, Optional[Dict]]:
+        """Return (hit, value), a hit with value None is a cached 404"""
+        hit, value = self.get_memory(key)
+        if hit:
+            return hit, value
+        return self.get_stored(key)
+
+    def get_memory(self, key: str) -> Tuple[bool, Optional[Dict]]:
+        """In-memory half of get(), cheap enough for the event loop, a miss is not counted"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= time.time():
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._memory[key]
+        return False, None
+
+    def get_stored(self, key: str) -> Tuple[bool, Optional[Dict]]:
+        """On-disk half of get(), blocking, a hit is copied to memory"""
+        row = None
+        with self._disk_lock:
+            if self._disk is not None:
+                row = self._disk.execute(
+                    'SELECT value, expires_at FROM responses WHERE key = ? AND expires_at >= ?', (key, time.time())
+                ).fetchone()
+        with self._lock:
+            if row:
+                value = json.loads(row[0]) if row[0] is not None else None
+                self._remember(key, row[1], value)
+                self.hits += 1
+                return True, value
+            self.misses += 1
+            return False, None
+
+    def set(self, key: str, path: str, value: Optional[Dict]):
+        """Store a response, value None records a 404 for negative_ttl seconds"""
+        self.persist(key, value, self.remember(key, path, value))
+
+    def remember(self, key: str, path: str, value: Optional[Dict]) -> float:
+        """In-memory half of set(), returning when the entry expires"""
+        ttl = self.negative_ttl if value is None else self.ttl_for(path)
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+        return expires_at
+
+    def persist(self, key: str, value: Optional[Dict], expires_at: float):
+        """On-disk half of set(), blocking"""
+        with self._disk_lock:
+            if self._disk is not None:
+                self._disk.execute(
+                    'INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value) if value is not None else None, expires_at)
+                )
+                self._disk.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Optional[Dict]):
+        """Insert into the in-memory LRU, evicting the least recently used entry"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current in-memory size"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._memory),
+        }
+
+    def close(self):
+        """Close the on-disk store"""
+        with self._disk_lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+
+class _TMDBBase:
+    """Helpers shared by the blocking and the asyncio TMDB clients"""
+
+    def __init__(self, api_key: str, connect_timeout: float = 5.0, read_timeout: float = 10.0,
+                 cache: Optional[TMDBCache] = None, rate_limit: float = 40.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, max_backoff: float = 30.0, metrics: Optional[Metrics] = None,
+                 base_url: str = "https://api.themoviedb.org/3"):
         self.api_key = api_key
-        self.base_url = "https://api.themoviedb.org/3"
+        self.base_url = base_url
         self.image_base_url = "https://image.tmdb.org/t/p/w500"
-    
-    def clean_filename(self, filename: str) -> str:
-        """Clean filename to extract media title"""
-        # Remove file extension
-        filename = re.sub(r'\.[^.]*$', '', filename)
-        
-        # Remove common quality indicators, years, and other metadata
-        filename = re.sub(r'\b(1080p|720p|480p|2160p|HDRip|BRRip|WEBRip|WEB-DL|HDTV|DVD|BluRay|x264|x265|h264|h265|AAC|DDP?5\.1|DD?5\.1|HEVC|AVC)\b', '', filename, flags=re.IGNORECASE)
-        
-        # Remove years (1900-2099)
-        filename = re.sub(r'\b(19|20)\d{2}\b', '', filename)
-        
-        # Remove season and episode indicators
-        filename = re.sub(r'\b[Ss]\d+[Ee]\d+\b', '', filename)
-        filename = re.sub(r'\bSeason\s*\d+\b', '', filename, flags=re.IGNORECASE)
-        filename = re.sub(r'\bEpisode\s*\d+\b', '', filename, flags=re.IGNORECASE)
-        
-        # Remove common prefixes/suffixes
-        filename = re.sub(r'^\[.*?\]|\[.*?\]$', '', filename)
-        filename = re.sub(r'^\(.*?\)|\(.*?\)$', '', filename)
-        
-        # Remove emojis and special characters
-        filename = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', '', filename)
-        filename = re.sub(r'[^a-zA-Z0-9\s\u00C0-\u017F\-_\']', ' ', filename)
-        
-        # Remove extra spaces
-        filename = re.sub(r'\s+', ' ', filename).strip()
-        
-        return filename
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.cache = cache
+        # TMDB allows roughly 50 requests per second per IP, stay below it
+        self.limiter = TokenBucket(rate_limit)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.metrics = metrics
 
-    def search_movies(self, query: str) -> List[Dict]:
-        """Search for movies by title"""
-        # Clean the query
-        clean_query = self.clean_filename(query)
-        
-        url = f"{self.base_url}/search/movie"
-        params = {
+    def _params(self, **params) -> Dict:
+        """Query parameters sent with every request"""
+        return {
             "api_key": self.api_key,
-            "query": clean_query,
-            "language": "es-ES"  # Spanish language
+            "language": "es-ES",  # Spanish language
+            **params
         }
-        
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            return response.json().get("results", [])
-        return []
 
-    def search_tv_shows(self, query: str) -> List[Dict]:
-        """Search for TV shows by title"""
-        # Clean the query
-        clean_query = self.clean_filename(query)
-        
-        url = f"{self.base_url}/search/tv"
-        params = {
-            "api_key": self.api_key,
-            "query": clean_query,
-            "language": "es-ES"  # Spanish language
-        }
-        
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            return response.json().get("results", [])
-        return []
+    def _cache_lookup(self, path: str, params: Dict) -> Tuple[bool, Optional[Dict]]:
+        """Cached response for a request, if any"""
+        if self.cache is None:
+            return False, None
+        return self.cache.get(TMDBCache.make_key(path, params))
 
-    def get_movie_details(self, movie_id: int) -> Optional[Dict]:
-        """Get detailed information about a movie"""
-        url = f"{self.base_url}/movie/{movie_id}"
-        params = {
-            "api_key": self.api_key,
-            "language": "es-ES"  # Spanish language
-        }
-        
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            return response.json()
-        return None
+    def _cache_store(self, path: str, params: Dict, status_code: int, data: Optional[Dict]):
+        """Remember successful responses and 404s, other errors are retried next time"""
+        if self.cache is None:
+            return
+        if status_code == 200:
+            self.cache.set(TMDBCache.make_key(path, params), path, data)
+        elif status_code == 404:
+            self.cache.set(TMDBCache.make_key(path, params), path, None)
 
-    def get_tv_show_details(self, tv_id: int) -> Optional[Dict]:
-        """Get detailed information about a TV show"""
-        url = f"{self.base_url}/tv/{tv_id}"
-        params = {
-            "api_key": self.api_key,
-            "language": "es-ES"  # Spanish language
-        }
-        
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            return response.json()
-        return None
+    def _record_request(self, path: str, started: float, status: str):
+        """Count one HTTP attempt and its duration, by status code or "error" for network failures"""
+        if self.metrics is None:
+            return
+        endpoint = _PATH_ID_RE.sub("/{id}", path)
+        self.metrics.observe("tmdb_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+        self.metrics.inc("tmdb_requests_total", endpoint=endpoint, status=status)
 
-    def get_season_details(self, tv_id: int, season_number: int) -> Optional[Dict]:
-        """Get detailed information about a TV season"""
-        url = f"{self.base_url}/tv/{tv_id}/season/{season_number}"
-        params = {
-            "api_key": self.api_key,
-            "language": "es-ES"  # Spanish language
-        }
-        
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            return response.json()
-        return None
+    def _retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        """Seconds to wait before retrying, honouring the server's Retry-After"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        # Full jitter keeps a batch of failing requests from retrying in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** attempt))
+
+    def _handle_response(self, path: str, status_code: int, body) -> Optional[Dict]:
+        """Decode a final, non-retryable response. 404 means no such title"""
+        if status_code == 200:
+            return body()
+        if status_code == 404:
+            return None
+        raise TMDBError(f"TMDB request {path} returned HTTP {status_code}")
+
+    def clean_filename(self, filename: str) -> str:
+        """Clean filename to extract media title"""
+        return parse_filename(filename).title
 
     def format_movie_caption(self, movie_data: Dict) -> str:
         """Format movie data into a caption"""
@@ -156,4 +280,178 @@ class TMDBApi:
         """Get full poster URL from poster path"""
         if poster_path:
             return f"{self.image_base_url}{poster_path}"
-        return ""
\ No newline at end of file
+        return ""
+
+class TMDBApi(_TMDBBase):
+    """Blocking TMDB client, kept for scripts and code outside the event loop"""
+
+    def __init__(self, api_key: str, **options):
+        super().__init__(api_key, **options)
+        # A session keeps the TLS connection to TMDB alive between calls
+        self.session = requests.Session()
+
+    def _get(self, path: str, **params) -> Optional[Dict]:
+        """GET an endpoint, returning the decoded body, None for 404 or raising TMDBError"""
+        params = self._params(**params)
+        hit, cached = self._cache_lookup(path, params)
+        if hit:
+            return cached
+        
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self.limiter.reserve())
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                response = self.session.get(
+                    f"{self.base_url}{path}",
+                    params=params,
+                    timeout=(self.connect_timeout, self.read_timeout)
+                )
+            except requests.RequestException as e:
+                self._record_request(path, started, "error")
+                error = repr(e)
+            else:
+                self._record_request(path, started, str(response.status_code))
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    data = self._handle_response(path, response.status_code, response.json)
+                    self._cache_store(path, params, response.status_code, data)
+                    return data
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            
+            if attempt < self.max_retries:
+                delay = self._retry_delay(attempt, retry_after)
+                logger.warning(f"TMDB request {path} failed ({error}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        
+        raise TMDBError(f"TMDB request {path} failed after {self.max_retries + 1} attempts: {error}")
+
+    def search_movies(self, query: str) -> List[Dict]:
+        """Search for movies by title"""
+        data = self._get("/search/movie", query=self.clean_filename(query))
+        return data.get("results", []) if data else []
+
+    def search_tv_shows(self, query: str) -> List[Dict]:
+        """Search for TV shows by title"""
+        data = self._get("/search/tv", query=self.clean_filename(query))
+        return data.get("results", []) if data else []
+
+    def get_movie_details(self, movie_id: int) -> Optional[Dict]:
+        """Get detailed information about a movie"""
+        return self._get(f"/movie/{movie_id}")
+
+    def get_tv_show_details(self, tv_id: int) -> Optional[Dict]:
+        """Get detailed information about a TV show"""
+        return self._get(f"/tv/{tv_id}")
+
+    def get_season_details(self, tv_id: int, season_number: int) -> Optional[Dict]:
+        """Get detailed information about a TV season"""
+        return self._get(f"/tv/{tv_id}/season/{season_number}")
+
+    def close(self):
+        """Close pooled HTTP connections"""
+        self.session.close()
+
+class AsyncTMDBApi(_TMDBBase):
+    """asyncio TMDB client sharing one pooled keep-alive HTTP connection set"""
+
+    def __init__(self, api_key: str, max_connections: int = 10, **options):
+        super().__init__(api_key, **options)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections)
+        )
+        # Requests currently on the wire, keyed like the cache
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def _get(self, path: str, **params) -> Optional[Dict]:
+        """GET an endpoint, returning the decoded body, None for 404 or raising TMDBError"""
+        params = self._params(**params)
+        key = TMDBCache.make_key(path, params)
+        # Only the in-memory LRU is read on the event loop, the disk store is
+        # read and written by _fetch on a worker thread
+        if self.cache is not None:
+            hit, cached = self.cache.get_memory(key)
+            if hit:
+                return cached
+        
+        # Single flight: identical concurrent requests share one HTTP call
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(path, params, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one cancelled caller does not cancel the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, path: str, params: Dict, key: str) -> Optional[Dict]:
+        """Disk cache lookup, then a rate limited request with jittered exponential backoff"""
+        if self.cache is not None:
+            hit, cached = await asyncio.to_thread(self.cache.get_stored, key)
+            if hit:
+                return cached
+        
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self.limiter.reserve())
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                response = await self.client.get(path, params=params)
+            except httpx.HTTPError as e:
+                self._record_request(path, started, "error")
+                error = repr(e)
+            else:
+                self._record_request(path, started, str(response.status_code))
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    data = self._handle_response(path, response.status_code, response.json)
+                    await self._cache_store_async(key, path, response.status_code, data)
+                    return data
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            
+            if attempt < self.max_retries:
+                delay = self._retry_delay(attempt, retry_after)
+                logger.warning(f"TMDB request {path} failed ({error}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        
+        raise TMDBError(f"TMDB request {path} failed after {self.max_retries + 1} attempts: {error}")
+
+    async def _cache_store_async(self, key: str, path: str, status_code: int, data: Optional[Dict]):
+        """_cache_store with the SQLite write on a worker thread"""
+        if self.cache is None or status_code not in (200, 404):
+            return
+        expires_at = self.cache.remember(key, path, data)
+        await asyncio.to_thread(self.cache.persist, key, data, expires_at)
+
+    async def search_movies(self, query: str) -> List[Dict]:
+        """Search for movies by title"""
+        data = await self._get("/search/movie", query=self.clean_filename(query))
+        return data.get("results", []) if data else []
+
+    async def search_tv_shows(self, query: str) -> List[Dict]:
+        """Search for TV shows by title"""
+        data = await self._get("/search/tv", query=self.clean_filename(query))
+        return data.get("results", []) if data else []
+
+    async def search_all(self, query: str) -> Tuple[List[Dict], List[Dict]]:
+        """Search movies and TV shows concurrently, returning (movies, tv_shows)"""
+        movies, tv_shows = await asyncio.gather(self.search_movies(query), self.search_tv_shows(query))
+        return movies, tv_shows
+
+    async def get_movie_details(self, movie_id: int) -> Optional[Dict]:
+        """Get detailed information about a movie"""
+        return await self._get(f"/movie/{movie_id}")
+
+    async def get_tv_show_details(self, tv_id: int) -> Optional[Dict]:
+        """Get detailed information about a TV show"""
+        return await self._get(f"/tv/{tv_id}")
+
+    async def get_season_details(self, tv_id: int, season_number: int) -> Optional[Dict]:
+        """Get detailed information about a TV season"""
+        return await self._get(f"/tv/{tv_id}/season/{season_number}")
+
+    async def aclose(self):
+        """Close pooled HTTP connections"""
+        await self.client.aclose()